@@ -0,0 +1,76 @@
+"""Address normalization for geocoding cache keys.
+
+normalize_address() maps spellings of the same US street address to one
+canonical string, so "4541 Irving Street, San Francisco CA 94122" and
+"4541 irving st., San Francisco, CA 94122-1234" share a cache entry and one
+lookup. It lower-cases, drops punctuation and collapses whitespace. It
+abbreviates USPS street suffixes, directionals and unit designators, and
+shortens a ZIP+4 code at the end (after the state) to the 5-digit ZIP. A
+directional right before the street suffix is the street's name ("North
+St" is not "N St") and is kept, as is "no" or "number" not followed by a
+number. The result is only used as a key; the address sent to the
+geocoder is the one in the data.
+"""
+
+import re
+
+# USPS Publication 28, Appendix C1 (common suffixes and their abbreviations)
+STREET_SUFFIXES = {
+    'alley': 'aly', 'allee': 'aly', 'ally': 'aly',
+    'avenue': 'ave', 'av': 'ave', 'aven': 'ave', 'avenu': 'ave', 'avn': 'ave', 'avnue': 'ave',
+    'boulevard': 'blvd', 'boul': 'blvd', 'boulv': 'blvd',
+    'circle': 'cir', 'circ': 'cir', 'circl': 'cir', 'crcl': 'cir', 'crcle': 'cir',
+    'court': 'ct', 'crt': 'ct',
+    'drive': 'dr', 'driv': 'dr', 'drv': 'dr',
+    'expressway': 'expy', 'expr': 'expy', 'express': 'expy', 'expw': 'expy',
+    'freeway': 'fwy', 'frwy': 'fwy',
+    'highway': 'hwy', 'highwy': 'hwy', 'hiway': 'hwy', 'hiwy': 'hwy', 'hway': 'hwy',
+    'lane': 'ln',
+    'parkway': 'pkwy', 'parkwy': 'pkwy', 'pkway': 'pkwy', 'pky': 'pkwy',
+    'place': 'pl',
+    'plaza': 'plz', 'plza': 'plz',
+    'road': 'rd',
+    'square': 'sq', 'sqr': 'sq', 'sqre': 'sq', 'squ': 'sq',
+    'street': 'st', 'str': 'st', 'strt': 'st',
+    'terrace': 'ter', 'terr': 'ter',
+    'trail': 'trl', 'trails': 'trl',
+}
+DIRECTIONALS = {
+    'north': 'n', 'south': 's', 'east': 'e', 'west': 'w',
+    'northeast': 'ne', 'northwest': 'nw', 'southeast': 'se', 'southwest': 'sw',
+}
+# USPS Publication 28, Appendix C2 (secondary unit designators)
+UNIT_DESIGNATORS = {
+    'apartment': 'apt', 'building': 'bldg', 'floor': 'fl', 'room': 'rm', 'suite': 'ste', 'unit': 'unit',
+    'number': '#', 'no': '#',
+}
+ABBREVIATIONS = {**STREET_SUFFIXES, **DIRECTIONALS, **UNIT_DESIGNATORS}
+_SUFFIX_TOKENS = set(STREET_SUFFIXES) | set(STREET_SUFFIXES.values())
+_UNIT_TOKENS = set(UNIT_DESIGNATORS) | set(UNIT_DESIGNATORS.values())
+
+_PUNCTUATION_RE = re.compile(r"[^\w#\s-]+")
+_ZIP_RE = re.compile(r'^(\d{5})(?:-?\d{4})?$')
+
+
+def normalize_address(address):
+    """Return the canonical cache key of *address*."""
+    text = _PUNCTUATION_RE.sub(' ', address.lower()).replace('#', ' # ')
+    words = text.split()
+    tokens = []
+    for i, token in enumerate(words):
+        previous = words[i - 1] if i else ''
+        following = words[i + 1] if i + 1 < len(words) else ''
+        zip_match = _ZIP_RE.match(token)
+        if zip_match and not following and previous.isalpha() and previous not in _UNIT_TOKENS:
+            # A ZIP after the state, not a house or unit number
+            token = zip_match.group(1)
+        elif token in DIRECTIONALS and following in _SUFFIX_TOKENS:
+            # The street name itself, not a prefix of it
+            tokens.append(token)
+            continue
+        elif UNIT_DESIGNATORS.get(token) == '#' and not following[:1].isdigit():
+            # "No" as a word, e.g. "No Name Rd"
+            tokens.append(token)
+            continue
+        tokens.append(ABBREVIATIONS.get(token, token))
+    return ' '.join(tokens)
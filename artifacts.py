@@ -0,0 +1,240 @@
+"""Precompressed build artifacts and the size-budget report.
+
+Every artifact is written next to a ``.gz`` variant (and ``.br`` when the
+optional ``brotli`` package is installed) so static hosts can serve the
+compressed file directly. The report breaks each HTML page down into its
+sections and compares the totals against the configured size budgets.
+"""
+
+import gzip
+import os
+import re
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for .br variants
+    brotli = None
+
+SECTIONS = ('css', 'data', 'categories', 'js', 'markup')
+
+_BODY_RE = re.compile(r'<style[^>]*>(.*?)</style>|<script>(.*?)</script>', re.DOTALL)
+# StreamedArtifact hands this much text at a time to the file and compressors
+STREAM_BLOCK_SIZE = 1 << 16
+
+
+def compressed_variants(data):
+    """Return {suffix: compressed bytes} for the available encodings."""
+    # mtime=0 keeps the .gz output reproducible, so the build manifest can
+    # compare hashes across runs.
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return variants
+
+
+def write_artifact(path, data, variants=None):
+    """Write *data* to *path* plus one file per compressed variant.
+
+    Returns the list of paths written. Stale variants (e.g. a .br left over
+    from a build where brotli was available) are removed.
+    """
+    if variants is None:
+        variants = compressed_variants(data)
+    with open(path, 'wb') as f:
+        f.write(data)
+    written = [path]
+    for suffix in ('.gz', '.br'):
+        if suffix in variants:
+            with open(path + suffix, 'wb') as f:
+                f.write(variants[suffix])
+            written.append(path + suffix)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return written
+
+
+def _compressors():
+    """Return {suffix: (compress, finish)} streaming equivalents of compressed_variants()."""
+    gz = zlib.compressobj(9, zlib.DEFLATED, 31)  # gzip wrapper, mtime 0
+    compressors = {'.gz': (gz.compress, gz.flush)}
+    if brotli is not None:
+        br = brotli.Compressor(quality=11)
+        compressors['.br'] = (br.process, br.finish)
+    return compressors
+
+
+class StreamedArtifact:
+    """Writes an artifact and its compressed variants as text is streamed in.
+
+    Text arrives tagged with the report section it belongs to (see
+    label_sections) and is written to temporary files next to *path*, so no
+    full copy of the page is held in memory. close() returns the totals;
+    commit() then moves the files into place, or discard() removes them, e.g.
+    when a size budget is exceeded. With *measure_compressed* every section
+    is also compressed on its own; sections compressed independently add up
+    to a little more than the compressed page.
+    """
+
+    def __init__(self, path, measure_compressed=False):
+        self.path = path
+        self.sections = {name: {'raw': 0} for name in SECTIONS}
+        self.totals = None
+        self._measure_compressed = measure_compressed
+        self._section_compressors = {}
+        self._compressors = _compressors()
+        self._files = {'': open(path + '.tmp', 'wb')}
+        for suffix in self._compressors:
+            self._files[suffix] = open(path + suffix + '.tmp', 'wb')
+        self._raw_size = 0
+        self._section = None
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, section, text):
+        if section != self._section or self._pending_size >= STREAM_BLOCK_SIZE:
+            self._flush()
+            self._section = section
+        self._pending.append(text)
+        self._pending_size += len(text)
+
+    def _flush(self):
+        if not self._pending:
+            return
+        data = ''.join(self._pending).encode('utf-8')
+        self._pending = []
+        self._pending_size = 0
+        self._files[''].write(data)
+        self._raw_size += len(data)
+        for suffix, (compress, _finish) in self._compressors.items():
+            self._files[suffix].write(compress(data))
+
+        sizes = self.sections.setdefault(self._section, {'raw': 0})
+        sizes['raw'] += len(data)
+        if self._measure_compressed:
+            compressors = self._section_compressors.get(self._section)
+            if compressors is None:
+                compressors = self._section_compressors[self._section] = _compressors()
+            for suffix, (compress, _finish) in compressors.items():
+                sizes[suffix] = sizes.get(suffix, 0) + len(compress(data))
+
+    def close(self):
+        """Finish writing and return {'raw': n, '.gz': n, '.br': n}."""
+        self._flush()
+        for suffix, (_compress, finish) in self._compressors.items():
+            self._files[suffix].write(finish())
+        for name in SECTIONS if self._measure_compressed else ():
+            compressors = self._section_compressors.get(name) or _compressors()
+            for suffix, (_compress, finish) in compressors.items():
+                self.sections[name][suffix] = self.sections[name].get(suffix, 0) + len(finish())
+        self.totals = {'raw': self._raw_size}
+        for suffix, f in self._files.items():
+            f.close()
+            if suffix:
+                self.totals[suffix] = os.path.getsize(self.path + suffix + '.tmp')
+        return self.totals
+
+    def commit(self):
+        """Move the finished files into place; returns the paths written."""
+        written = []
+        for suffix in ('', '.gz', '.br'):
+            target = self.path + suffix
+            if suffix in self._files:
+                os.replace(target + '.tmp', target)
+                written.append(target)
+            elif os.path.exists(target):
+                os.remove(target)
+        return written
+
+    def discard(self):
+        for suffix, f in self._files.items():
+            f.close()
+            try:
+                os.remove(self.path + suffix + '.tmp')
+            except FileNotFoundError:
+                pass
+
+
+def artifact_paths(path):
+    """Paths write_artifact() produces for *path* with the encodings available here."""
+    return [path, path + '.gz'] + ([path + '.br'] if brotli is not None else [])
+
+
+def label_sections(html):
+    """Yield (section, text) pieces of *html* in order.
+
+    <style> bodies are 'css', inline <script> bodies 'js' and everything
+    else 'markup'. Used to tag the literal parts of the page template.
+    """
+    pos = 0
+    for match in _BODY_RE.finditer(html):
+        group = 1 if match.group(1) is not None else 2
+        start, end = match.span(group)
+        if start > pos:
+            yield 'markup', html[pos:start]
+        if end > start:
+            yield ('css' if group == 1 else 'js'), html[start:end]
+        pos = end
+    if pos < len(html):
+        yield 'markup', html[pos:]
+
+
+def _fmt(n):
+    return f"{n:,}" if n is not None else "-"
+
+
+def format_size_table(unminified, minified, totals, unminified_name, minified_name):
+    """Return the size report as printable text.
+
+    *unminified* and *minified* are the StreamedArtifact.sections of the two
+    pages; *totals* maps artifact name to {'raw': n, '.gz': n, '.br': n} for
+    the whole files. Compressed columns refer to the minified page.
+    """
+    suffixes = [s for s in ('.gz', '.br') if s in totals[minified_name]]
+    header = f"{'section':<12} {'raw':>11} {'minified':>11}" + ''.join(f" {s:>10}" for s in suffixes)
+    lines = [header, '-' * len(header)]
+    for name in SECTIONS:
+        row = f"{name:<12} {_fmt(unminified[name]['raw']):>11} {_fmt(minified[name]['raw']):>11}"
+        row += ''.join(f" {_fmt(minified[name].get(s)):>10}" for s in suffixes)
+        lines.append(row)
+    lines.append('-' * len(header))
+    row = f"{'total':<12} {_fmt(totals[unminified_name]['raw']):>11} {_fmt(totals[minified_name]['raw']):>11}"
+    row += ''.join(f" {_fmt(totals[minified_name].get(s)):>10}" for s in suffixes)
+    lines.append(row)
+    compressed = ', '.join(f"{s} {_fmt(n)}" for s, n in totals[unminified_name].items() if s != 'raw')
+    lines.append(f"({unminified_name}: {compressed})")
+    return '\n'.join(lines)
+
+
+def parse_budget(spec):
+    """Parse a CLI budget ``NAME=BYTES`` (e.g. ``index.html.gz=60000``)."""
+    name, sep, value = spec.partition('=')
+    if not sep or not name:
+        raise ValueError(f"expected NAME=BYTES, got {spec!r}")
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError(f"budget for {name} must be an integer number of bytes, got {value!r}")
+    return name, limit
+
+
+def check_budgets(totals, budgets):
+    """Return a message for every artifact that exceeds its budget.
+
+    *totals* maps artifact name to its size by encoding; a budget key is an
+    artifact name, optionally with a ``.gz``/``.br`` suffix for the
+    compressed size. Budgets naming unknown artifacts are reported too, so a
+    typo does not silently disable the check.
+    """
+    sizes = {}
+    for artifact, by_encoding in totals.items():
+        for encoding, size in by_encoding.items():
+            sizes[artifact if encoding == 'raw' else artifact + encoding] = size
+
+    failures = []
+    for name, limit in budgets.items():
+        if name not in sizes:
+            failures.append(f"{name}: no such artifact (known: {', '.join(sorted(sizes))})")
+        elif sizes[name] > limit:
+            failures.append(f"{name}: {sizes[name]:,} B exceeds budget of {limit:,} B by {sizes[name] - limit:,} B")
+    return failures
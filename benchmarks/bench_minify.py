@@ -0,0 +1,93 @@
+"""Benchmark build.minify_code against the original character-wise scanner.
+
+Builds multi-megabyte pages shaped like the real output (inlined CSS, a large
+JSON data payload and the app's JS) and times both implementations on them.
+
+Run from the repository root:
+
+    uv run python benchmarks/bench_minify.py [--sizes 1 4 16] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from build import HTML_TEMPLATE, _strip_comments_charwise, minify_code  # noqa: E402
+
+
+def legacy_minify_code(content):
+    """minify_code as it was before the chunked scanner."""
+    content = _strip_comments_charwise(content)
+    content = re.sub(r'^\s+|\s+$', '', content, flags=re.MULTILINE)
+    content = re.sub(r'\n+', '', content)
+    return content
+
+
+def make_page(target_mb, seed=0):
+    """Return a page of roughly *target_mb* megabytes with an inlined payload."""
+    rng = random.Random(seed)
+    with open('js/logic.js', encoding='utf-8') as f:
+        js = f.read()
+    with open('js/main.js', encoding='utf-8') as f:
+        js += '\n' + f.read()
+
+    businesses = []
+    size = 0
+    while size < target_mb * 1024 * 1024:
+        biz = {
+            'id': f'biz-{len(businesses)}',
+            'name': f"Joe's Place #{len(businesses)}",
+            'type': rng.sample(['cafe', 'bar', 'bakery', 'store'], 2),
+            'address': f'{rng.randint(1, 9999)} Irving St, San Francisco, CA 94122',
+            'website': f'https://example.com/{len(businesses)}',
+            'description': 'Open late // no reservations /* cash only */',
+            'lat': 37.7 + rng.random() / 10,
+            'long': -122.5 + rng.random() / 10,
+            'hours': {'default': '11:00-22:00', 'sunday': 'Closed'},
+        }
+        businesses.append(biz)
+        size += len(json.dumps(biz))
+
+    return HTML_TEMPLATE.format(
+        site_title='Benchmark',
+        json_data=json.dumps({'businesses': businesses}, ensure_ascii=False, indent=2),
+        category_hierarchy='{}',
+        js=js,
+    )
+
+
+def best_time(fn, arg, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 4, 16], help='Page sizes in MB')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement (best is reported)')
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'legacy':>9}  {'chunked':>9}  {'speedup':>7}")
+    for mb in args.sizes:
+        page = make_page(mb)
+        legacy_s, legacy_out = best_time(legacy_minify_code, page, args.repeat)
+        new_s, new_out = best_time(minify_code, page, args.repeat)
+        if legacy_out != new_out:
+            print(f"Error: outputs differ for {mb} MB input")
+            return 1
+        print(f"{len(page) / 1e6:7.1f}M  {legacy_s:8.3f}s  {new_s:8.3f}s  {legacy_s / new_s:6.1f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
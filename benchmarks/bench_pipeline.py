@@ -0,0 +1,324 @@
+"""Benchmark the Python pipeline on synthetic datasets of 1k to 100k records.
+
+A seeded generator writes data.toml-shaped datasets (categories, multi-type
+businesses with hours and holiday_hours, coordinates inside max_bounds,
+locations). For each size the script times and measures the peak memory of:
+
+- build():            every build stage, from the --profile trace
+- validate:           validate_data.validate_data()
+- geocode:            process_data_with_geocoding() when every address is cached
+- qr:                 generate_qr.create_qr_with_logo() for --qr-sample codes
+
+Everything runs offline: npm is stubbed (the JS sources stand in for the
+minified bundle), the geocoding cache is pre-filled with every address and
+any HTTP request fails. Results are compared with a JSON baseline and
+stages that got slower or bigger than --threshold are reported as
+regressions (exit status 1). Baselines depend on the machine and are not
+committed.
+
+Run from the repository root:
+
+    uv run python benchmarks/bench_pipeline.py --save            # record a baseline
+    uv run python benchmarks/bench_pipeline.py [--counts 1000 10000 100000]
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import tomli_w
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import build  # noqa: E402
+from address import normalize_address  # noqa: E402
+import generate_qr  # noqa: E402
+import geocoding  # noqa: E402
+from geocache import GeocodingCache  # noqa: E402
+from validate_data import validate_data  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline-baseline.json')
+# Differences smaller than these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.02
+MIN_PEAK_DELTA = 1024 * 1024
+
+CATEGORIES = {
+    'food': ('🍴', 'Food', {'bakery': ('🥖', 'Bakery'), 'restaurant': ('🍽', 'Restaurant'), 'cafe': ('☕', 'Café')}),
+    'drink': ('🍹', 'Drink', {'bar': ('🍺', 'Bar'), 'cafe': ('☕', 'Café')}),
+    'shopping': ('🛒', 'Shopping', {'bookstore': ('📚', 'Bookstore'), 'bikeshop': ('🚲', 'Bike Shop'),
+                                   'store': ('🛍️', 'Store')}),
+}
+MAX_BOUNDS = [[37.72, -122.53], [37.79, -122.45]]
+DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+STREETS = ('Irving St', 'Judah St', 'Noriega St', 'Taraval St', 'Lincoln Way', 'Sunset Blvd', 'Great Hwy')
+HOLIDAYS = ('2025-11-27', '2025-12-24', '2025-12-25', '2025-12-31', '2026-01-01', '2026-07-04')
+
+
+def _point(rng):
+    (south, west), (north, east) = MAX_BOUNDS
+    return round(rng.uniform(south, north), 6), round(rng.uniform(west, east), 6)
+
+
+def _hours(rng):
+    opening = rng.choice(('07:00', '08:00', '10:00', '11:00'))
+    closing = rng.choice(('14:00', '16:00', '20:00', '22:00'))
+    if rng.random() < 0.5:
+        return {'default': f'{opening}-{closing}', 'sunday': rng.choice(('Closed', '12:00-18:00'))}
+    hours = {day: f'{opening}-{closing}' for day in DAYS[:5]}
+    hours['saturday'] = '09:00-14:00'
+    hours['sunday'] = 'Closed'
+    return hours
+
+
+def make_dataset(count, seed=0):
+    """Return a data.toml-shaped dict with *count* businesses and count // 50 locations.
+
+    About half of the businesses have no coordinates, only an address, so
+    the build geocodes them (from the cache, see make_geocoding_cache).
+    """
+    rng = random.Random(seed)
+    types = sorted({name for _, _, subcategories in CATEGORIES.values() for name in subcategories})
+    (lat, long), _ = MAX_BOUNDS
+    businesses = []
+    for i in range(count):
+        business = {
+            'id': f'biz_{i}',
+            'name': f"Business {i}",
+            'type': rng.sample(types, rng.choice((1, 1, 1, 2, 3))),
+            'address': f'{rng.randint(1, 4999)} {rng.choice(STREETS)} #{i}, San Francisco, CA 94122',
+            'phone': f'415 555-{rng.randint(0, 9999):04d}',
+            'description': 'Synthetic business for benchmarking. ' * rng.randint(1, 3),
+            'hours': _hours(rng),
+        }
+        if rng.random() < 0.5:
+            business['lat'], business['long'] = _point(rng)
+        if rng.random() < 0.7:
+            business['holiday_hours'] = {day: rng.choice(('Closed', '10:00-14:00'))
+                                         for day in rng.sample(HOLIDAYS, rng.randint(1, 3))}
+        businesses.append(business)
+    locations = []
+    for i in range(count // 50):
+        location = {'id': f'loc_{i}', 'name': f'Location {i}'}
+        location['lat'], location['long'] = _point(rng)
+        locations.append(location)
+    return {
+        'title': 'Benchmark Businesses',
+        'base_url': 'https://example.com/map/',
+        'categories': {
+            broad: {'emoji': emoji, 'label': label,
+                    'subcategories': {name: {'emoji': e, 'label': l} for name, (e, l) in subcategories.items()}}
+            for broad, (emoji, label, subcategories) in CATEGORIES.items()
+        },
+        'map_defaults': {'lat': lat + 0.03, 'long': long + 0.04, 'zoom': 15, 'min_zoom': 13,
+                         'max_bounds': MAX_BOUNDS},
+        'businesses': businesses,
+        'locations': locations,
+    }
+
+
+def make_geocoding_cache(data, seed=0):
+    """Return a geocoding cache with coordinates for every address in *data*."""
+    rng = random.Random(seed + 1)
+    cache = {}
+    for item in data['businesses'] + data['locations']:
+        if 'address' in item:
+            lat, long = _point(rng)
+            cache[normalize_address(item['address'])] = {'lat': lat, 'long': long}
+    return cache
+
+
+def measure(fn, *args):
+    """Return (seconds, peak traced bytes) of fn(*args)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def _offline(client, url):
+    raise OSError(f"network disabled in benchmarks: {url}")
+
+
+def bench_build(data, cache, work_dir):
+    """Build *data* from scratch; returns {stage: (seconds, peak bytes)} with 'build' as the total."""
+    toml_file = os.path.join(work_dir, 'data.toml')
+    with open(toml_file, 'wb') as f:
+        tomli_w.dump(data, f)
+    cache_file = os.path.join(work_dir, 'geocoding_cache.sqlite')
+    with GeocodingCache(cache_file) as stored:
+        stored.update(cache)
+    minified_js = os.path.join(work_dir, 'minified.js')
+    with open(minified_js, 'w', encoding='utf-8') as out:
+        for path in build.JS_SOURCES:
+            with open(path, encoding='utf-8') as f:
+                out.write(f.read() + '\n')
+    trace = os.path.join(work_dir, 'trace.json')
+
+    # The profiler traces memory itself, so the total is timed without tracemalloc
+    with patch('build.subprocess.run'), patch('build.MINIFIED_JS_FILE', minified_js), \
+            patch('geocoding.CACHE_FILE', cache_file), patch('geocoding.JSON_CACHE_FILE', None), \
+            patch('http_client.HttpClient.get', _offline), \
+            contextlib.redirect_stdout(io.StringIO()) as output:
+        start = time.perf_counter()
+        ok = build.build(force=True, toml_file=toml_file, output_dir=os.path.join(work_dir, 'site'), profile=trace)
+        elapsed = time.perf_counter() - start
+    if not ok:
+        raise RuntimeError(f"benchmark build failed:\n{output.getvalue()}")
+
+    with open(trace) as f:
+        events = json.load(f)['traceEvents']
+    stages = {}
+    for event in events:
+        seconds, peak = stages.get(f"build.{event['name']}", (0.0, 0))
+        stages[f"build.{event['name']}"] = (seconds + event['dur'] / 1e6,
+                                            max(peak, event['args']['peak_memory_bytes']))
+    stages['build'] = (elapsed, max(peak for _, peak in stages.values()))
+    return stages
+
+
+def bench_validate(data):
+    result = {}
+
+    def run():
+        result['errors'], _ = validate_data(data)
+
+    measured = measure(run)
+    if result['errors']:
+        raise RuntimeError(f"synthetic dataset does not validate: {result['errors'][:3]}")
+    return measured
+
+
+def bench_geocode(data, cache, work_dir):
+    data = copy.deepcopy(data)
+    with GeocodingCache(os.path.join(work_dir, 'geocode-bench.sqlite')) as stored, \
+            patch('http_client.HttpClient.get', _offline):
+        stored.update(cache)
+        return measure(geocoding.process_data_with_geocoding, data, stored)
+
+
+def bench_qr(data, sample, work_dir):
+    targets = data['businesses'][:sample]
+    logo = generate_qr.LOGO_PATH if generate_qr.LOGO_PATH and os.path.exists(generate_qr.LOGO_PATH) else None
+
+    def run():
+        for target in targets:
+            url = f"{data['base_url']}?lat={target.get('lat', 0)}&lng={target.get('long', 0)}"
+            generate_qr.create_qr_with_logo(url, os.path.join(work_dir, f"{target['id']}.png"), logo)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        return measure(run)
+
+
+def run_benchmarks(counts, seed, qr_sample, repeat=1):
+    """Return {count: {stage: {'seconds': s, 'peak_mb': mb}}}, the best of *repeat* runs."""
+    results = {}
+    for count in counts:
+        data = make_dataset(count, seed)
+        cache = make_geocoding_cache(data, seed)
+        stages = {}
+        for _ in range(repeat):
+            work_dir = tempfile.mkdtemp()
+            try:
+                run = bench_build(data, cache, work_dir)
+                run['validate'] = bench_validate(data)
+                run['geocode'] = bench_geocode(data, cache, work_dir)
+                if qr_sample:
+                    run[f'qr ({min(qr_sample, count)} codes)'] = bench_qr(data, qr_sample, work_dir)
+            finally:
+                shutil.rmtree(work_dir)
+            for stage, (seconds, peak) in run.items():
+                best = stages.get(stage)
+                stages[stage] = (min(seconds, best[0]), min(peak, best[1])) if best else (seconds, peak)
+        results[str(count)] = {
+            stage: {'seconds': round(seconds, 4), 'peak_mb': round(peak / 2**20, 2)}
+            for stage, (seconds, peak) in stages.items()
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Return one message per stage that is more than *threshold* slower or bigger than *baseline*."""
+    regressions = []
+    for count, stages in results.items():
+        for stage, new in stages.items():
+            old = baseline.get(count, {}).get(stage)
+            if old is None:
+                continue
+            if new['seconds'] > old['seconds'] * (1 + threshold) and \
+                    new['seconds'] - old['seconds'] > MIN_SECONDS_DELTA:
+                regressions.append(f"{count} records, {stage}: {old['seconds']:.3f}s -> {new['seconds']:.3f}s")
+            if new['peak_mb'] > old['peak_mb'] * (1 + threshold) and \
+                    (new['peak_mb'] - old['peak_mb']) * 2**20 > MIN_PEAK_DELTA:
+                regressions.append(f"{count} records, {stage}: {old['peak_mb']:.1f}MB -> {new['peak_mb']:.1f}MB")
+    return regressions
+
+
+def _change(new, old):
+    return f"{(new - old) / old * 100:+6.0f}%" if old else ''
+
+
+def print_results(results, baseline):
+    for count, stages in results.items():
+        print(f"\n{int(count):,} records")
+        print(f"{'stage':<24} {'seconds':>9} {'vs base':>8} {'peak MB':>9} {'vs base':>8}")
+        for stage, new in stages.items():
+            old = baseline.get(count, {}).get(stage, {})
+            print(f"{stage:<24} {new['seconds']:9.3f} {_change(new['seconds'], old.get('seconds')):>8} "
+                  f"{new['peak_mb']:9.1f} {_change(new['peak_mb'], old.get('peak_mb')):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 100000], help='Business counts')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the dataset generator')
+    parser.add_argument('--qr-sample', type=int, default=50, help='QR codes to generate per size (0 to skip)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size; the best time is kept')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='Baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='Write the results to the baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Relative slowdown or memory growth reported as a regression (default 0.25)')
+    args = parser.parse_args()
+
+    baseline = {}
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+    results = run_benchmarks(args.counts, args.seed, args.qr_sample, args.repeat)
+    print_results(results, baseline)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'seed': args.seed, 'results': results}, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+    if not baseline:
+        print(f"\nNo baseline at {args.baseline}; run with --save to record one.")
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for message in regressions:
+            print(f"  {message}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
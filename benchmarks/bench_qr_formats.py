@@ -0,0 +1,85 @@
+"""Compare the size and generation time of the QR output formats.
+
+Generates the same codes as RGB PNGs (the format generate_qr.py always
+wrote before), as 1-bit PNGs, as SVG files and as one PDF sheet, with and
+without the logo, and reports the time and the bytes written per code.
+
+Run from the repository root:
+
+    uv run python benchmarks/bench_qr_formats.py [--count 200] [--logo logo.png] [--repeat 3]
+"""
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import generate_qr  # noqa: E402
+
+
+def make_urls(count):
+    return [f"https://example.org/map/?lat={37.7 + i / 1e5:.5f}&lng={-122.5 + i / 1e5:.5f}&zoom=17"
+            for i in range(count)]
+
+
+def legacy_png(url, output_path, logo_path=None, log=print):
+    """A code without a logo as generate_qr.py wrote it before: RGB, not optimized."""
+    generate_qr.make_qr(url).make_image(fill_color="black", back_color="white").convert('RGB').save(output_path)
+
+
+def bench_files(writer, urls, logo, work_dir, ext):
+    out_dir = tempfile.mkdtemp(dir=work_dir)
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        for i, url in enumerate(urls):
+            writer(url, os.path.join(out_dir, f'{i}.{ext}'), logo)
+    seconds = time.perf_counter() - start
+    return seconds, sum(os.path.getsize(os.path.join(out_dir, name)) for name in os.listdir(out_dir))
+
+
+def bench_sheet(urls, logo, work_dir):
+    path = os.path.join(work_dir, f'sheet-{bool(logo)}.pdf')
+    start = time.perf_counter()
+    generate_qr.write_qr_sheet([(url, f'Location {i}') for i, url in enumerate(urls)], path, logo)
+    return time.perf_counter() - start, os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--count', type=int, default=200, help='Codes per format')
+    parser.add_argument('--logo', default=generate_qr.LOGO_PATH, help='Logo image (default %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per format; the fastest is reported')
+    args = parser.parse_args()
+    urls = make_urls(args.count)
+    work_dir = tempfile.mkdtemp()
+    try:
+        runs = [
+            ('png, no logo (RGB, before)', lambda: bench_files(legacy_png, urls, None, work_dir, 'png')),
+            ('png, no logo (1-bit)', lambda: bench_files(generate_qr.create_qr_with_logo, urls, None, work_dir, 'png')),
+            ('svg, no logo', lambda: bench_files(generate_qr.create_qr_svg, urls, None, work_dir, 'svg')),
+            ('pdf sheet, no logo', lambda: bench_sheet(urls, None, work_dir)),
+        ]
+        if args.logo and os.path.exists(args.logo):
+            runs += [
+                ('png, logo', lambda: bench_files(generate_qr.create_qr_with_logo, urls, args.logo, work_dir, 'png')),
+                ('svg, logo', lambda: bench_files(generate_qr.create_qr_svg, urls, args.logo, work_dir, 'svg')),
+                ('pdf sheet, logo', lambda: bench_sheet(urls, args.logo, work_dir)),
+            ]
+        print(f"{args.count} codes")
+        print(f"{'format':<28} {'total':>9} {'ms/code':>9} {'bytes':>12} {'bytes/code':>11}")
+        for name, run in runs:
+            seconds, size = min(run() for _ in range(args.repeat))
+            print(f"{name:<28} {seconds:>8.2f}s {seconds / args.count * 1000:>9.2f} {size:>12,} "
+                  f"{size // args.count:>11,}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
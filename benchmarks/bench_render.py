@@ -0,0 +1,138 @@
+"""Benchmark the streaming page renderer against whole-string rendering.
+
+Renders both pages for synthetic datasets of growing size and reports the
+time and the peak memory allocated while rendering (the business data
+itself is created before measuring). The legacy renderer below is how
+build.py rendered before the template was pre-split: format the template
+with the full JSON strings, inject the JS and minify the whole page.
+
+Run from the repository root:
+
+    uv run python benchmarks/bench_render.py [--counts 1000 10000 50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from artifacts import compressed_variants, write_artifact  # noqa: E402
+from build import HTML_TEMPLATE, minify_code, render_pages  # noqa: E402
+
+_STYLE_RE = re.compile(r'<style[^>]*>(.*?)</style>', re.DOTALL)
+_INLINE_SCRIPT_RE = re.compile(r'<script>(.*?)</script>', re.DOTALL)
+
+
+def make_encoded(count, seed=0):
+    rng = random.Random(seed)
+    businesses = [
+        {
+            'id': f'biz-{i}',
+            'name': f"Joe's Place #{i}",
+            'type': rng.sample(['cafe', 'bar', 'bakery', 'store'], 2),
+            'address': f'{rng.randint(1, 9999)} Irving St, San Francisco, CA 94122',
+            'lat': 37.7 + rng.random() / 10,
+            'long': -122.5 + rng.random() / 10,
+            'hours': {'default': '11:00-22:00', 'sunday': 'Closed'},
+        }
+        for i in range(count)
+    ]
+    return {
+        'client_data': {'title': 'Benchmark', 'businesses': businesses},
+        'category_hierarchy': '{}',
+        'category_hierarchy_min': '{}',
+        'site_title': 'Benchmark',
+    }
+
+
+def _empty_body(match):
+    return match.group(0).replace(match.group(1), '', 1)
+
+
+def measure_sections(html, data_json, categories_json):
+    """Split a whole rendered page into the report sections, as the size report did before streaming."""
+    css = ''.join(_STYLE_RE.findall(html))
+    script = ''.join(_INLINE_SCRIPT_RE.findall(html))
+    js = script.replace(data_json, '', 1).replace(categories_json, '', 1)
+    markup = _STYLE_RE.sub(_empty_body, _INLINE_SCRIPT_RE.sub(_empty_body, html))
+    return {'css': css, 'data': data_json, 'categories': categories_json, 'js': js, 'markup': markup}
+
+
+def section_sizes(sections):
+    """Return {section: {'raw': n, '.gz': n, ...}}, compressing each section on its own."""
+    sizes = {}
+    for name, text in sections.items():
+        raw = text.encode('utf-8')
+        sizes[name] = {'raw': len(raw)}
+        for suffix, blob in compressed_variants(raw).items():
+            sizes[name][suffix] = len(blob)
+    return sizes
+
+
+def legacy_render(encoded, js, output_unmin, output):
+    data = encoded['client_data']
+    data_json = json.dumps(data, ensure_ascii=False)
+    data_json_min = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    unmin = HTML_TEMPLATE.format(site_title=encoded['site_title'], json_data=data_json,
+                                 category_hierarchy=encoded['category_hierarchy'], js=js['logic'] + '\n' + js['main'])
+    minified = minify_code(HTML_TEMPLATE.format(
+        site_title=encoded['site_title'], json_data=data_json_min,
+        category_hierarchy=encoded['category_hierarchy_min'], js=js['minified']))
+    # The size report measured every section of both pages
+    section_sizes(measure_sections(unmin, data_json, encoded['category_hierarchy']))
+    section_sizes(measure_sections(minified, data_json_min, encoded['category_hierarchy_min']))
+    for path, page in ((output_unmin, unmin), (output, minified)):
+        raw = page.encode('utf-8')
+        write_artifact(path, raw, compressed_variants(raw))
+
+
+def streamed_render(encoded, js, output_unmin, output):
+    for page in render_pages(encoded, js, output_unmin, output):
+        page.commit()
+
+
+def measure(fn, encoded, js, out_dir):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(encoded, js, os.path.join(out_dir, 'index_unminified.html'), os.path.join(out_dir, 'index.html'))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 50000], help='Business counts')
+    args = parser.parse_args()
+
+    js = {}
+    for key, path in (('logic', 'js/logic.js'), ('main', 'js/main.js')):
+        with open(path, encoding='utf-8') as f:
+            js[key] = f.read()
+    js['minified'] = js['logic'] + '\n' + js['main']
+
+    out_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'businesses':>10}  {'page MB':>8}  {'legacy':>16}  {'streamed':>16}")
+        for count in args.counts:
+            encoded = make_encoded(count)
+            legacy_time, legacy_peak = measure(legacy_render, encoded, js, out_dir)
+            size = os.path.getsize(os.path.join(out_dir, 'index.html')) / 1024 / 1024
+            stream_time, stream_peak = measure(streamed_render, encoded, js, out_dir)
+            print(f"{count:>10}  {size:>8.1f}  {legacy_time:6.2f}s {legacy_peak / 2**20:6.1f}MB  "
+                  f"{stream_time:6.2f}s {stream_peak / 2**20:6.1f}MB")
+    finally:
+        shutil.rmtree(out_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,30 +5,106 @@
 # ]
 # ///
 
+import argparse
+import glob
+import gzip
 import tomli
-import tomli_w
 import json
 import subprocess
 import os
 import re
+import sqlite3
+import geocoding
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from artifacts import StreamedArtifact, artifact_paths, check_budgets, format_size_table, parse_budget
+from build_cache import BuildManifest, BuildMemo
+from devserver import DEFAULT_PORT, run as run_dev
+from client_encoding import encode_columnar
+from enriched_store import EnrichedStore
+from data_source import DATA_DIR, SITE_FILE, DataSourceError, default_source, load_source, source_files
+from hours import with_compiled_hours
+from pipeline import Stage, run_stages
+from profiling import Profiler
+from spatial_index import build_spatial_index, points_of
+from template import Template, iter_json, render
+from tiles import DEFAULT_TILE_ZOOM, TILE_DIR, TileSet, remove_tiles
 from geocoding import process_data_with_geocoding
 
 # Configuration
 TOML_FILE = 'data.toml'
 ENRICHED_TOML_FILE = 'data_enriched.toml'
+ENRICHED_STORE_FILE = 'data_enriched.sqlite'
 OUTPUT_FILE = 'index.html'
 OUTPUT_FILE_UNMIN = 'index_unminified.html'
+MINIFIED_JS_FILE = 'js/minified.js'
+JS_SOURCES = ('js/logic.js', 'js/main.js')
+PROFILE_TRACE_FILE = 'build-trace.json'
+BUILD_CACHE_DIR = '.build-cache'
+SITES_OUTPUT_DIR = 'sites'
+# Top-level data.toml tables that are not sent to the browser in rawData
+BUILD_ONLY_KEYS = ('categories', 'size_budget')
+
+def _string_literal_pattern(quote):
+    # Quote, body with backslash escapes consumed as pairs (unrolled loop), then
+    # the closing quote -- or end of input, including a lone trailing backslash.
+    return r'{q}[^{q}\\]*(?:\\.[^{q}\\]*)*(?:{q}|\\?\Z)'.format(q=quote)
+
+
+# One match covers a maximal run of text that contains no comments: plain
+# characters, whole string literals, and '<' or '/' that do not open a comment.
+# A '/' directly after ':' is kept so protocol slashes (https://) survive.
+_KEEP_RUN_RE = re.compile(
+    r'(?:[^"\'`</]+|'
+    + '|'.join(_string_literal_pattern(q) for q in ('"', "'", '`'))
+    + r'|<(?!!--)|/(?![*/])|(?<=:)/(?=/))+',
+    re.DOTALL,
+)
 
-def _strip_comments(content):
-    """Remove comments while preserving string literals.
 
-    Walks through the text character-by-character so that comment-like
-    sequences inside quoted strings or template literals are left alone.
-    Handles:
+def iter_strip_comments(content):
+    """Yield *content* in chunks with comments removed, string literals intact.
+
+    Each regex match swallows everything up to the next comment, so Python
+    only loops once per comment rather than once per character. Handles:
       - HTML comments  <!-- ... -->
       - CSS/JS block comments  /* ... */
-      - JS single-line comments  // ...
+      - JS single-line comments  // ...  (but not protocol slashes like https://)
       - single-quoted, double-quoted and backtick strings (with escapes)
+    Unterminated strings and comments run to the end of the input.
+    """
+    i = 0
+    length = len(content)
+    match_run = _KEEP_RUN_RE.match
+    while i < length:
+        run = match_run(content, i)
+        if run:
+            yield run.group()
+            i = run.end()
+            if i >= length:
+                return
+
+        # Anything the run stopped at is the start of a comment.
+        if content.startswith('<!--', i):
+            end = content.find('-->', i + 4)
+            i = length if end == -1 else end + 3
+        elif content.startswith('/*', i):
+            end = content.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+        else:
+            end = content.find('\n', i + 2)
+            i = length if end == -1 else end  # keep the newline itself
+
+
+def _strip_comments(content):
+    """Remove comments while preserving string literals."""
+    return ''.join(iter_strip_comments(content))
+
+
+def _strip_comments_charwise(content):
+    """Original character-at-a-time comment stripper.
+
+    Kept as the reference implementation that `iter_strip_comments` must
+    match exactly; used by the tests and benchmarks/bench_minify.py.
     """
     result = []
     i = 0
@@ -78,17 +154,33 @@ def _strip_comments(content):
     return ''.join(result)
 
 
+def iter_minify_code(content):
+    """Yield the minified form of *content* chunk by chunk.
+
+    Strips comments, then trims every line and joins the lines without
+    separators -- the single-pass equivalent of removing leading/trailing
+    whitespace per line followed by deleting all newlines.
+    """
+    pending = []  # pieces of the current, not yet terminated line
+    for chunk in iter_strip_comments(content):
+        if '\n' not in chunk:
+            pending.append(chunk)
+            continue
+        lines = chunk.split('\n')
+        pending.append(lines[0])
+        out = [''.join(pending).strip()]
+        out.extend(line.strip() for line in lines[1:-1])
+        pending = [lines[-1]]
+        yield ''.join(out)
+    if pending:
+        yield ''.join(pending).strip()
+
+
 def minify_code(content):
-    # Remove comments (string-aware)
-    content = _strip_comments(content)
-    # Remove leading/trailing whitespace on lines
-    content = re.sub(r'^\s+|\s+$', '', content, flags=re.MULTILINE)
-    # Remove empty lines
-    content = re.sub(r'\n+', '', content)
-    return content
+    return ''.join(iter_minify_code(content))
 
 # The HTML Template
-# We use a Python f-string to inject the JSON directly into the JS variable.
+# A str.format template; template.Template splits it into text and slots once.
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -183,9 +275,9 @@ HTML_TEMPLATE = """
 <script src="https://unpkg.com/leaflet.markercluster@1.4.1/dist/leaflet.markercluster.js"></script>
 <script>
     const rawData = {json_data};
-    const businesses = rawData.businesses;
+    const businesses = decodeBusinesses(rawData.businesses);
     const categoryHierarchy = {category_hierarchy};
-    /* JS_INJECTION_POINT */
+    {js}
 </script>
 </body>
 </html>
@@ -197,96 +289,564 @@ def build_category_hierarchy_js(data):
     return json.dumps(categories, ensure_ascii=False)
 
 
-def build():
-    # 1. Read TOML
-    print(f"Reading {TOML_FILE}...")
-    try:
-        with open(TOML_FILE, "rb") as f:
-            data = tomli.load(f)
-    except FileNotFoundError:
-        print(f"Error: {TOML_FILE} not found!")
-        return
+class BuildError(Exception):
+    """A build stage failed; the message is printed by build()."""
+
+
+def report_encoding_savings(businesses):
+    """Print JSON vs columnar payload sizes (raw and gzipped) for the businesses."""
+    as_json = json.dumps(businesses, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    as_columnar = json.dumps(encode_columnar(businesses), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    for label, raw in (("raw", (as_json, as_columnar)), ("gzip", tuple(gzip.compress(b, 9) for b in (as_json, as_columnar)))):
+        before, after = len(raw[0]), len(raw[1])
+        saved = 100 * (1 - after / before) if before else 0
+        print(f"  business payload ({label}): json {before:,} B -> columnar {after:,} B ({saved:.0f}% smaller)")
+
+
+def encode_client_data(data, tile_index=None, encoding='json', spatial_index=False, compile_hours=False):
+    """Prepare the data sent to the browser.
+
+    Keys in BUILD_ONLY_KEYS are stripped from the client data: categories
+    are injected separately as categoryHierarchy, and size_budget is build
+    configuration the page never reads.
 
-    # 1.5. Geocode addresses if lat/long are missing
-    process_data_with_geocoding(data)
+    With a *tile_index* the businesses are left out too: the page fetches
+    them per tile (see tiles.py). With ``encoding='columnar'`` the
+    businesses are sent in the compact format from client_encoding.py and
+    decoded by decodeBusinesses() in the page. With *spatial_index* a grid
+    index over the business coordinates (see spatial_index.py) is added as
+    rawData.spatial_index; it is not built for tiled output, where
+    businesses arrive per tile. With *compile_hours* hours and
+    holiday_hours are replaced by the numeric tables from hours.py.
 
-    # 1.6. Save enriched data
-    print(f"Saving enriched data to {ENRICHED_TOML_FILE}...")
-    with open(ENRICHED_TOML_FILE, "wb") as f:
-        tomli_w.dump(data, f)
+    The client data is returned as objects and only serialised while the
+    pages are streamed (render_pages); the small category JSON is returned
+    as text.
+    """
+    client_data = {k: v for k, v in data.items() if k not in BUILD_ONLY_KEYS}
+    if tile_index is not None:
+        client_data['businesses'] = []
+        client_data['tiles'] = tile_index
+    else:
+        businesses = client_data.get('businesses', [])
+        if compile_hours:
+            businesses = client_data['businesses'] = with_compiled_hours(businesses)
+        if spatial_index:
+            client_data['spatial_index'] = build_spatial_index(points_of(businesses))
+        if encoding == 'columnar':
+            report_encoding_savings(businesses)
+            client_data['businesses'] = encode_columnar(businesses)
+    return {
+        'client_data': client_data,
+        'category_hierarchy': build_category_hierarchy_js(data),
+        'category_hierarchy_min': json.dumps(data.get('categories', {}), ensure_ascii=False, separators=(',', ':')),
+        'site_title': data.get('title', 'Guide'),
+    }
+
+
+PAGE_TEMPLATE = Template(HTML_TEMPLATE)
+# Slot values are inserted into the minified page as they are: the JSON has
+# no comments or raw newlines and the JS is minified on its own.
+PAGE_TEMPLATE_MIN = Template(HTML_TEMPLATE, minify=minify_code)
+# Size-report sections of the slots whose position says 'js'
+SLOT_SECTIONS = {'json_data': 'data', 'category_hierarchy': 'categories'}
 
-    # 1.7 Build category hierarchy JS and strip categories from data sent to client
-    category_hierarchy_json = build_category_hierarchy_js(data)
-    category_hierarchy_json_min = json.dumps(data.get('categories', {}), ensure_ascii=False, separators=(',', ':'))
 
-    # Remove categories from the data sent to the client (it's injected separately)
-    client_data = {k: v for k, v in data.items() if k != 'categories'}
+def render_pages(encoded, js, output_unmin, output):
+    """Stream the unminified and minified pages to disk in one pass.
+
+    *js* holds the 'logic', 'main' and 'minified' sources. Returns the two
+    StreamedArtifacts, closed but not committed, so the caller can check
+    their sizes before putting them in place.
+    """
+    unmin = StreamedArtifact(output_unmin)
+    minified = StreamedArtifact(output, measure_compressed=True)
+    try:
+        render([
+            (PAGE_TEMPLATE, {
+                'site_title': encoded['site_title'],
+                'json_data': iter_json(encoded['client_data']),
+                'category_hierarchy': encoded['category_hierarchy'],
+                'js': (js['logic'], "\n", js['main']),
+            }, unmin),
+            (PAGE_TEMPLATE_MIN, {
+                'site_title': encoded['site_title'],
+                'json_data': iter_json(encoded['client_data'], separators=(',', ':')),
+                'category_hierarchy': encoded['category_hierarchy_min'],
+                'js': iter_minify_code(js['minified']),
+            }, minified),
+        ], SLOT_SECTIONS)
+        unmin.close()
+        minified.close()
+    except BaseException:
+        unmin.discard()
+        minified.discard()
+        raise
+    return unmin, minified
 
-    # 2. Convert Data to JSON string
-    # Minified JSON for production
-    json_data_min = json.dumps(client_data, ensure_ascii=False, separators=(',', ':'))
-    # Pretty JSON for dev (optional, but keep simple)
-    json_data = json.dumps(client_data, ensure_ascii=False)
 
-    # 2.5 Run Minification
+def _run_minify(manifest):
+    """Minify js/logic.js and js/main.js into MINIFIED_JS_FILE with npm/terser."""
     print("Running JS minification...")
     try:
         subprocess.run(["npm", "run", "minify"], check=True)
     except subprocess.CalledProcessError as e:
-        print(f"Error running minification: {e}")
-        return
+        raise BuildError(f"could not run minification: {e}")
     except FileNotFoundError:
-        print("Error: npm not found. Make sure npm is installed and in your PATH.")
-        return
+        raise BuildError("npm not found. Make sure npm is installed and in your PATH.")
+    manifest.record('minify_js', JS_SOURCES, [MINIFIED_JS_FILE])
 
-    # 2.6 Read JS files
+
+def _site_paths(toml_file=None, output_dir=None):
+    """Return the input and output paths of one site.
+
+    Without arguments these are the module defaults (data.toml -> index.html
+    in the current directory). *toml_file* may also be a data directory (see
+    data_source.py). With *output_dir* every output, the enriched-data store
+    and the build caches go into that directory.
+    """
+    paths = {
+        'toml': toml_file or TOML_FILE,
+        'enriched': ENRICHED_STORE_FILE,
+        'output': OUTPUT_FILE,
+        'output_unmin': OUTPUT_FILE_UNMIN,
+        'cache_dir': BUILD_CACHE_DIR,
+        'tile_dir': TILE_DIR,
+    }
+    if output_dir is not None:
+        for key in ('enriched', 'output', 'output_unmin', 'cache_dir', 'tile_dir'):
+            paths[key] = os.path.join(output_dir, os.path.basename(paths[key]))
+    return paths
+
+
+def _build_stages(manifest, enrich_fresh, minify_fresh, render_inputs, outputs, render_params, profiler, memo=None,
+                  paths=None, pending=None):
+    """Return the build as a stage graph.
+
+    minify_js (npm) has no dependencies and runs alongside reading, geocoding
+    and encoding the data; the two HTML variants render concurrently. Stages
+    report the bytes they read and write to *profiler*. While the data is
+    unchanged, load_data reads the enriched records back from the store
+    instead of parsing the TOML. With a BuildMemo, parsed data and JS sources
+    are reused from memory while unchanged.
+    *paths* are the site paths from _site_paths(). Rendered pages wait in
+    *pending*, and tiles in memory, until write_output commits them; the
+    caller discards the pages if the build fails.
+    """
+    paths = paths or _site_paths()
+    pending = [] if pending is None else pending
+    enrich_inputs = [*source_files(paths['toml']), geocoding.CACHE_FILE, *geocoding.offline_data_files()]
+
+    def load_data(_):
+        source = paths['enriched'] if enrich_fresh else paths['toml']
+        print(f"Reading {source}...")
+
+        def parse():
+            if enrich_fresh:
+                with EnrichedStore(source) as store:
+                    return store.load()
+            return load_source(source, paths['cache_dir'])
+
+        files = [source] if enrich_fresh else source_files(source)
+        try:
+            data = memo.get(('data', source), files, parse) if memo else parse()
+        except FileNotFoundError:
+            raise BuildError(f"{source} not found!")
+        except (tomli.TOMLDecodeError, DataSourceError) as e:
+            raise BuildError(f"invalid TOML in {source}: {e}")
+        except sqlite3.DatabaseError as e:
+            raise BuildError(f"unreadable enriched-data store {source}: {e} (rebuild with --force)")
+        profiler.count(bytes_in=sum(os.path.getsize(path) for path in files))
+        return data
+
+    def geocode(deps):
+        data = deps['load_data']
+        if not enrich_fresh:
+            # Geocode addresses if lat/long are missing
+            if memo:
+                cache = memo.geocoding_cache
+                cached_count = len(cache)
+                process_data_with_geocoding(data, cache=cache)
+                if len(cache) != cached_count:
+                    geocoding.save_cache(cache)
+            else:
+                process_data_with_geocoding(data)
+        return data
+
+    def save_enriched(deps):
+        if enrich_fresh:
+            print(f"{paths['toml']} unchanged, reusing {paths['enriched']}")
+            return
+        with EnrichedStore(paths['enriched']) as store:
+            written = store.save(deps['geocode'])
+        print(f"Updated {written} enriched record(s) in {paths['enriched']}")
+        profiler.count(bytes_out=store.bytes_written)
+        manifest.record('enrich', enrich_inputs, [paths['enriched']])
+
+    def shard_tiles(deps):
+        if not render_params['tiles']:
+            return None
+        data = deps['geocode']
+        map_defaults = data.get('map_defaults', {})
+        zoom = render_params['tile_zoom'] or map_defaults.get('tile_zoom', DEFAULT_TILE_ZOOM)
+        encode = encode_columnar if render_params['encoding'] == 'columnar' else None
+        businesses = data.get('businesses', [])
+        if render_params['compile_hours']:
+            businesses = with_compiled_hours(businesses)
+        # Tile URLs are fetched relative to the page, not the working directory
+        url_prefix = os.path.relpath(paths['tile_dir'], os.path.dirname(paths['output']) or os.curdir)
+        # Written by write_output, once the pages are within budget
+        return TileSet(businesses, zoom, paths['tile_dir'], map_defaults.get('max_bounds'), encode=encode,
+                       url_prefix=url_prefix)
+
+    def encode(deps):
+        tile_set = deps['shard_tiles']
+        encoded = encode_client_data(deps['geocode'], tile_index=tile_set.index if tile_set else None,
+                                     encoding=render_params['encoding'],
+                                     spatial_index=render_params['spatial_index'],
+                                     compile_hours=render_params['compile_hours'])
+        return encoded
+
+    def minify_js(_):
+        if minify_fresh:
+            print("JS sources unchanged, skipping minification")
+            return
+        _run_minify(manifest)
+
+    def read_js(_):
+        def read(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+
+        sources = {}
+        try:
+            for key, path in zip(('logic', 'main', 'minified'), (*JS_SOURCES, MINIFIED_JS_FILE)):
+                sources[key] = memo.get(('js', path), [path], lambda: read(path)) if memo else read(path)
+                profiler.count(bytes_in=len(sources[key]))
+        except FileNotFoundError as e:
+            raise BuildError(f"could not read JS files: {e}")
+        return sources
+
+    def render(deps):
+        unmin, minified = render_pages(deps['encode'], deps['read_js'], paths['output_unmin'], paths['output'])
+        pending.extend((unmin, minified))
+        profiler.count(bytes_out=sum(sum(page.totals.values()) for page in (unmin, minified)))
+        return unmin, minified
+
+    def size_report(deps):
+        unmin, minified = deps['render']
+        totals = {os.path.basename(page.path): page.totals for page in (unmin, minified)}
+        print(format_size_table(unmin.sections, minified.sections, totals,
+                                os.path.basename(paths['output_unmin']), os.path.basename(paths['output'])))
+
+        budgets = dict(deps['geocode'].get('size_budget', {}))
+        budgets.update(render_params['budgets'])
+        failures = check_budgets(totals, budgets)
+        if failures:
+            raise BuildError("size budget exceeded:\n  " + "\n  ".join(failures))
+
+    def write_output(deps):
+        unmin, minified = deps['render']
+        # Tiles first, so a new page never references tiles that are not there yet
+        if deps['shard_tiles']:
+            deps['shard_tiles'].commit()
+        unmin.commit()
+        print(f"Unminified build complete: {paths['output_unmin']}")
+        minified.commit()
+        # Tiles left by an earlier --tiles build, removed once no page references them
+        if not deps['shard_tiles'] and os.path.exists(os.path.join(paths['tile_dir'], 'index.json')):
+            print(f"Removing tiles of a previous --tiles build from {paths['tile_dir']}")
+            remove_tiles(paths['tile_dir'])
+        pending.clear()
+        manifest.record('render', render_inputs, outputs, render_params)
+
+    return [
+        Stage('load_data', load_data),
+        Stage('geocode', geocode, ['load_data']),
+        Stage('save_enriched', save_enriched, ['geocode']),
+        Stage('shard_tiles', shard_tiles, ['geocode']),
+        Stage('encode', encode, ['geocode', 'shard_tiles']),
+        Stage('minify_js', minify_js),
+        Stage('read_js', read_js, ['minify_js']),
+        Stage('render', render, ['encode', 'read_js']),
+        Stage('size_report', size_report, ['geocode', 'render']),
+        Stage('write_output', write_output, ['size_report', 'render', 'save_enriched', 'shard_tiles']),
+    ]
+
+
+def build(force=False, jobs=None, report_timings=False, tiles=False, tile_zoom=None, encoding='json',
+          budgets=None, spatial_index=False, compile_hours=False, profile=None, memo=None,
+          toml_file=None, output_dir=None, js_prebuilt=False):
+    """Build index.html and index_unminified.html from data.toml.
+
+    *toml_file* (a TOML file or a data directory) and *output_dir* build
+    another site instead (see _site_paths); with *js_prebuilt* the caller has already brought
+    MINIFIED_JS_FILE up to date and npm is not run.
+
+    The build runs as a stage graph (see _build_stages) on up to *jobs*
+    threads; ``jobs=1`` runs it sequentially. Stages are skipped when the
+    build manifest shows their inputs and outputs are unchanged since the
+    last run; pass ``force=True`` to rebuild everything. With
+    *report_timings* a per-stage timing table is printed, including how much
+    wall-clock time running stages concurrently saved.
+
+    With *tiles* the businesses are not inlined into the page but written as
+    slippy-map tiles under TILE_DIR at *tile_zoom* (default: map_defaults
+    tile_zoom, else DEFAULT_TILE_ZOOM) and fetched by viewport. *encoding*
+    selects how businesses are serialised for the page: 'json' (an array of
+    objects) or 'columnar' (see client_encoding.py). *spatial_index* embeds
+    a grid index so the page only creates markers near the viewport.
+    *compile_hours* sends opening hours as precomputed tables (hours.py).
+
+    Both pages are written with precompressed .gz (and .br) variants and a
+    per-section size table is printed. The build fails, before writing pages
+    or tiles, if a page exceeds a budget from data.toml [size_budget] or
+    *budgets* ({'index.html.gz': 60000, ...}; these take precedence).
+
+    With *profile* (a file path) every stage's wall time, CPU time, bytes in
+    and out and peak memory are printed and a Chrome trace is written there.
+    A long-running caller (--watch) passes the same BuildMemo to every call
+    so unchanged inputs are not re-read.
+    Returns True on success.
+    """
+    paths = _site_paths(toml_file, output_dir)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    manifest = BuildManifest(paths['cache_dir'], force=force)
+    enrich_fresh = manifest.is_fresh('enrich', [*source_files(paths['toml']), geocoding.CACHE_FILE,
+                                                *geocoding.offline_data_files()], [paths['enriched']])
+    minify_fresh = js_prebuilt or manifest.is_fresh('minify_js', JS_SOURCES, [MINIFIED_JS_FILE])
+    render_inputs = [paths['enriched'], *JS_SOURCES, MINIFIED_JS_FILE, __file__]
+    outputs = artifact_paths(paths['output_unmin']) + artifact_paths(paths['output'])
+    if tiles:
+        outputs.append(os.path.join(paths['tile_dir'], 'index.json'))
+    render_params = {
+        'tiles': tiles,
+        'tile_zoom': tile_zoom,
+        'encoding': encoding,
+        'budgets': dict(budgets or {}),
+        'spatial_index': spatial_index,
+        'compile_hours': compile_hours,
+    }
+    if enrich_fresh and minify_fresh and manifest.is_fresh('render', render_inputs, outputs, render_params):
+        print(f"Inputs unchanged, {paths['output']} is up to date.")
+        return True
+
+    if memo and memo.geocoding_cache is None:
+        memo.geocoding_cache = geocoding.load_cache()
+    profiler = Profiler(enabled=profile is not None)
+    pending = []
+    stages = _build_stages(manifest, enrich_fresh, minify_fresh, render_inputs, outputs, render_params, profiler, memo,
+                           paths, pending)
     try:
-        with open("js/logic.js", "r", encoding="utf-8") as f:
-            js_logic = f.read()
-        with open("js/main.js", "r", encoding="utf-8") as f:
-            js_main = f.read()
-        with open("js/minified.js", "r", encoding="utf-8") as f:
-            js_minified = f.read()
-    except FileNotFoundError as e:
-        print(f"Error reading JS files: {e}")
-        return
-
-    # 3. Inject into HTML
-    print("Injecting data into HTML...")
-    
-    # UNMINIFIED VERSION
-    formatted_html = HTML_TEMPLATE.format(
-        site_title=data.get('title', 'Guide'),
-        json_data=json_data,
-        category_hierarchy=category_hierarchy_json
+        run = run_stages(stages, max_workers=jobs, profiler=profiler)
+    except BuildError as e:
+        print(f"Error: {e}")
+        return False
+    finally:
+        profiler.close()
+        for page in pending:
+            page.discard()
+
+    if report_timings:
+        print(run.report())
+    if profile is not None:
+        print(profiler.summary())
+        profiler.write_trace(profile)
+        print(f"Profile trace written to {profile} (open in chrome://tracing or ui.perfetto.dev)")
+    print(f"Build complete! Open {paths['output']} to view your site.")
+    return True
+
+
+def site_sources(pattern):
+    """Return the site sources for --sites.
+
+    For a directory these are its *.toml files and its subdirectories that
+    are data directories (hold a site.toml); otherwise the matches of the
+    glob *pattern*.
+    """
+    if not os.path.isdir(pattern):
+        return sorted(glob.glob(pattern))
+    return sorted(
+        path for path in glob.glob(os.path.join(pattern, '*'))
+        if path.endswith('.toml') and os.path.isfile(path) or os.path.isfile(os.path.join(path, SITE_FILE))
     )
-    final_html_unmin = formatted_html.replace("/* JS_INJECTION_POINT */", js_logic + "\n" + js_main)
-
-    # MINIFIED VERSION
-    # Note: We must inject before stripping comments because JS_INJECTION_POINT is a comment!
-    # Or we can strip "other" comments first?
-    # Actually, simpler: Use formatted_html but with json_data_min
-    formatted_html_min = HTML_TEMPLATE.format(
-        site_title=data.get('title', 'Guide'),
-        json_data=json_data_min,
-        category_hierarchy=category_hierarchy_json_min
+
+
+# Per-process state of build_sites() workers
+_worker_geocoding_cache = None
+
+
+def _init_site_worker(cache_rows):
+    global _worker_geocoding_cache
+    _worker_geocoding_cache = geocoding.load_cache(cache_rows)
+
+
+def _build_site(toml_file, output_dir, options):
+    memo = BuildMemo(geocoding_cache=_worker_geocoding_cache)
+    return build(**options, memo=memo, toml_file=toml_file, output_dir=output_dir, js_prebuilt=True)
+
+
+def build_sites(sources, out_root=SITES_OUTPUT_DIR, processes=None, force=False, **options):
+    """Build every site TOML in *sources* into out_root/<name>/ on a process pool.
+
+    The shared JS bundle is minified once up front. The geocoding cache is
+    read once, here, and its rows are handed to every worker; a worker writes
+    the addresses it geocodes straight to the database (SQLite handles the
+    concurrent writers) and to its own copy of the rows. Each site keeps its own
+    enriched-data store and build manifest in its output directory, so
+    unchanged sites are skipped (after a batch that geocoded new addresses,
+    the next one re-enriches every site once, from the cache). *options* are
+    passed on to build().
+    Returns True if every site built.
+    """
+    names = [os.path.splitext(os.path.basename(source))[0] for source in sources]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        print(f"Error: several site files are named {', '.join(duplicates)}")
+        return False
+    if not sources:
+        print("Error: no site TOML files found")
+        return False
+
+    manifest = BuildManifest(BUILD_CACHE_DIR, force=force)
+    try:
+        if not manifest.is_fresh('minify_js', JS_SOURCES, [MINIFIED_JS_FILE]):
+            _run_minify(manifest)
+    except BuildError as e:
+        print(f"Error: {e}")
+        return False
+
+    # Also creates the database (and imports the JSON cache) before the workers open it
+    cache = geocoding.load_cache()
+    cache_rows = cache.rows() if isinstance(cache, geocoding.GeocodingCache) else None
+    geocoding.close_cache(cache)
+    results = {}
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_site_worker,
+                             initargs=(cache_rows,)) as pool:
+        futures = {
+            pool.submit(_build_site, source, os.path.join(out_root, name), dict(options, force=force)): name
+            for source, name in zip(sources, names)
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # One site's crash (or a dead worker) must not abandon the rest of the batch
+                print(f"Error: building {name} failed: {e}")
+                results[name] = False
+    failed = sorted(name for name, ok in results.items() if not ok)
+    print(f"Built {len(results) - len(failed)}/{len(results)} sites into {out_root}/")
+    if failed:
+        print(f"Failed: {', '.join(failed)}")
+    return not failed
+
+
+def geocode_only(sources):
+    """Geocode the addresses of *sources* into the geocoding cache without building.
+
+    Addresses shared by several sources are looked up once. The cache is
+    checkpointed as results arrive, so an interrupted run resumes where it
+    stopped. Returns True unless a source could not be read.
+    """
+    combined = {'businesses': [], 'locations': []}
+    for source in sources:
+        print(f"Reading {source}...")
+        try:
+            data = load_source(source)
+        except FileNotFoundError:
+            print(f"Error: {source} not found!")
+            return False
+        except (tomli.TOMLDecodeError, DataSourceError) as e:
+            print(f"Error: invalid TOML in {source}: {e}")
+            return False
+        for category in combined:
+            combined[category].extend(data.get(category, []))
+    process_data_with_geocoding(combined)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build index.html from data.toml.")
+    parser.add_argument("--data", default=None, metavar="PATH",
+                        help=f"Data file or directory (default: {DATA_DIR}/ if it has a {SITE_FILE}, else {TOML_FILE})")
+    parser.add_argument("--force", action="store_true", help="Ignore the build manifest and rebuild every stage")
+    parser.add_argument("--jobs", type=int, default=None, help="Maximum stages to run at once (1 = sequential)")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings and the time saved by overlap")
+    parser.add_argument("--tiles", action="store_true", help=f"Write businesses as map tiles under {TILE_DIR}/ instead of inlining them")
+    parser.add_argument("--tile-zoom", type=int, default=None, help=f"Zoom level of the tiles (default {DEFAULT_TILE_ZOOM})")
+    parser.add_argument("--encoding", choices=["json", "columnar"], default="json",
+                        help="How businesses are serialised into the page (default: json)")
+    parser.add_argument("--spatial-index", action="store_true",
+                        help="Embed a grid index so the page only renders markers near the viewport")
+    parser.add_argument("--compile-hours", action="store_true",
+                        help="Send opening hours as precomputed weekly/holiday tables")
+    parser.add_argument("--budget", action="append", default=[], metavar="NAME=BYTES",
+                        help="Fail if an artifact is larger, e.g. index.html.gz=60000 (repeatable)")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_TRACE_FILE, default=None, metavar="TRACE_FILE",
+                        help=f"Profile each stage and write a Chrome trace (default {PROFILE_TRACE_FILE})")
+    parser.add_argument("--sites", metavar="DIR_OR_GLOB",
+                        help="Build every site TOML in a directory (or matching a glob) into its own output directory")
+    parser.add_argument("--out-dir", default=SITES_OUTPUT_DIR,
+                        help=f"Where --sites writes <site>/index.html (default {SITES_OUTPUT_DIR}/)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Sites built at once with --sites (default: one per CPU)")
+    parser.add_argument("--watch", action="store_true",
+                        help="Rebuild whenever the data or js/*.js changes")
+    parser.add_argument("--serve", nargs="?", type=int, const=DEFAULT_PORT, default=None, metavar="PORT",
+                        help=f"Serve the site with live reload (default port {DEFAULT_PORT})")
+    parser.add_argument("--export-enriched", nargs="?", const=ENRICHED_TOML_FILE, default=None, metavar="PATH",
+                        help=f"After the build, export the enriched data as TOML (default {ENRICHED_TOML_FILE})")
+    parser.add_argument("--geocode-only", action="store_true",
+                        help="Only geocode the data (or every --sites source) into the cache, resumably")
+    args = parser.parse_args()
+    if args.geocode_only and (args.watch or args.serve is not None or args.export_enriched):
+        parser.error("--geocode-only cannot be combined with --watch, --serve or --export-enriched")
+    if args.export_enriched and (args.sites or args.watch or args.serve is not None):
+        parser.error("--export-enriched cannot be combined with --sites, --watch or --serve")
+    try:
+        budgets = dict(parse_budget(spec) for spec in args.budget)
+    except ValueError as e:
+        parser.error(str(e))
+    source = args.data or default_source(TOML_FILE)
+    if args.geocode_only:
+        return 0 if geocode_only(site_sources(args.sites) if args.sites else [source]) else 1
+    options = dict(
+        toml_file=source,
+        force=args.force,
+        jobs=args.jobs,
+        report_timings=args.timings,
+        tiles=args.tiles,
+        tile_zoom=args.tile_zoom,
+        encoding=args.encoding,
+        budgets=budgets,
+        spatial_index=args.spatial_index,
+        compile_hours=args.compile_hours,
+        profile=args.profile,
     )
-    
-    # Replace injection point with minified JS
-    final_html_min = formatted_html_min.replace("/* JS_INJECTION_POINT */", js_minified)
-    
-    # Now minify the HTML structure
-    final_html_min = minify_code(final_html_min)
-
-    # 4. Write Output
-    with open(OUTPUT_FILE_UNMIN, "w", encoding="utf-8") as f:
-        f.write(final_html_unmin)
-    print(f"Unminified build complete: {OUTPUT_FILE_UNMIN}")
-
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write(final_html_min)
-        
-    print(f"Build complete! Open {OUTPUT_FILE} to view your site.")
+    if args.sites:
+        sources = site_sources(args.sites)
+        options.pop('profile')
+        options.pop('toml_file')
+        return 0 if build_sites(sources, args.out_dir, processes=args.processes, **options) else 1
+    if args.watch or args.serve is not None:
+        memo = BuildMemo()
+
+        def rebuild():
+            ok = build(**options, memo=memo)
+            options['force'] = False  # --force applies to the first build only
+            return ok
+
+        return run_dev(rebuild, lambda: [*source_files(source), *JS_SOURCES], watch_inputs=args.watch, port=args.serve)
+    if not build(**options):
+        return 1
+    if args.export_enriched:
+        with EnrichedStore(ENRICHED_STORE_FILE) as store:
+            store.export_toml(args.export_enriched)
+        print(f"Exported enriched data to {args.export_enriched}")
+    return 0
+
 
 if __name__ == "__main__":
-    build()
+    raise SystemExit(main())
@@ -0,0 +1,151 @@
+"""Content-hash build manifest.
+
+build.py records, for every stage it runs, the SHA-256 of each input file and
+each output file. On the next run a stage whose inputs still hash the same
+and whose outputs are still on disk unchanged is skipped.
+
+The manifest lives in ``.build-cache/manifest.json``:
+
+    {
+        "version": 1,
+        "stages": {
+            "minify_js": {
+                "inputs": {"js/logic.js": "<sha256>", ...},
+                "outputs": {"js/minified.js": "<sha256>"}
+            }
+        }
+    }
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+CACHE_DIR = '.build-cache'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+
+def file_digest(path):
+    """Return the hex SHA-256 of a file's contents, or None if it does not exist."""
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def digest_files(paths):
+    """Hash each of *paths*.
+
+    A SQLite database in WAL mode (the geocoding cache, the enriched-data
+    store) keeps recent commits in a -wal file next to it until they are
+    checkpointed, so a non-empty -wal file is hashed along with the database.
+    """
+    digests = {}
+    for path in paths:
+        digest = file_digest(path)
+        wal_path = path + '-wal'
+        if os.path.exists(wal_path) and os.path.getsize(wal_path):
+            digest = f"{digest}+{file_digest(wal_path)}"
+        digests[path] = digest
+    return digests
+
+
+class BuildManifest:
+    """Tracks which build stages are up to date.
+
+    With ``force=True`` every stage is reported stale, but results are still
+    recorded so the following run can skip them. Stages running on different
+    threads may record concurrently.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, force=False):
+        self.path = os.path.join(cache_dir, MANIFEST_NAME)
+        self.force = force
+        self.stages = self._load()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load build manifest: {e}")
+            return {}
+        if manifest.get('version') != MANIFEST_VERSION:
+            return {}
+        return manifest.get('stages', {})
+
+    def is_fresh(self, stage, inputs, outputs, params=None):
+        """True when *stage* last ran on identical inputs and its outputs are intact.
+
+        *params* is an optional JSON-serialisable dict of build options that
+        affect the stage's output; changing it makes the stage stale.
+        """
+        if self.force:
+            return False
+        entry = self.stages.get(stage)
+        if entry is None or entry.get('params') != params:
+            return False
+        if entry.get('inputs') != digest_files(inputs):
+            return False
+        current_outputs = digest_files(outputs)
+        if any(digest is None for digest in current_outputs.values()):
+            return False
+        return entry.get('outputs') == current_outputs
+
+    def record(self, stage, inputs, outputs, params=None):
+        """Store the current hashes for *stage* and persist the manifest."""
+        entry = {
+            'inputs': digest_files(inputs),
+            'outputs': digest_files(outputs),
+        }
+        if params is not None:
+            entry['params'] = params
+        with self._lock:
+            self.stages[stage] = entry
+            self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'stages': self.stages}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class BuildMemo:
+    """Keeps loaded inputs in memory between builds in one process.
+
+    Used by ``build.py --watch``: parsed TOML and JS sources are reused while
+    the files they came from still hash the same, and the geocoding cache is
+    opened once. It is saved after a build that geocoded new addresses.
+    """
+
+    def __init__(self, geocoding_cache=None):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.geocoding_cache = geocoding_cache
+
+    def get(self, key, paths, load):
+        """Return the value stored under *key*, calling *load* if any of *paths* changed."""
+        digests = digest_files(paths)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == digests:
+            return entry[1]
+        value = load()
+        with self._lock:
+            self._entries[key] = (digests, value)
+        return value
@@ -0,0 +1,156 @@
+"""Compact columnar encoding of the business list sent to the browser.
+
+Instead of an array of objects that repeats every key and every hours string,
+businesses are stored as columns (struct-of-arrays):
+
+    {
+        "format": "columnar-v1",
+        "count": 2,
+        "strings": ["restaurant", "monday", "07:00-16:00", ...],
+        "columns": [
+            ["id", "plain", ["hookfish", "devils-teeth"]],
+            ["type", "dict", [[0], [4, 5]]],
+            ["hours", "table", [[1, 2, 3, 2], null]],
+            ["lat", "delta", [377639196, -1209]],
+            ...
+        ]
+    }
+
+Column encodings:
+  plain  values as-is
+  dict   strings replaced by indexes into ``strings``; a list of strings
+         becomes a list of indexes, so a single type stays distinguishable
+         from a one-element list
+  table  a string->string table (hours, holiday_hours) as a flat
+         [key, value, key, value, ...] list of string indexes
+  delta  coordinates quantized to COORD_SCALE and delta-encoded against the
+         previous business that had a value
+
+``null`` means the business does not have that key (TOML has no null). The
+matching decoder is decodeBusinesses() in js/logic.js; decode_columnar()
+here is its Python twin, used by the tests.
+"""
+
+FORMAT = 'columnar-v1'
+# 1e-7 degrees is about 1 cm; coordinates with up to 7 decimals round-trip exactly.
+COORD_SCALE = 10 ** 7
+
+DICT_KEYS = ('type',)
+TABLE_KEYS = ('hours', 'holiday_hours')
+DELTA_KEYS = ('lat', 'long')
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings = []
+        self.index = {}
+
+    def add(self, value):
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return idx
+
+
+def _is_dict_value(value):
+    return isinstance(value, str) or (
+        isinstance(value, list) and all(isinstance(v, str) for v in value))
+
+
+def _is_table_value(value):
+    return isinstance(value, dict) and all(
+        isinstance(k, str) and isinstance(v, str) for k, v in value.items())
+
+
+def _is_coordinate(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _column_encoding(key, values):
+    present = [v for v in values if v is not None]
+    if key in DICT_KEYS and all(_is_dict_value(v) for v in present):
+        return 'dict'
+    if key in TABLE_KEYS and all(_is_table_value(v) for v in present):
+        return 'table'
+    if key in DELTA_KEYS and all(_is_coordinate(v) for v in present):
+        return 'delta'
+    return 'plain'
+
+
+def encode_columnar(businesses):
+    """Encode a list of business dicts into the columnar format."""
+    keys = []
+    for biz in businesses:
+        for key in biz:
+            if key not in keys:
+                keys.append(key)
+
+    strings = _StringTable()
+    columns = []
+    for key in keys:
+        values = [biz.get(key) for biz in businesses]
+        encoding = _column_encoding(key, values)
+        if encoding == 'dict':
+            data = [
+                None if v is None
+                else strings.add(v) if isinstance(v, str)
+                else [strings.add(s) for s in v]
+                for v in values
+            ]
+        elif encoding == 'table':
+            data = []
+            for v in values:
+                if v is None:
+                    data.append(None)
+                    continue
+                flat = []
+                for k, item in v.items():
+                    flat.append(strings.add(k))
+                    flat.append(strings.add(item))
+                data.append(flat)
+        elif encoding == 'delta':
+            data = []
+            prev = 0
+            for v in values:
+                if v is None:
+                    data.append(None)
+                    continue
+                q = round(v * COORD_SCALE)
+                data.append(q - prev)
+                prev = q
+        else:
+            data = values
+        columns.append([key, encoding, data])
+
+    return {
+        'format': FORMAT,
+        'count': len(businesses),
+        'strings': strings.strings,
+        'columns': columns,
+    }
+
+
+def decode_columnar(encoded):
+    """Rebuild the list of business dicts from encode_columnar() output."""
+    if encoded.get('format') != FORMAT:
+        raise ValueError(f"unsupported business encoding: {encoded.get('format')!r}")
+    strings = encoded['strings']
+    businesses = [{} for _ in range(encoded['count'])]
+    for key, encoding, data in encoded['columns']:
+        prev = 0
+        for biz, v in zip(businesses, data):
+            if v is None:
+                continue
+            if encoding == 'dict':
+                biz[key] = strings[v] if isinstance(v, int) else [strings[i] for i in v]
+            elif encoding == 'table':
+                biz[key] = {strings[v[i]]: strings[v[i + 1]] for i in range(0, len(v), 2)}
+            elif encoding == 'delta':
+                prev += v
+                biz[key] = prev / COORD_SCALE
+            elif encoding == 'plain':
+                biz[key] = v
+            else:
+                raise ValueError(f"unknown column encoding: {encoding!r}")
+    return businesses
@@ -0,0 +1,163 @@
+"""Split-source data: a data/ directory instead of one data.toml.
+
+    data/
+        site.toml            top-level settings (title, map_defaults, categories, ...)
+        businesses/*.toml    one business per file
+        locations/*.toml     one location per file
+
+load_source() turns either layout into the dict tomli.load() returns for a
+single data.toml: the items of each kind are appended, in file name order,
+after any listed in site.toml.
+
+Parsed files are kept in a parse cache (``.build-cache/parse-cache.pickle``)
+keyed by path. A file whose modification time and size are unchanged is not
+read at all; one whose stat changed is hashed and only re-parsed if its
+content did, so a run re-parses just the files that were edited. When many
+files need parsing they are parsed on a process pool (tomli is pure Python,
+so threads would not help).
+"""
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import tomli
+
+from build_cache import CACHE_DIR, file_digest
+
+DATA_DIR = 'data'
+SITE_FILE = 'site.toml'
+ITEM_KINDS = ('businesses', 'locations')
+PARSE_CACHE_NAME = 'parse-cache.pickle'
+PARSE_CACHE_VERSION = 1
+# Fewer files than this are parsed in-process; a pool costs more to start
+PARALLEL_PARSE_MIN = 64
+
+
+class DataSourceError(ValueError):
+    """A file of a data directory could not be parsed."""
+
+
+def default_source(toml_file):
+    """DATA_DIR if it holds a site.toml, else *toml_file*."""
+    return DATA_DIR if os.path.isfile(os.path.join(DATA_DIR, SITE_FILE)) else toml_file
+
+
+def item_files(source):
+    """Return {kind: [path, ...]} for the per-item files of a data directory."""
+    files = {}
+    for kind in ITEM_KINDS:
+        directory = os.path.join(source, kind)
+        try:
+            names = sorted(name for name in os.listdir(directory) if name.endswith('.toml'))
+        except FileNotFoundError:
+            names = []
+        files[kind] = [os.path.join(directory, name) for name in names]
+    return files
+
+
+def source_files(source):
+    """Every file *source* (a TOML file or a data directory) is read from."""
+    if not os.path.isdir(source):
+        return [source]
+    files = item_files(source)
+    return [os.path.join(source, SITE_FILE)] + [path for kind in ITEM_KINDS for path in files[kind]]
+
+
+def _parse_file(path):
+    with open(path, 'rb') as f:
+        try:
+            return tomli.load(f)
+        except tomli.TOMLDecodeError as e:
+            raise DataSourceError(f"{path}: {e}") from None
+
+
+class ParseCache:
+    """Parsed TOML files, reused while a file's stat or content hash is unchanged."""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.path = os.path.join(cache_dir, PARSE_CACHE_NAME)
+        self.entries = self._load()
+        self.parsed = 0  # files parsed (not served from the cache) by the last parse()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                cache = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as e:
+            print(f"Warning: Could not load parse cache: {e}")
+            return {}
+        if not isinstance(cache, dict) or cache.get('version') != PARSE_CACHE_VERSION:
+            return {}
+        return cache['entries']
+
+    def parse(self, paths):
+        """Return the parsed contents of *paths*, in order."""
+        results = {}
+        misses = []
+        changed = False
+        for path in paths:
+            key = os.path.abspath(path)
+            st = os.stat(path)
+            stat = (st.st_mtime_ns, st.st_size)
+            entry = self.entries.get(key)
+            if entry is not None and entry['stat'] == stat:
+                results[path] = entry['data']
+                continue
+            digest = file_digest(path)
+            if entry is not None and entry['sha256'] == digest:
+                entry['stat'] = stat
+                results[path] = entry['data']
+                changed = True
+                continue
+            misses.append((path, key, stat, digest))
+
+        if len(misses) >= PARALLEL_PARSE_MIN:
+            with ProcessPoolExecutor() as pool:
+                parsed = list(pool.map(_parse_file, [m[0] for m in misses], chunksize=16))
+        else:
+            parsed = [_parse_file(m[0]) for m in misses]
+        for (path, key, stat, digest), data in zip(misses, parsed):
+            self.entries[key] = {'stat': stat, 'sha256': digest, 'data': data}
+            results[path] = data
+        self.parsed = len(misses)
+
+        stale = [key for key in self.entries if not os.path.exists(key)]
+        for key in stale:
+            del self.entries[key]
+        if misses or stale or changed:
+            self.save()
+        return [results[path] for path in paths]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': PARSE_CACHE_VERSION, 'entries': self.entries}, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+
+def load_source(source, cache_dir=CACHE_DIR):
+    """Load a data.toml file or a data directory into one data dict.
+
+    Raises FileNotFoundError if the file (or the directory's site.toml) is
+    missing, tomli.TOMLDecodeError for an invalid data.toml and
+    DataSourceError, naming the file, for an invalid file in a directory.
+    """
+    if not os.path.isdir(source):
+        with open(source, 'rb') as f:
+            return tomli.load(f)
+
+    files = item_files(source)
+    site_path = os.path.join(source, SITE_FILE)
+    parsed = ParseCache(cache_dir).parse([site_path] + [path for kind in ITEM_KINDS for path in files[kind]])
+    data = dict(parsed[0])
+    offset = 1
+    for kind in ITEM_KINDS:
+        count = len(files[kind])
+        if count:
+            data[kind] = list(data.get(kind, [])) + parsed[offset:offset + count]
+        offset += count
+    return data
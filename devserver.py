@@ -0,0 +1,160 @@
+"""Watch mode and local dev server for build.py (``--watch`` / ``--serve``).
+
+The watcher polls the modification times of the build inputs and rebuilds
+when one changes. build.py passes the same BuildMemo to every rebuild, so a
+data edit re-parses only data.toml, reuses the geocoding cache and JS from
+memory and skips npm.
+
+The server is the stdlib http.server serving the site directory. HTML pages
+are served with a small script that polls /__livereload and reloads the page
+after each successful rebuild; the files on disk are not changed.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8000
+POLL_INTERVAL = 0.25
+LIVE_RELOAD_PATH = '/__livereload'
+LIVE_RELOAD_SCRIPT = """<script>
+(function () {
+	let version = null;
+	setInterval(function () {
+		fetch("/__livereload", { cache: "no-store" })
+			.then(function (response) { return response.json(); })
+			.then(function (state) {
+				if (version !== null && state.version !== version) location.reload();
+				version = state.version;
+			})
+			.catch(function () {});
+	}, 500);
+})();
+</script>"""
+
+
+class ReloadState:
+    """Build counter the pages poll; bumped after every successful rebuild."""
+
+    def __init__(self):
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.version += 1
+
+
+def snapshot(paths):
+    """Return {path: (mtime_ns, size)} for *paths*, None for missing files."""
+    stats = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stats[path] = None
+        else:
+            stats[path] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+
+def changed_paths(before, after):
+    """Paths whose stat differs between two snapshots, including added and removed ones."""
+    return sorted(path for path in before.keys() | after.keys() if before.get(path) != after.get(path))
+
+
+def inject_live_reload(html):
+    index = html.rfind('</body>')
+    if index == -1:
+        return html + LIVE_RELOAD_SCRIPT
+    return html[:index] + LIVE_RELOAD_SCRIPT + html[index:]
+
+
+class LiveReloadHandler(SimpleHTTPRequestHandler):
+    def __init__(self, *args, reload_state, **kwargs):
+        self.reload_state = reload_state
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] == LIVE_RELOAD_PATH:
+            self._send(json.dumps({'version': self.reload_state.version}).encode('utf-8'), 'application/json')
+            return
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            path = os.path.join(path, 'index.html')
+        if path.endswith('.html') and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                html = inject_live_reload(f.read())
+            self._send(html.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+        super().do_GET()
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Polling /__livereload would otherwise log twice a second.
+        pass
+
+
+def make_server(directory, port, reload_state, host='127.0.0.1'):
+    handler = functools.partial(LiveReloadHandler, directory=directory, reload_state=reload_state)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def watch(rebuild, paths, reload_state=None, interval=POLL_INTERVAL, stop=None):
+    """Call *rebuild* whenever one of *paths* changes, until *stop* is set.
+
+    *paths* may be a function returning the paths, so that files added to a
+    data directory are picked up.
+    """
+    stop = stop or threading.Event()
+    list_paths = paths if callable(paths) else lambda: paths
+    stats = snapshot(list_paths())
+    while not stop.wait(interval):
+        current = snapshot(list_paths())
+        changed = changed_paths(stats, current)
+        if not changed:
+            continue
+        stats = current
+        print(f"Changed: {', '.join(changed)}")
+        start = time.perf_counter()
+        if rebuild():
+            print(f"Rebuilt in {time.perf_counter() - start:.2f}s")
+            if reload_state:
+                reload_state.bump()
+        else:
+            print("Rebuild failed, watching for changes...")
+
+
+def run(rebuild, paths, watch_inputs=True, port=None, directory='.'):
+    """Build once, then serve *directory* on *port* and/or watch *paths*."""
+    ok = rebuild()
+    reload_state = ReloadState()
+    server = None
+    if port is not None:
+        server = make_server(directory, port, reload_state)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Serving {os.path.abspath(directory)} at http://127.0.0.1:{server.server_address[1]}/")
+    try:
+        if watch_inputs:
+            print("Watching the data and JS sources for changes (Ctrl+C to stop)...")
+            watch(rebuild, paths, reload_state)
+        elif server:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        print()
+        return 0
+    finally:
+        if server:
+            server.shutdown()
+            server.server_close()
+    return 0 if ok else 1
@@ -0,0 +1,136 @@
+"""Incremental store for the enriched data (the data after geocoding).
+
+Instead of rewriting data_enriched.toml in full on every run, build.py and
+generate_qr.py keep the enriched data in a SQLite database: one row per
+business or location, keyed by its id, plus one row for the site-level
+settings. save() compares every record with the stored one by a fingerprint
+of its repr() and pickles and writes only the records that changed, so a
+run that geocoded nothing serialises and writes nothing. export_toml() writes the TOML file on
+demand (``build.py --export-enriched``).
+
+Records are serialised with pickle so TOML dates and times round-trip
+exactly; the database is a local build artifact, not an exchange format.
+It runs in WAL mode with a busy timeout, like the geocoding cache, as
+build.py and generate_qr.py may write it at the same time.
+"""
+
+import hashlib
+import pickle
+import sqlite3
+
+import tomli_w
+
+from data_source import ITEM_KINDS
+from geocache import BUSY_TIMEOUT
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (kind, key)
+)
+"""
+# Kind of the row holding everything except the item arrays
+SITE_KIND = 'site'
+
+
+def record_keys(items):
+    """Return a unique key per item: its id, or '#<index>' if it has none or a duplicate."""
+    keys = []
+    seen = set()
+    for index, item in enumerate(items):
+        key = item.get('id') if isinstance(item, dict) else None
+        if not isinstance(key, str) or key in seen:
+            key = f'#{index}'
+        seen.add(key)
+        keys.append(key)
+    return keys
+
+
+def fingerprint(value):
+    """Return a digest of *value* that changes whenever it does.
+
+    repr() of the TOML value types (dicts in key order, lists, strings,
+    numbers, dates and times) is exact and much cheaper than pickling.
+    """
+    return hashlib.blake2b(repr(value).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _split(data):
+    """Yield (kind, key, position, value) records for *data*."""
+    kinds = [kind for kind in ITEM_KINDS if isinstance(data.get(kind), list)]
+    site = {key: value for key, value in data.items() if key not in kinds}
+    # The key order lets load() rebuild the dict exactly as it was
+    yield SITE_KIND, '', 0, {'settings': site, 'order': list(data)}
+    for kind in kinds:
+        for position, (key, item) in enumerate(zip(record_keys(data[kind]), data[kind])):
+            yield kind, key, position, item
+
+
+class EnrichedStore:
+    """The enriched data of one site, stored record by record in SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self.bytes_written = 0
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def save(self, data):
+        """Store *data*, writing only what changed; returns the number of records written."""
+        stored = {
+            (kind, key): (position, digest)
+            for kind, key, position, digest in self._conn.execute('SELECT kind, key, position, digest FROM records')
+        }
+        writes = []
+        moves = []
+        for kind, key, position, value in _split(data):
+            digest = fingerprint(value)
+            old = stored.pop((kind, key), None)
+            if old is None or old[1] != digest:
+                writes.append((kind, key, position, digest, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+            elif old[0] != position:
+                moves.append((position, kind, key))
+        with self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO records (kind, key, position, digest, data) VALUES (?, ?, ?, ?, ?)', writes)
+            self._conn.executemany('UPDATE records SET position = ? WHERE kind = ? AND key = ?', moves)
+            self._conn.executemany('DELETE FROM records WHERE kind = ? AND key = ?', list(stored))
+        self.bytes_written = sum(len(row[4]) for row in writes)
+        return len(writes) + len(moves) + len(stored)
+
+    def load(self):
+        """Return the stored data as one dict, as tomli.load() would have returned it."""
+        site = None
+        items = {}
+        rows = self._conn.execute('SELECT kind, data FROM records ORDER BY kind, position')
+        for kind, blob in rows:
+            value = pickle.loads(blob)
+            if kind == SITE_KIND:
+                site = value
+            else:
+                items.setdefault(kind, []).append(value)
+        if site is None:
+            raise FileNotFoundError(f"no enriched data stored in {self.path}")
+        data = {}
+        for key in site['order']:
+            data[key] = site['settings'][key] if key in site['settings'] else items.get(key, [])
+        return data
+
+    def export_toml(self, path):
+        """Write the stored data to *path* as TOML."""
+        with open(path, 'wb') as f:
+            tomli_w.dump(self.load(), f)
@@ -7,82 +7,315 @@
 # ]
 # ///
 
+import argparse
+import hashlib
+import json
 import tomli
-import tomli_w
 import os
 import qrcode
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+from build_cache import file_digest
+from data_source import DATA_DIR, SITE_FILE, DataSourceError, default_source, load_source, source_files
+from enriched_store import EnrichedStore
 from geocoding import process_data_with_geocoding
+from profiling import Profiler
+from qr_formats import PAGE_SIZES, PdfSheetWriter, vector_logo, write_svg
 
 # === CONFIGURATION ===
 TOML_FILE = 'data.toml'
-ENRICHED_TOML_FILE = 'data_enriched.toml'
+ENRICHED_STORE_FILE = 'data_enriched.sqlite'
 OUTPUT_DIR = 'qrcodes'
 # Read from environment variable, or fall back to data.toml 'base_url' field at runtime
 BASE_URL = os.environ.get('BASE_URL', '')
 # Path to your central logo image (e.g., 'branding/logo.png'). 
 # Set to None if you don't want a logo.
 LOGO_PATH = 'logo.png' 
+PROFILE_TRACE_FILE = 'qr-trace.json'
+# Records what each qrcodes/<id>.png was generated from, so unchanged codes are skipped
+QR_MANIFEST_FILE = '.qr-manifest.json'
+# Written by --format pdf: every code on labelled multi-up pages
+QR_SHEET_FILE = 'qrcodes.pdf'
 # =====================
+QR_MANIFEST_VERSION = 1
+# Rendering parameters; they are part of every code's manifest key
+QR_PARAMS = {'error_correction': 'H', 'box_size': 10, 'border': 2}
 
-def create_qr_with_logo(url, output_path, logo_path=None):
+# Prepared logos by (path, mtime, file size, target size); kept per process
+_logos = {}
+
+
+def prepared_logo(logo_path, logo_size):
     """
-    Generates a QR code that points to the URL and optionally embeds a center logo.
+    Returns the logo at logo_path resized to fit logo_size x logo_size.
+    It is decoded and resized once per distinct size (and re-read if the file changes).
+    """
+    stat = os.stat(logo_path)
+    key = (logo_path, stat.st_mtime_ns, stat.st_size, logo_size)
+    logo = _logos.get(key)
+    if logo is None:
+        logo = Image.open(logo_path)
+        # Resize logo maintaining aspect ratio
+        logo.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
+        _logos[key] = logo
+    return logo
+
+
+def make_qr(url):
+    """
+    Returns the QRCode for the URL, made with QR_PARAMS.
     """
-    # 1. Generate QR Code
     # We use ERROR_CORRECT_H (High) to allow data redundancy. 
     # This lets us cover up to 30% of the center with a logo and it still scans.
     qr = qrcode.QRCode(
         version=None, # Auto-determine size based on URL length
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=2,
+        error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{QR_PARAMS['error_correction']}"),
+        box_size=QR_PARAMS['box_size'],
+        border=QR_PARAMS['border'],
     )
     qr.add_data(url)
     qr.make(fit=True)
+    return qr
 
-    # Create standard black on white QR image
-    qr_img = qr.make_image(fill_color="black", back_color="white").convert('RGB')
+
+def create_qr_with_logo(url, output_path, logo_path=None, log=print):
+    """
+    Generates a QR code that points to the URL and optionally embeds a center logo.
+    Without a logo the PNG is 1-bit and optimized. Messages go to log (print by default).
+    """
+    # 1. Generate QR Code
+    qr = make_qr(url)
+
+    # Create standard black on white QR image (1 bit per pixel)
+    qr_img = qr.make_image(fill_color="black", back_color="white").get_image()
 
     # 2. Embed Logo (if provided)
     if logo_path and os.path.exists(logo_path):
         try:
-            logo = Image.open(logo_path)
-            
+            rgb_img = qr_img.convert('RGB')
+
             # Calculate dimensions to ensure logo fits well.
             # Making the logo about 1/4th the width of the QR code usually works well.
-            qr_width, qr_height = qr_img.size
-            logo_size = int(qr_width / 4)
-            
-            # Resize logo maintaining aspect ratio
-            logo.thumbnail((logo_size, logo_size), Image.Resampling.LANCZOS)
+            qr_width, qr_height = rgb_img.size
+            logo = prepared_logo(logo_path, int(qr_width / 4))
             
             # Calculate center position
             pos = ((qr_width - logo.size[0]) // 2, (qr_height - logo.size[1]) // 2)
             
             # Optional: Add a small white border around the logo for cleaner look
             # Paste the logo onto the QR image (using logo itself as mask if it has transparency)
-            qr_img.paste(logo, pos, logo if 'A' in logo.getbands() else None)
-            print(f"  - Embedded logo into {os.path.basename(output_path)}")
+            rgb_img.paste(logo, pos, logo if 'A' in logo.getbands() else None)
+            qr_img = rgb_img
+            log(f"  - Embedded logo into {os.path.basename(output_path)}")
 
         except Exception as e:
-            print(f"Warning: Could not process logo {logo_path}: {e}")
+            log(f"Warning: Could not process logo {logo_path}: {e}")
 
     # 3. Save final image
-    qr_img.save(output_path)
-    print(f"Generated: {output_path} -> {url}")
+    if qr_img.mode == '1':
+        qr_img.save(output_path, optimize=True)
+    else:
+        qr_img.save(output_path)
+    log(f"Generated: {output_path} -> {url}")
+
+
+def create_qr_svg(url, output_path, logo_path=None, log=print):
+    """
+    Generates the QR code as an SVG drawing of its modules, with the logo embedded if provided.
+    """
+    matrix = make_qr(url).get_matrix()
+    logo = None
+    if logo_path and os.path.exists(logo_path):
+        try:
+            vector_logo(logo_path)
+            logo = logo_path
+        except Exception as e:
+            log(f"Warning: Could not process logo {logo_path}: {e}")
+    write_svg(matrix, output_path, logo, box_size=QR_PARAMS['box_size'])
+    if logo:
+        log(f"  - Embedded logo into {os.path.basename(output_path)}")
+    log(f"Generated: {output_path} -> {url}")
+
+
+# Writer of each per-code format, by file extension
+QR_WRITERS = {'.png': create_qr_with_logo, '.svg': create_qr_svg}
+
+
+def _write_qr(job):
+    """Process-pool worker: write one (url, output_path, logo_path) code; returns its messages and size."""
+    url, output_path, logo_path = job
+    messages = []
+    QR_WRITERS[os.path.splitext(output_path)[1]](url, output_path, logo_path, log=messages.append)
+    return messages, os.path.getsize(output_path)
+
+
+def write_qr_sheet(codes, output_path, logo_path=None, columns=3, rows=4, page_size='letter'):
+    """
+    Writes the (url, label) codes to one PDF, columns x rows labelled codes per page,
+    streaming each page as it fills. Returns the number of pages.
+    """
+    if logo_path and os.path.exists(logo_path):
+        try:
+            vector_logo(logo_path)
+        except Exception as e:
+            print(f"Warning: Could not process logo {logo_path}: {e}")
+            logo_path = None
+    else:
+        logo_path = None
+    with PdfSheetWriter(output_path, columns, rows, page_size, logo_path=logo_path) as sheet:
+        for url, label in codes:
+            sheet.add(make_qr(url).get_matrix(), label)
+    return len(sheet.pages)
+
+
+def write_qr_codes(jobs, processes=None):
+    """
+    Writes the (url, output_path, logo_path) jobs, on a process pool unless processes is 1.
+    Each worker prepares the logo once. Files are identical to writing the codes one by one,
+    and messages are printed in job order. Returns the total bytes written.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(jobs) <= 1:
+        results = map(_write_qr, jobs)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=min(processes, len(jobs)))
+        # A few chunks per worker amortize the task overhead and still balance the load
+        results = pool.map(_write_qr, jobs, chunksize=max(1, len(jobs) // (processes * 4)))
+    total = 0
+    try:
+        for messages, size in results:
+            for message in messages:
+                print(message)
+            total += size
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+    return total
+
+
+def code_key(url, logo_digest, fmt='png'):
+    """Returns the manifest key of a code: a hash of its URL, the logo file's digest, the format and QR_PARAMS."""
+    payload = json.dumps({'url': url, 'logo': logo_digest, 'format': fmt, 'params': QR_PARAMS}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QrManifest:
+    """
+    The codes in an output directory: for each id, the code_key() it was generated
+    from and the size and mtime of its PNG. A code is up to date when its key matches
+    and the file is still there unchanged (checked with os.stat, not by hashing it).
+    """
+
+    def __init__(self, output_dir, force=False):
+        self.path = os.path.join(output_dir, QR_MANIFEST_FILE)
+        self.force = force
+        self.codes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not load QR manifest: {e}")
+            return {}
+        if manifest.get('version') != QR_MANIFEST_VERSION:
+            return {}
+        return manifest.get('codes', {})
+
+    def is_fresh(self, code_id, key, output_path):
+        entry = self.codes.get(code_id)
+        if self.force or entry is None or entry['key'] != key or entry['file'] != output_path:
+            return False
+        try:
+            stat = os.stat(output_path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns'])
+
+    def record(self, code_id, key, output_path):
+        previous = self.codes.get(code_id)
+        if previous and previous['file'] != output_path:
+            # The code was written in another format before
+            try:
+                os.remove(previous['file'])
+            except FileNotFoundError:
+                pass
+        stat = os.stat(output_path)
+        self.codes[code_id] = {'key': key, 'file': output_path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def prune(self, keep_ids):
+        """Deletes the PNGs of recorded ids not in keep_ids; returns how many were removed."""
+        removed = 0
+        for code_id in sorted(set(self.codes) - set(keep_ids)):
+            try:
+                os.remove(self.codes[code_id]['file'])
+                removed += 1
+            except FileNotFoundError:
+                pass
+            del self.codes[code_id]
+        return removed
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': QR_MANIFEST_VERSION, 'codes': self.codes}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generate QR codes for the locations and businesses in data.toml.")
+    parser.add_argument("--data", default=None, metavar="PATH",
+                        help=f"Data file or directory (default: {DATA_DIR}/ if it has a {SITE_FILE}, else {TOML_FILE})")
+    parser.add_argument("--profile", nargs="?", const=PROFILE_TRACE_FILE, default=None, metavar="TRACE_FILE",
+                        help=f"Profile each step and write a Chrome trace (default {PROFILE_TRACE_FILE})")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="QR codes generated at once (default: one per CPU, 1 = sequential)")
+    parser.add_argument("--force", action="store_true",
+                        help=f"Regenerate every code, even those {QR_MANIFEST_FILE} shows are up to date")
+    parser.add_argument("--format", choices=["png", "svg", "pdf"], default="png",
+                        help=f"png or svg: one file per code; pdf: labelled sheets in {OUTPUT_DIR}/{QR_SHEET_FILE}")
+    parser.add_argument("--sheet-grid", default="3x4", metavar="COLUMNSxROWS",
+                        help="Codes per PDF page (default 3x4)")
+    parser.add_argument("--page-size", choices=sorted(PAGE_SIZES), default="letter",
+                        help="PDF page size (default letter)")
+    args = parser.parse_args()
+    try:
+        columns, rows = (int(n) for n in args.sheet_grid.lower().split('x'))
+        if columns < 1 or rows < 1:
+            raise ValueError
+    except ValueError:
+        parser.error(f"invalid --sheet-grid {args.sheet_grid!r}, expected e.g. 3x4")
+
+    profiler = Profiler(enabled=args.profile is not None)
+    try:
+        generate(args.data or default_source(TOML_FILE), profiler, processes=args.processes, force=args.force,
+                 fmt=args.format, grid=(columns, rows), page_size=args.page_size)
+    finally:
+        profiler.close()
+    if args.profile is not None:
+        print(profiler.summary())
+        profiler.write_trace(args.profile)
+        print(f"Profile trace written to {args.profile} (open in chrome://tracing or ui.perfetto.dev)")
+
+
+def generate(source, profiler, processes=None, force=False, fmt='png', grid=(3, 4), page_size='letter'):
     # Ensure output directory exists
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    print(f"Reading {TOML_FILE}...")
+    print(f"Reading {source}...")
     try:
-        with open(TOML_FILE, "rb") as f:
-            data = tomli.load(f)
+        with profiler.stage('load_data'):
+            data = load_source(source)
+            profiler.count(bytes_in=sum(os.path.getsize(path) for path in source_files(source)))
     except FileNotFoundError:
-        print(f"Error: {TOML_FILE} not found!")
+        print(f"Error: {source} not found!")
+        return
+    except (tomli.TOMLDecodeError, DataSourceError) as e:
+        print(f"Error: invalid TOML in {source}: {e}")
         return
 
     # Resolve BASE_URL: env var > data.toml field
@@ -94,12 +327,15 @@ def main():
         return
 
     # Geocode addresses if lat/long are missing
-    process_data_with_geocoding(data)
+    with profiler.stage('geocode'):
+        process_data_with_geocoding(data)
 
     # Save enriched data
-    print(f"Saving enriched data to {ENRICHED_TOML_FILE}...")
-    with open(ENRICHED_TOML_FILE, "wb") as f:
-        tomli_w.dump(data, f)
+    with profiler.stage('save_enriched'):
+        with EnrichedStore(ENRICHED_STORE_FILE) as store:
+            written = store.save(data)
+        profiler.count(bytes_out=store.bytes_written)
+    print(f"Updated {written} enriched record(s) in {ENRICHED_STORE_FILE}")
 
     targets = []
     
@@ -113,6 +349,7 @@ def main():
 
     print(f"Found {len(targets)} locations to generate QR codes for.\n")
 
+    urls = []
     for target in targets:
         # Ensure required fields exist
         if not all(k in target for k in ('id', 'lat', 'long')):
@@ -125,10 +362,41 @@ def main():
         if 'zoom' in target:
             params += f"&zoom={target['zoom']}"
             
-        full_url = BASE_URL + params
-        file_name = os.path.join(OUTPUT_DIR, f"{target['id']}.png")
-        
-        create_qr_with_logo(full_url, file_name, LOGO_PATH)
+        urls.append((target, BASE_URL + params))
+
+    if fmt == 'pdf':
+        sheet_path = os.path.join(OUTPUT_DIR, QR_SHEET_FILE)
+        with profiler.stage('qr'):
+            codes = [(url, str(target.get('name', target['id']))) for target, url in urls]
+            pages = write_qr_sheet(codes, sheet_path, LOGO_PATH, *grid, page_size=page_size)
+            profiler.count(bytes_out=os.path.getsize(sheet_path))
+        print(f"QR codes: {len(urls)} on {pages} page(s) in {sheet_path}")
+    else:
+        manifest = QrManifest(OUTPUT_DIR, force=force)
+        logo_digest = file_digest(LOGO_PATH) if LOGO_PATH else None
+        codes = {}
+        jobs = []
+        unchanged = 0
+        for target, full_url in urls:
+            file_name = os.path.join(OUTPUT_DIR, f"{target['id']}.{fmt}")
+            key = code_key(full_url, logo_digest, fmt)
+            codes[str(target['id'])] = (key, file_name)
+            if manifest.is_fresh(str(target['id']), key, file_name):
+                unchanged += 1
+            else:
+                jobs.append((full_url, file_name, LOGO_PATH))
+
+        with profiler.stage('qr'):
+            profiler.count(bytes_out=write_qr_codes(jobs, processes))
+        written = {file_name for _url, file_name, _logo in jobs}
+        for code_id, (key, file_name) in codes.items():
+            if file_name in written:
+                manifest.record(code_id, key, file_name)
+        # Keep the code of every id still in the data: a target whose geocoding failed this
+        # run has no URL, but its last good code stays until the id itself is removed
+        removed = manifest.prune(str(target['id']) for target in targets if 'id' in target)
+        manifest.save()
+        print(f"QR codes: {len(jobs)} generated, {unchanged} unchanged, {removed} removed")
 
     print(f"\n✅ Done! Check the '/{OUTPUT_DIR}' folder.")
 
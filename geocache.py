@@ -0,0 +1,312 @@
+"""SQLite-backed geocoding cache.
+
+GeocodingCache is a MutableMapping of address -> {'lat', 'long'} stored one
+row per address in a SQLite database in WAL mode. Reads and writes touch
+only the row involved, each write is committed on its own, and several
+processes (build.py and generate_qr.py, or batch workers) can use the same
+file at once. Rows carry the time they were written and where the result
+came from (the provider URL, or 'import').
+
+Addresses the provider could not resolve are remembered in a separate
+table for *negative_ttl* seconds, so they are not looked up on every
+build. Positive entries older than *max_age* (if set) are reported as
+stale by is_stale() so the caller can refresh them. compact() drops
+expired failures and old entries, caps the size and shrinks the file.
+
+The first time a database is opened it imports the JSON cache file, if
+there is one. export_json() writes the cache back in that format, sorted by
+address, so it stays diffable in git.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+
+# Schema changes, applied in order; PRAGMA user_version counts the applied steps
+MIGRATIONS = [
+    ["""
+    CREATE TABLE IF NOT EXISTS geocodes (
+        address TEXT PRIMARY KEY,
+        lat REAL NOT NULL,
+        long REAL NOT NULL,
+        updated REAL NOT NULL
+    )
+    """],
+    [
+        "ALTER TABLE geocodes ADD COLUMN source TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS failures (
+            address TEXT PRIMARY KEY,
+            updated REAL NOT NULL,
+            source TEXT
+        )
+        """,
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+# Seconds before an address the provider could not resolve is tried again
+NEGATIVE_TTL = 7 * 24 * 3600
+IMPORT_SOURCE = 'import'
+# Seconds to wait for another process's write lock
+BUSY_TIMEOUT = 30
+
+
+class GeocodingCache(MutableMapping):
+    """Geocoding results in SQLite; see the module docstring.
+
+    One connection is shared by the threads of a process (geocoding workers,
+    build stages) under a lock.
+    """
+
+    def __init__(self, path, json_path=None, clock=time.time, negative_ttl=NEGATIVE_TTL, max_age=None):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+            with self._lock, self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                # Another process may have set the database up meanwhile
+                version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+                for statements in MIGRATIONS[version:]:
+                    for statement in statements:
+                        self._conn.execute(statement)
+                if version == 0 and json_path and os.path.exists(json_path):
+                    self._insert(_read_json(json_path).items(), IMPORT_SOURCE)
+                self._conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def _insert(self, items, source=None):
+        now = self._clock()
+        items = list(items)
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO geocodes (address, lat, long, updated, source) VALUES (?, ?, ?, ?, ?)',
+            ((address, coords['lat'], coords['long'], now, source) for address, coords in items))
+        self._conn.executemany('DELETE FROM failures WHERE address = ?', ((address,) for address, _ in items))
+
+    def __getitem__(self, address):
+        with self._lock:
+            row = self._conn.execute('SELECT lat, long FROM geocodes WHERE address = ?', (address,)).fetchone()
+        if row is None:
+            raise KeyError(address)
+        return {'lat': row[0], 'long': row[1]}
+
+    def __setitem__(self, address, coords):
+        self.put(address, coords)
+
+    def put(self, address, coords, source=None):
+        """Store *coords* for *address*, noting where they came from."""
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._insert([(address, coords)], source)
+
+    def __delitem__(self, address):
+        with self._lock:
+            if self._conn.execute('DELETE FROM geocodes WHERE address = ?', (address,)).rowcount == 0:
+                raise KeyError(address)
+
+    def __contains__(self, address):
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM geocodes WHERE address = ?', (address,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._lock:
+            addresses = [row[0] for row in self._conn.execute('SELECT address FROM geocodes ORDER BY address')]
+        return iter(addresses)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM geocodes').fetchone()[0]
+
+    def update(self, other=(), source=None, **kwargs):
+        """Add many entries in one transaction."""
+        items = list(dict(other, **kwargs).items())
+        with self._lock, self._conn:
+            self._conn.execute('BEGIN IMMEDIATE')
+            self._insert(items, source)
+
+    def updated(self, address):
+        """Return the time.time() at which *address* was last written."""
+        return self.entry(address)['updated']
+
+    def entry(self, address):
+        """Return the stored result with its provenance.
+
+        {'status': 'ok', 'lat', 'long', 'updated', 'source'} for a result, or
+        {'status': 'not_found', 'updated', 'source'} for a remembered failure
+        (even an expired one). Raises KeyError if neither exists.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT lat, long, updated, source FROM geocodes WHERE address = ?', (address,)).fetchone()
+            failure = self._conn.execute(
+                'SELECT updated, source FROM failures WHERE address = ?', (address,)).fetchone()
+        if row is not None:
+            return {'status': 'ok', 'lat': row[0], 'long': row[1], 'updated': row[2], 'source': row[3]}
+        if failure is not None:
+            return {'status': 'not_found', 'updated': failure[0], 'source': failure[1]}
+        raise KeyError(address)
+
+    def record_failure(self, address, source=None):
+        """Remember that the provider found nothing for *address*."""
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO failures (address, updated, source) VALUES (?, ?, ?)',
+                               (address, self._clock(), source))
+
+    def is_negative(self, address):
+        """True if a lookup of *address* failed less than negative_ttl seconds ago."""
+        with self._lock:
+            row = self._conn.execute('SELECT updated FROM failures WHERE address = ?', (address,)).fetchone()
+        return row is not None and self._clock() - row[0] < self.negative_ttl
+
+    def is_stale(self, address):
+        """True if *address* has a result older than max_age seconds."""
+        if self.max_age is None:
+            return False
+        with self._lock:
+            row = self._conn.execute('SELECT updated FROM geocodes WHERE address = ?', (address,)).fetchone()
+        return row is not None and self._clock() - row[0] > self.max_age
+
+    def compact(self, max_age=None, max_entries=None):
+        """Drop expired failures, results older than *max_age* seconds and the
+        oldest results beyond *max_entries*, then shrink the file.
+
+        Returns the number of rows removed by each rule.
+        """
+        now = self._clock()
+        removed = {}
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                removed['expired failures'] = self._conn.execute(
+                    'DELETE FROM failures WHERE updated <= ?', (now - self.negative_ttl,)).rowcount
+                removed['old results'] = 0
+                if max_age is not None:
+                    removed['old results'] = self._conn.execute(
+                        'DELETE FROM geocodes WHERE updated < ?', (now - max_age,)).rowcount
+                removed['evicted results'] = 0
+                if max_entries is not None:
+                    removed['evicted results'] = self._conn.execute(
+                        'DELETE FROM geocodes WHERE address IN '
+                        '(SELECT address FROM geocodes ORDER BY updated DESC, address LIMIT -1 OFFSET ?)',
+                        (max_entries,)).rowcount
+            self._conn.execute('VACUUM')
+        return removed
+
+    def import_json(self, path):
+        """Add the entries of a JSON cache file; returns how many there were."""
+        entries = _read_json(path)
+        self.update(entries, source=IMPORT_SOURCE)
+        return len(entries)
+
+    def export_json(self, path):
+        """Write the cache to *path* as JSON sorted by address (the format of geocoding_cache.json)."""
+        with self._lock:
+            rows = self._conn.execute('SELECT address, lat, long FROM geocodes ORDER BY address').fetchall()
+        data = {address: {'lat': lat, 'long': long} for address, lat, long in rows}
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, path)
+        return len(data)
+
+    def rows(self):
+        """Return every stored row as (results, failures) dicts for PreloadedGeocodingCache.
+
+        results maps address -> (lat, long, updated, source) and failures
+        maps address -> (updated, source).
+        """
+        with self._lock:
+            results = {row[0]: row[1:] for row in self._conn.execute(
+                'SELECT address, lat, long, updated, source FROM geocodes')}
+            failures = {row[0]: row[1:] for row in self._conn.execute(
+                'SELECT address, updated, source FROM failures')}
+        return results, failures
+
+    def checkpoint(self):
+        """Copy committed writes from the WAL into the database file."""
+        with self._lock:
+            self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PreloadedGeocodingCache(GeocodingCache):
+    """A GeocodingCache that answers reads from rows() loaded up front.
+
+    build_sites() reads the database once and hands the rows to each worker
+    process, so no worker has to query it per address. Writes still go to
+    the database, and to this process's copy of the rows; other processes
+    do not see them until they load the rows again.
+    """
+
+    def __init__(self, path, rows, **kwargs):
+        super().__init__(path, **kwargs)
+        self._results, self._failures = rows
+
+    def _insert(self, items, source=None):
+        items = list(items)
+        super()._insert(items, source)
+        now = self._clock()
+        for address, coords in items:
+            self._results[address] = (coords['lat'], coords['long'], now, source)
+            self._failures.pop(address, None)
+
+    def __getitem__(self, address):
+        lat, long, _updated, _source = self._results[address]
+        return {'lat': lat, 'long': long}
+
+    def __delitem__(self, address):
+        super().__delitem__(address)
+        self._results.pop(address, None)
+
+    def __contains__(self, address):
+        return address in self._results
+
+    def __iter__(self):
+        return iter(sorted(self._results))
+
+    def __len__(self):
+        return len(self._results)
+
+    def entry(self, address):
+        if address in self._results:
+            lat, long, updated, source = self._results[address]
+            return {'status': 'ok', 'lat': lat, 'long': long, 'updated': updated, 'source': source}
+        if address in self._failures:
+            updated, source = self._failures[address]
+            return {'status': 'not_found', 'updated': updated, 'source': source}
+        raise KeyError(address)
+
+    def record_failure(self, address, source=None):
+        super().record_failure(address, source)
+        self._failures[address] = (self._clock(), source)
+
+    def is_negative(self, address):
+        return address in self._failures and self._clock() - self._failures[address][0] < self.negative_ttl
+
+    def is_stale(self, address):
+        return (self.max_age is not None and address in self._results
+                and self._clock() - self._results[address][2] > self.max_age)
+
+    def rows(self):
+        return self._results, self._failures
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
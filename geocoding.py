@@ -1,85 +1,471 @@
+import argparse
 import json
 import os
-import urllib.request
+import sqlite3
+import threading
 import urllib.parse
 import time
-import ssl
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from address import normalize_address
+from geocache import NEGATIVE_TTL, GeocodingCache, PreloadedGeocodingCache
+from http_client import DEFAULT_RETRIES, HttpClient
+from offline_geocoder import OfflineGeocoder
 
-CACHE_FILE = 'geocoding_cache.json'
+CACHE_FILE = 'geocoding_cache.sqlite'
+# Imported into a new CACHE_FILE; written by `geocoding.py export`
+JSON_CACHE_FILE = 'geocoding_cache.json'
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+# Nominatim usage policy: at most 1 request per second
+NOMINATIM_MAX_RATE = 1.0
+USER_AGENT = 'MappingProjectGeocoder/1.0'
+REQUEST_TIMEOUT = 30
+DAY = 24 * 3600
+# geocode_many() checkpoints the cache after this many results or seconds
+CHECKPOINT_EVERY = 100
+CHECKPOINT_SECONDS = 60.0
+# Seconds between progress lines of a long batch
+PROGRESS_SECONDS = 10.0
 
-def load_cache():
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Warning: Could not load cache: {e}")
-            return {}
-    return {}
+def cache_policy_from_env(environ=os.environ):
+    """Return the GeocodingCache expiry settings from the environment.
+
+    GEOCODER_NEGATIVE_TTL_DAYS  days before a failed address is tried again (default 7)
+    GEOCODER_REFRESH_DAYS       days after which results are looked up again (default: never)
+    """
+    try:
+        negative_ttl = float(environ.get('GEOCODER_NEGATIVE_TTL_DAYS', NEGATIVE_TTL / DAY)) * DAY
+        refresh = environ.get('GEOCODER_REFRESH_DAYS')
+        return {'negative_ttl': negative_ttl, 'max_age': float(refresh) * DAY if refresh else None}
+    except ValueError as e:
+        raise ValueError(f"invalid geocoder configuration: {e}") from e
+
+def load_cache(rows=None):
+    """Open the geocoding cache (a GeocodingCache); entries are read and written as needed.
+
+    With *rows* from GeocodingCache.rows() reads are answered from them instead
+    (a PreloadedGeocodingCache).
+    """
+    policy = cache_policy_from_env()
+    try:
+        if rows is not None:
+            return PreloadedGeocodingCache(CACHE_FILE, rows, json_path=JSON_CACHE_FILE, **policy)
+        return GeocodingCache(CACHE_FILE, json_path=JSON_CACHE_FILE, **policy)
+    except (OSError, sqlite3.Error, ValueError) as e:
+        print(f"Warning: Could not load cache: {e}")
+        return {}
 
 def save_cache(cache):
+    """Make *cache* durable: checkpoint a GeocodingCache, or write a plain dict's entries."""
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, indent=4)
-    except Exception as e:
+        if isinstance(cache, GeocodingCache):
+            cache.checkpoint()
+        else:
+            with GeocodingCache(CACHE_FILE, json_path=JSON_CACHE_FILE) as stored:
+                stored.update(cache)
+    except (OSError, sqlite3.Error) as e:
         print(f"Warning: Could not save cache: {e}")
 
-def geocode(address, cache=None):
-    """Geocode a single address. Accepts an optional shared cache dict."""
-    if cache is None:
-        cache = load_cache()
+def close_cache(cache):
+    if isinstance(cache, GeocodingCache):
+        cache.close()
+
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter, shared by the geocoding workers.
+
+    Tokens refill at *rate* per second up to *capacity*; acquire() takes one,
+    sleeping until one is available. A rate of None means no limit.
+    """
 
-    if address in cache:
-        return cache[address]
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
 
-    print(f"Geocoding address: {address}")
-    # Nominatim requires a User-Agent.
-    headers = {'User-Agent': 'MappingProjectGeocoder/1.0'}
-    encoded_address = urllib.parse.quote(address)
-    url = f"https://nominatim.openstreetmap.org/search?q={encoded_address}&format=json&limit=1"
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class Provider:
+    """A Nominatim-compatible search endpoint (public Nominatim or a self-hosted one).
+
+    *rate* is in requests per second and *workers* is how many lookups run at
+    once. The public Nominatim endpoint is always held to 1 request/second.
+    Requests go through a keep-alive HttpClient that retries transient
+    errors up to *retries* times; every attempt waits for the rate limiter.
+    """
 
+    def __init__(self, base_url=NOMINATIM_URL, headers=None, rate=NOMINATIM_MAX_RATE, burst=1, workers=1,
+                 timeout=REQUEST_TIMEOUT, retries=DEFAULT_RETRIES):
+        if urllib.parse.urlsplit(base_url).hostname == urllib.parse.urlsplit(NOMINATIM_URL).hostname:
+            if not rate or rate > NOMINATIM_MAX_RATE:
+                print(f"Warning: public Nominatim allows {NOMINATIM_MAX_RATE:g} request/s, ignoring rate {rate}")
+                rate = NOMINATIM_MAX_RATE
+        self.base_url = base_url
+        self.headers = {'User-Agent': USER_AGENT, **(headers or {})}
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.limiter = TokenBucket(rate, capacity=max(1, burst))
+        self.client = HttpClient(self.headers, timeout=timeout, retries=retries, throttle=self.limiter.acquire)
+
+    def search_url(self, address):
+        query = urllib.parse.urlencode({'q': address, 'format': 'json', 'limit': 1})
+        return f"{self.base_url}?{query}"
+
+    def lookup(self, address):
+        """Return {'lat', 'long'} for *address*, or None if the provider has no result.
+
+        Network and HTTP errors that persist after the retries are raised.
+        """
+        data = json.loads(self.client.get(self.search_url(address)).decode())
+        if not data:
+            return None
+        return {'lat': float(data[0]['lat']), 'long': float(data[0]['lon'])}
+
+
+def provider_from_env(environ=os.environ):
+    """Return the Provider configured by the GEOCODER_* environment variables.
+
+    GEOCODER_URL      search endpoint (default: public Nominatim)
+    GEOCODER_RATE     requests per second (default 1)
+    GEOCODER_BURST    requests allowed back to back (default 1)
+    GEOCODER_WORKERS  concurrent lookups (default 1)
+    GEOCODER_HEADERS  extra request headers as a JSON object
+    GEOCODER_RETRIES  retries of a failed request (default 3)
+    """
     try:
-        req = urllib.request.Request(url, headers=headers)
+        headers = json.loads(environ.get('GEOCODER_HEADERS', '{}'))
+        if not isinstance(headers, dict):
+            raise ValueError("GEOCODER_HEADERS must be a JSON object")
+        return Provider(
+            base_url=environ.get('GEOCODER_URL') or NOMINATIM_URL,
+            headers=headers,
+            rate=float(environ.get('GEOCODER_RATE', NOMINATIM_MAX_RATE)),
+            burst=int(environ.get('GEOCODER_BURST', 1)),
+            workers=int(environ.get('GEOCODER_WORKERS', 1)),
+            retries=int(environ.get('GEOCODER_RETRIES', DEFAULT_RETRIES)),
+        )
+    except ValueError as e:
+        raise ValueError(f"invalid geocoder configuration: {e}") from e
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+def default_provider():
+    """Return the process-wide Provider, so every lookup shares one rate limiter."""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = provider_from_env()
+        return _default_provider
+
+def offline_data_files(environ=os.environ):
+    """Return the address-point CSV files in GEOCODER_OFFLINE_DATA (separated by os.pathsep)."""
+    return [path for path in environ.get('GEOCODER_OFFLINE_DATA', '').split(os.pathsep) if path]
+
+
+_default_offline = None
+_default_offline_lock = threading.Lock()
+
+def default_offline_geocoder():
+    """Return the OfflineGeocoder for offline_data_files(), or None if none are configured.
+
+    The index is built once per process and reused while the setting is unchanged.
+    """
+    global _default_offline
+    paths = tuple(offline_data_files())
+    with _default_offline_lock:
+        if not paths:
+            return None
+        if _default_offline is None or _default_offline[0] != paths:
+            start = time.perf_counter()
+            geocoder = OfflineGeocoder.from_csv(paths)
+            print(f"Loaded {geocoder.points} address points from {', '.join(paths)} "
+                  f"in {time.perf_counter() - start:.2f}s")
+            _default_offline = (paths, geocoder)
+        return _default_offline[1]
+
+def cache_keys(address):
+    """Return the keys *address* may be cached under.
+
+    Entries are keyed by normalize_address(); entries written before
+    normalization are still found under the raw address.
+    """
+    key = normalize_address(address)
+    return (key,) if key == address else (key, address)
+
+def cached_result(cache, address):
+    """Return the cached coordinates of *address*, or None."""
+    for key in cache_keys(address):
+        if key in cache:
+            return cache[key]
+    return None
+
+def lookup_cache(cache, address):
+    """Return (state, coords) for *address*.
+
+    state is 'hit', 'stale' (a result older than the cache's max_age; coords
+    are the old result), 'negative' (the provider recently found nothing)
+    or 'miss'. Plain dict caches only have hits and misses. A legacy entry
+    under the raw address ages and expires like any other; a refreshed
+    result is stored under the normalized key.
+    """
+    keys = cache_keys(address)
+    for key in keys:
+        if key in cache:
+            coords = cache[key]
+            if isinstance(cache, GeocodingCache) and cache.is_stale(key):
+                return 'stale', coords
+            return 'hit', coords
+    if isinstance(cache, GeocodingCache) and any(cache.is_negative(key) for key in keys):
+        return 'negative', None
+    return 'miss', None
+
+def geocode(address, cache=None, provider=None):
+    """Geocode a single address. Accepts an optional shared cache mapping."""
+    if cache is None:
+        cache = load_cache()
         try:
-            response = urllib.request.urlopen(req)
-        except ssl.SSLCertVerificationError:
-            print("SSL verification failed, trying with certifi or system certs...")
-            ctx = ssl.create_default_context()
-            response = urllib.request.urlopen(req, context=ctx)
-
-        with response:
-            data = json.loads(response.read().decode())
-            if data:
-                result = {
-                    'lat': float(data[0]['lat']),
-                    'long': float(data[0]['lon'])
-                }
-                cache[address] = result
-                # Respect Nominatim usage policy (1 request per second)
-                time.sleep(1)
-                return result
-            else:
-                print(f"No results found for address: {address}")
-                return None
+            return geocode(address, cache=cache, provider=provider)
+        finally:
+            close_cache(cache)
+
+    state, cached = lookup_cache(cache, address)
+    if state in ('hit', 'negative'):
+        return cached
+
+    provider = provider or default_provider()
+    print(f"{'Refreshing' if state == 'stale' else 'Geocoding'} address: {address}")
+    # A failed refresh keeps the old result
+    try:
+        result = provider.lookup(address)
     except Exception as e:
         print(f"Error during geocoding {address}: {e}")
-        return None
+        return cached
+    key = normalize_address(address)
+    if result is None:
+        print(f"No results found for address: {address}")
+        if cached is None and isinstance(cache, GeocodingCache):
+            cache.record_failure(key, source=provider.base_url)
+        return cached
+    if isinstance(cache, GeocodingCache):
+        cache.put(key, result, source=provider.base_url)
+    else:
+        cache[key] = result
+    return result
+
+def format_duration(seconds):
+    """Format *seconds* as '42s', '3m05s' or '1h02m'."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+class Progress:
+    """Counts finished lookups of a batch and reports throughput and time left."""
+
+    def __init__(self, total, clock=time.monotonic):
+        self.total = total
+        self.done = 0
+        self._clock = clock
+        self.start = clock()
+
+    def advance(self, count=1):
+        self.done += count
+
+    def line(self):
+        elapsed = self._clock() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = f", ETA {format_duration((self.total - self.done) / rate)}" if rate and self.done < self.total else ""
+        return (f"Geocoded {self.done}/{self.total} addresses ({self.done / self.total:.0%}) "
+                f"in {format_duration(elapsed)}, {rate:.2f}/s{eta}")
+
+def geocode_many(addresses, cache, provider=None, checkpoint=save_cache, checkpoint_every=CHECKPOINT_EVERY,
+                 checkpoint_seconds=CHECKPOINT_SECONDS, progress_seconds=PROGRESS_SECONDS, clock=time.monotonic):
+    """Geocode *addresses* on the provider's worker threads, yielding (address, coords or None)
+    as each lookup finishes.
 
-def process_data_with_geocoding(data):
+    Addresses the cache already answers (results and remembered failures)
+    are yielded first without a request, so a batch that was interrupted
+    resumes where it stopped. Every *checkpoint_every* results or
+    *checkpoint_seconds* seconds, and when the batch ends or is interrupted,
+    checkpoint(cache) is called (None disables it). Progress with throughput
+    and ETA is printed every *progress_seconds*.
+    """
+    pending = []
+    for address in addresses:
+        state, cached = lookup_cache(cache, address)
+        if state in ('hit', 'negative'):
+            yield address, cached
+        else:
+            pending.append(address)
+    if not pending:
+        return
+    done = len(addresses) - len(pending)
+    if done:
+        print(f"Resuming: {done} of {len(addresses)} addresses already in the cache")
+    provider = provider or default_provider()
+    progress = Progress(len(pending), clock=clock)
+    last_checkpoint = last_report = clock()
+    unsaved = 0
+    pool = ThreadPoolExecutor(max_workers=provider.workers)
+    try:
+        futures = {pool.submit(geocode, address, cache=cache, provider=provider): address for address in pending}
+        for future in as_completed(futures):
+            progress.advance()
+            unsaved += 1
+            now = clock()
+            if checkpoint and (unsaved >= checkpoint_every or now - last_checkpoint >= checkpoint_seconds):
+                checkpoint(cache)
+                unsaved, last_checkpoint = 0, now
+            if now - last_report >= progress_seconds:
+                print(progress.line())
+                last_report = now
+            yield futures[future], future.result()
+    finally:
+        # Requests in flight finish (and are cached); queued ones are dropped
+        pool.shutdown(wait=True, cancel_futures=True)
+        if checkpoint and unsaved:
+            checkpoint(cache)
+        print(progress.line())
+        if progress.done < progress.total:
+            print("Geocoding stopped; run again to resume with the remaining addresses")
+
+def geocode_all(addresses, cache, provider=None, checkpoint=None):
+    """Geocode *addresses* with geocode_many().
+
+    Returns {address: coords or None}. Results are added to *cache*.
+    """
+    return dict(geocode_many(addresses, cache, provider, checkpoint=checkpoint))
+
+def format_stats(total, distinct, hits, failures=0, offline=0):
+    """Summarize one geocoding pass: addresses, distinct ones, cache hits and lookups saved.
+
+    *hits* includes the *failures* remembered from earlier lookups; *offline*
+    counts the addresses found in the offline address points.
+    """
+    lookups = distinct - hits - offline
+    known = f", {failures} known not found" if failures else ""
+    found_offline = f"{offline} found offline, " if offline else ""
+    return (f"Geocoding: {total} addresses, {distinct} distinct; {hits} cached{known} "
+            f"({hits / distinct:.0%} hit rate), {found_offline}{lookups} looked up, "
+            f"{total - lookups} requests avoided")
+
+def process_data_with_geocoding(data, cache=None, provider=None, offline=None):
     """
     Updates data in-place by filling missing lat/long from address.
-    Loads cache once, passes it through all geocode calls, saves once at the end.
+    Opens the cache once, passes it through all geocode calls, saves once at the end.
+    A long-running caller can pass its own *cache* mapping; saving it is then
+    left to the caller. Addresses are collected from businesses and locations
+    and deduplicated by normalize_address() first; only the distinct ones
+    that are not cached are looked up, concurrently when the provider has
+    several workers. Before any remote lookup an address is tried in the
+    *offline* geocoder (default: default_offline_geocoder()), even if it is
+    remembered as not found. A summary with the cache hit rate is printed.
     """
-    cache = load_cache()
-    updated = False
+    shared = cache is not None
+    if not shared:
+        cache = load_cache()
+    # normalized address -> (address as first written, items with that address)
+    missing = {}
+    total = 0
     for category in ['businesses', 'locations']:
         if category in data:
             for item in data[category]:
                 if ('lat' not in item or 'long' not in item) and 'address' in item:
-                    coords = geocode(item['address'], cache=cache)
-                    if coords:
-                        item['lat'] = coords['lat']
-                        item['long'] = coords['long']
-                        updated = True
-    save_cache(cache)
+                    entry = missing.setdefault(normalize_address(item['address']), (item['address'], []))
+                    entry[1].append(item)
+                    total += 1
+    results = {}
+    lookups = []
+    failures = 0
+    found_offline = 0
+    if offline is None and missing:
+        offline = default_offline_geocoder()
+    for key, (address, _items) in missing.items():
+        state, cached = lookup_cache(cache, address)
+        if state == 'hit':
+            results[key] = cached
+            continue
+        coords = offline.lookup(address) if offline else None
+        if coords:
+            if isinstance(cache, GeocodingCache):
+                cache.put(key, coords, source=offline.source)
+            else:
+                cache[key] = coords
+            results[key] = coords
+            found_offline += 1
+        elif state == 'negative':
+            failures += 1
+        else:
+            lookups.append(address)
+    if lookups:
+        provider = provider or default_provider()
+    for address, coords in geocode_all(lookups, cache, provider, checkpoint=None if shared else save_cache).items():
+        results[normalize_address(address)] = coords
+    if total:
+        print(format_stats(total, len(missing), len(missing) - len(lookups) - found_offline, failures,
+                           found_offline))
+    if lookups:
+        print(f"Geocoder requests so far: {provider.client.stats.summary()}")
+    updated = False
+    for key, (_address, items) in missing.items():
+        coords = results.get(key)
+        if coords:
+            for item in items:
+                item['lat'] = coords['lat']
+                item['long'] = coords['long']
+            updated = True
+    if not shared:
+        save_cache(cache)
+        close_cache(cache)
     return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the geocoding cache.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help=f"Write the cache as JSON (default {JSON_CACHE_FILE})")
+    export.add_argument('path', nargs='?', default=JSON_CACHE_FILE)
+    load = commands.add_parser('import', help=f"Add the entries of a JSON cache file (default {JSON_CACHE_FILE})")
+    load.add_argument('path', nargs='?', default=JSON_CACHE_FILE)
+    compact = commands.add_parser('compact', help="Drop expired failures and old results, then shrink the file")
+    compact.add_argument('--max-age-days', type=float, default=None, help="Drop results older than this")
+    compact.add_argument('--max-entries', type=int, default=None, help="Keep only the newest N results")
+    args = parser.parse_args()
+
+    with GeocodingCache(CACHE_FILE, json_path=JSON_CACHE_FILE, **cache_policy_from_env()) as cache:
+        if args.command == 'export':
+            count = cache.export_json(args.path)
+            print(f"Exported {count} addresses to {args.path}")
+        elif args.command == 'import':
+            count = cache.import_json(args.path)
+            print(f"Imported {count} addresses from {args.path} into {CACHE_FILE}")
+        else:
+            max_age = args.max_age_days * DAY if args.max_age_days is not None else None
+            removed = cache.compact(max_age=max_age, max_entries=args.max_entries)
+            summary = ', '.join(f"{count} {what}" for what, count in removed.items())
+            print(f"Removed {summary}; {len(cache)} addresses left in {CACHE_FILE}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,110 @@
+"""Compile opening hours into numeric tables at build time.
+
+getOpenStatus() in js/logic.js otherwise re-parses "HH:MM-HH:MM" strings and
+formats a date key for every business on every render. compile_hours()
+resolves a business's ``hours`` (including the ``default`` fallback) and
+``holiday_hours`` into:
+
+    {
+        "week": [s0, e0, s1, e1, ..., s6, e6],   # Sunday first, minutes since midnight
+        "holidays": [[20251225, -1, -1], [20260101, 600, 840]]   # sorted by date
+    }
+
+-1/-1 means closed that day. Time ranges are parsed with the same rules
+validate_data enforces (validate_data.parse_time_range). open_status() is
+the Python twin of the compiled path in getOpenStatus().
+"""
+
+import bisect
+
+from validate_data import parse_time_range
+
+# Same order as Date.getDay() in JavaScript
+WEEKDAYS = ("sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday")
+CLOSED = (-1, -1)
+
+
+def _compile_range(value):
+    parsed = parse_time_range(value)
+    return CLOSED if parsed is None else parsed
+
+
+def compile_hours(business):
+    """Return the compiled hours of *business*, or None if it cannot be compiled.
+
+    A business whose hours contain a value that is not a valid time range is
+    left alone (None), so the page falls back to parsing its strings and
+    behaves exactly as before.
+    """
+    hours = business.get("hours")
+    holiday_hours = business.get("holiday_hours")
+    if hours is not None and not isinstance(hours, dict):
+        return None
+    if holiday_hours is not None and not isinstance(holiday_hours, dict):
+        return None
+
+    try:
+        week = []
+        for day in WEEKDAYS:
+            # Mirrors `b.hours[dayName] || b.hours.default`: empty strings fall through.
+            value = (hours or {}).get(day) or (hours or {}).get("default")
+            week.extend(_compile_range(value) if value else CLOSED)
+
+        holidays = []
+        for date, value in (holiday_hours or {}).items():
+            if not value:
+                continue  # falsy overrides are ignored by getOpenStatus
+            # Same key getOpenStatus builds from the date: YYYY-MM-DD -> YYYYMMDD
+            yyyy, mm, dd = date.split("-")
+            if len(yyyy) != 4 or len(mm) != 2 or len(dd) != 2:
+                raise ValueError(date)
+            key = int(yyyy) * 10000 + int(mm) * 100 + int(dd)
+            holidays.append([key, *_compile_range(value)])
+    except (ValueError, AttributeError):
+        return None
+
+    holidays.sort()
+    return {"week": week, "holidays": holidays}
+
+
+def with_compiled_hours(businesses):
+    """Return copies of *businesses* with hours strings replaced by compiled_hours.
+
+    Businesses whose hours cannot be compiled are returned unchanged; the
+    input list and dicts are not modified.
+    """
+    result = []
+    for biz in businesses:
+        compiled = compile_hours(biz)
+        if compiled is None:
+            result.append(biz)
+            continue
+        copy = {k: v for k, v in biz.items() if k not in ("hours", "holiday_hours")}
+        copy["compiled_hours"] = compiled
+        result.append(copy)
+    return result
+
+
+def _format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def open_status(compiled, now):
+    """Return (is_open, text) for a compiled business at datetime *now*."""
+    day = (now.weekday() + 1) % 7  # Python's Monday=0 -> JavaScript's Sunday=0
+    start, end = compiled["week"][2 * day], compiled["week"][2 * day + 1]
+
+    key = now.year * 10000 + now.month * 100 + now.day
+    holidays = compiled["holidays"]
+    i = bisect.bisect_left(holidays, [key])
+    if i < len(holidays) and holidays[i][0] == key:
+        start, end = holidays[i][1], holidays[i][2]
+
+    if start < 0:
+        return False, "Closed today"
+    now_minutes = now.hour * 60 + now.minute
+    if start <= now_minutes < end:
+        return True, f"Open until {_format_minutes(end)}"
+    if now_minutes < start:
+        return False, f"Closed (Opens {_format_minutes(start)})"
+    return False, "Closed for the day"
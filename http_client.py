@@ -0,0 +1,185 @@
+"""Keep-alive HTTP client with retries, used by the geocoding providers.
+
+urllib.request.urlopen opens a new TCP (and TLS) connection per request.
+HttpClient keeps one http.client connection per host for each thread and
+reuses it for the whole batch. Transient failures are retried: connection
+errors, HTTP 429 and 5xx gateway errors. Retries use exponential backoff
+with jitter, or the server's Retry-After when it sends one. Every response
+is timed; LatencyStats summarizes the latencies with retry and error counts.
+"""
+
+import email.utils
+import http.client
+import random
+import ssl
+import threading
+import time
+import urllib.parse
+
+# Statuses worth retrying: rate limited, or a temporary server/gateway error
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 0.5
+MAX_BACKOFF = 30.0
+# Longest Retry-After honored; a longer one fails the request instead of stalling the build
+MAX_RETRY_AFTER = 300.0
+
+
+class HttpError(Exception):
+    """A non-2xx response that was not retried (or ran out of retries)."""
+
+    def __init__(self, status, reason, url):
+        super().__init__(f"HTTP {status} {reason} for {url}")
+        self.status = status
+
+
+class LatencyStats:
+    """Thread-safe request counters and latencies."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.retries = 0
+        self.errors = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def percentile(self, fraction):
+        """Return the latency below which *fraction* of the responses fall (nearest rank)."""
+        with self._lock:
+            ordered = sorted(self.latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+    def summary(self):
+        count = len(self.latencies)
+        if not count:
+            return f"0 responses, {self.errors} connection errors"
+        return (f"{count} responses, {self.retries} retries, {self.errors} connection errors; latency "
+                f"mean {sum(self.latencies) / count * 1000:.0f} ms, p50 {self.percentile(0.5) * 1000:.0f} ms, "
+                f"p95 {self.percentile(0.95) * 1000:.0f} ms, max {max(self.latencies) * 1000:.0f} ms")
+
+
+def retry_after_seconds(value, now=None):
+    """Parse a Retry-After header (delay in seconds or an HTTP date) into seconds, or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+class HttpClient:
+    """GET requests over reused per-host connections, retrying transient failures.
+
+    *throttle*, if given, is called before every attempt (retries included),
+    e.g. a rate limiter's acquire().
+    """
+
+    def __init__(self, headers=None, timeout=30, retries=DEFAULT_RETRIES, backoff=BACKOFF_BASE,
+                 max_backoff=MAX_BACKOFF, throttle=None, sleep=time.sleep, jitter=random.random):
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttle = throttle
+        self.stats = LatencyStats()
+        self._sleep = sleep
+        self._jitter = jitter
+        self._local = threading.local()
+        self._context = None
+
+    def _connections(self):
+        if not hasattr(self._local, 'connections'):
+            self._local.connections = {}
+        return self._local.connections
+
+    def _connection(self, scheme, netloc):
+        connections = self._connections()
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            if scheme == 'https':
+                if self._context is None:
+                    self._context = ssl.create_default_context()
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout, context=self._context)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = conn
+        return conn
+
+    def _drop(self, scheme, netloc):
+        conn = self._connections().pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        """Close this thread's connections."""
+        for scheme, netloc in list(self._connections()):
+            self._drop(scheme, netloc)
+
+    def backoff_delay(self, attempt):
+        """Exponential backoff for retry number *attempt* (0-based), with 'equal jitter'."""
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay / 2 + self._jitter() * delay / 2
+
+    def get(self, url):
+        """Return the body of a 2xx response to GET *url*.
+
+        Raises HttpError for other statuses, and the last connection error
+        when every attempt failed.
+        """
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"unsupported URL scheme: {url}")
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        for attempt in range(self.retries + 1):
+            if self.throttle:
+                self.throttle()
+            conn = self._connection(parts.scheme, parts.netloc)
+            delay = None
+            start = time.perf_counter()
+            try:
+                conn.request('GET', target, headers=self.headers)
+                response = conn.getresponse()
+                body = response.read()
+            except ssl.SSLCertVerificationError:
+                self._drop(parts.scheme, parts.netloc)
+                raise
+            except (http.client.HTTPException, OSError) as e:
+                # Includes a kept-alive connection the server has since closed
+                self._drop(parts.scheme, parts.netloc)
+                self.stats.record_error()
+                error = e
+            else:
+                self.stats.record(time.perf_counter() - start)
+                if response.will_close:
+                    self._drop(parts.scheme, parts.netloc)
+                if 200 <= response.status < 300:
+                    return body
+                error = HttpError(response.status, response.reason, url)
+                if response.status not in RETRY_STATUSES:
+                    raise error
+                delay = retry_after_seconds(response.getheader('Retry-After'))
+                if delay is not None and delay > MAX_RETRY_AFTER:
+                    raise error
+            if attempt == self.retries:
+                raise error
+            self.stats.record_retry()
+            self._sleep(self.backoff_delay(attempt) if delay is None else delay)
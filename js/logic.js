@@ -19,7 +19,52 @@ function typeInBroadCategory(type, broadCategory) {
 	return subcats.includes(type);
 }
 
+function formatMinutes(minutes) {
+	const hh = String(Math.floor(minutes / 60)).padStart(2, "0");
+	const mm = String(minutes % 60).padStart(2, "0");
+	return `${hh}:${mm}`;
+}
+
+// Fast path for hours compiled at build time by hours.py:
+// week = [start, end] minutes per day (Sunday first), holidays sorted by
+// YYYYMMDD; -1 means closed.
+function getCompiledOpenStatus(compiled, now) {
+	const day = now.getDay();
+	let start = compiled.week[2 * day];
+	let end = compiled.week[2 * day + 1];
+
+	const key =
+		now.getFullYear() * 10000 + (now.getMonth() + 1) * 100 + now.getDate();
+	const holidays = compiled.holidays;
+	let lo = 0;
+	let hi = holidays.length;
+	while (lo < hi) {
+		const mid = (lo + hi) >> 1;
+		if (holidays[mid][0] < key) lo = mid + 1;
+		else hi = mid;
+	}
+	if (lo < holidays.length && holidays[lo][0] === key) {
+		start = holidays[lo][1];
+		end = holidays[lo][2];
+	}
+
+	if (start < 0) return { isOpen: false, text: "Closed today" };
+	const nowMinutes = now.getHours() * 60 + now.getMinutes();
+	const isOpen = nowMinutes >= start && nowMinutes < end;
+	let text;
+	if (isOpen) {
+		text = `Open until ${formatMinutes(end)}`;
+	} else if (nowMinutes < start) {
+		text = `Closed (Opens ${formatMinutes(start)})`;
+	} else {
+		text = "Closed for the day";
+	}
+	return { isOpen, text };
+}
+
 function getOpenStatus(b, now = new Date()) {
+	if (b.compiled_hours) return getCompiledOpenStatus(b.compiled_hours, now);
+
 	const days = [
 		"sunday",
 		"monday",
@@ -100,23 +145,170 @@ function getDisplayType(b, filterType) {
 
 function filterBusinesses(businesses, filterType) {
 	if (filterType === "all") return businesses;
+	return businesses.filter((b) => matchesFilter(b, filterType));
+}
+
+// Whether one business passes filterBusinesses()
+function matchesFilter(b, filterType) {
+	if (filterType === "all") return true;
 
 	// Check if filterType is a broad category
 	if (categoryHierarchy[filterType]) {
 		const subcatTypes = getSubcategoryTypes(filterType);
-		return businesses.filter((b) => {
-			const types = Array.isArray(b.type) ? b.type : [b.type];
-			return types.some((t) => subcatTypes.includes(t));
-		});
+		const types = Array.isArray(b.type) ? b.type : [b.type];
+		return types.some((t) => subcatTypes.includes(t));
 	}
 
 	// Otherwise filter by specific subcategory type
-	return businesses.filter((b) => {
-		if (Array.isArray(b.type)) {
-			return b.type.includes(filterType);
+	if (Array.isArray(b.type)) {
+		return b.type.includes(filterType);
+	}
+	return b.type === filterType;
+}
+
+// Business data arrives either as an array of objects or in the compact
+// columnar format written by client_encoding.py; always return the array form.
+function decodeBusinesses(encoded) {
+	if (encoded == null || Array.isArray(encoded)) return encoded;
+	if (encoded.format !== "columnar-v1") {
+		throw new Error(`Unsupported business encoding: ${encoded.format}`);
+	}
+	const COORD_SCALE = 1e7;
+	const strings = encoded.strings;
+	const businesses = [];
+	for (let i = 0; i < encoded.count; i++) businesses.push({});
+
+	for (const [key, encoding, data] of encoded.columns) {
+		let prev = 0;
+		for (let i = 0; i < businesses.length; i++) {
+			const v = data[i];
+			if (v === null) continue;
+			if (encoding === "dict") {
+				businesses[i][key] = Array.isArray(v)
+					? v.map((idx) => strings[idx])
+					: strings[v];
+			} else if (encoding === "table") {
+				const table = {};
+				for (let j = 0; j < v.length; j += 2) {
+					table[strings[v[j]]] = strings[v[j + 1]];
+				}
+				businesses[i][key] = table;
+			} else if (encoding === "delta") {
+				prev += v;
+				businesses[i][key] = prev / COORD_SCALE;
+			} else {
+				businesses[i][key] = v;
+			}
+		}
+	}
+	return businesses;
+}
+
+// Slippy-map tile (x, y) containing a point, matching tiles.py
+function latLngToTile(lat, lng, zoom) {
+	const n = 2 ** zoom;
+	const latRad = (lat * Math.PI) / 180;
+	const x = Math.floor(((lng + 180) / 360) * n);
+	const y = Math.floor(
+		((1 - Math.asinh(Math.tan(latRad)) / Math.PI) / 2) * n,
+	);
+	return [Math.min(Math.max(x, 0), n - 1), Math.min(Math.max(y, 0), n - 1)];
+}
+
+// Keys ("x/y") of all tiles at `zoom` intersecting the given bounds
+function tilesForBounds(south, west, north, east, zoom) {
+	const [minX, minY] = latLngToTile(north, west, zoom);
+	const [maxX, maxY] = latLngToTile(south, east, zoom);
+	const keys = [];
+	for (let x = minX; x <= maxX; x++) {
+		for (let y = minY; y <= maxY; y++) {
+			keys.push(`${x}/${y}`);
 		}
-		return b.type === filterType;
-	});
+	}
+	return keys;
+}
+
+// --- Spatial index (grid-v1, built by spatial_index.py) ---
+
+function haversineMeters(lat1, lng1, lat2, lng2) {
+	const R = 6371000; // same radius as Leaflet's map.distance()
+	const rad = Math.PI / 180;
+	const dLat = (lat2 - lat1) * rad;
+	const dLng = (lng2 - lng1) * rad;
+	const a =
+		Math.sin(dLat / 2) ** 2 +
+		Math.cos(lat1 * rad) * Math.cos(lat2 * rad) * Math.sin(dLng / 2) ** 2;
+	return 2 * R * Math.asin(Math.min(1, Math.sqrt(a)));
+}
+
+function cellItems(index, row, col) {
+	const c = row * index.cols + col;
+	return index.items.slice(index.offsets[c], index.offsets[c + 1]);
+}
+
+// Businesses inside the box, in their original order
+function queryViewport(index, businesses, south, west, north, east) {
+	const [originLat, originLng] = index.origin;
+	const [cellH, cellW] = index.cell;
+	const r0 = Math.max(0, Math.floor((south - originLat) / cellH));
+	const r1 = Math.min(index.rows - 1, Math.floor((north - originLat) / cellH));
+	const c0 = Math.max(0, Math.floor((west - originLng) / cellW));
+	const c1 = Math.min(index.cols - 1, Math.floor((east - originLng) / cellW));
+	const found = [];
+	for (let r = r0; r <= r1; r++) {
+		for (let c = c0; c <= c1; c++) {
+			for (const i of cellItems(index, r, c)) {
+				const b = businesses[i];
+				if (b.lat >= south && b.lat <= north && b.long >= west && b.long <= east) {
+					found.push(i);
+				}
+			}
+		}
+	}
+	return found.sort((a, b) => a - b).map((i) => businesses[i]);
+}
+
+// The n businesses closest to (lat, lng) as [{ business, distance }],
+// nearest first, skipping those accept(business) rejects.
+// Mirrors spatial_index.nearest().
+function nearestBusinesses(index, businesses, lat, lng, n, accept = () => true) {
+	const { rows, cols } = index;
+	const [originLat, originLng] = index.origin;
+	const [cellH, cellW] = index.cell;
+	const row = Math.min(Math.max(Math.floor((lat - originLat) / cellH), 0), rows - 1);
+	const col = Math.min(Math.max(Math.floor((lng - originLng) / cellW), 0), cols - 1);
+	const mPerDegLat = (Math.PI * 6371000) / 180;
+	const maxAbsLat = Math.max(
+		Math.abs(originLat),
+		Math.abs(originLat + rows * cellH),
+		Math.abs(lat),
+	);
+	const mPerDegLng =
+		0.95 * mPerDegLat * Math.cos((Math.min(maxAbsLat, 89.9) * Math.PI) / 180);
+
+	let best = []; // sorted by distance, at most n entries
+	for (let ring = 0; ring <= Math.max(rows, cols); ring++) {
+		if (best.length >= n) {
+			const gap = (ring - 1) * Math.min(cellH * mPerDegLat, cellW * mPerDegLng);
+			if (gap > best[best.length - 1].distance) break;
+		}
+		for (let r = row - ring; r <= row + ring; r++) {
+			if (r < 0 || r >= rows) continue;
+			const edgeRow = r === row - ring || r === row + ring;
+			const step = edgeRow ? 1 : 2 * ring || 1;
+			for (let c = col - ring; c <= col + ring; c += step) {
+				if (c < 0 || c >= cols) continue;
+				for (const i of cellItems(index, r, c)) {
+					const b = businesses[i];
+					if (!accept(b)) continue;
+					best.push({ business: b, distance: haversineMeters(lat, lng, b.lat, b.long) });
+				}
+			}
+		}
+		best.sort((a, b) => a.distance - b.distance);
+		best = best.slice(0, n);
+	}
+	return best;
 }
 
 // Export for Node/Tests
@@ -126,9 +318,16 @@ if (typeof module !== "undefined" && module.exports) {
 		getIconHtml,
 		getDisplayLabel,
 		filterBusinesses,
+		matchesFilter,
 		getDisplayType,
 		categoryHierarchy,
 		getSubcategoryTypes,
 		typeInBroadCategory,
+		latLngToTile,
+		tilesForBounds,
+		decodeBusinesses,
+		haversineMeters,
+		queryViewport,
+		nearestBusinesses,
 	};
 }
@@ -19,6 +19,11 @@ let markers = [];
 let markerClusterGroup = null;
 const expandedCategories = {}; // Track which categories are expanded
 let activeClusterPopup = null; // Track the currently open cluster popup
+const requestedTiles = new Set(); // Tiles already fetched (tiled builds only)
+let spatialIndex = null; // Grid index over businesses (--spatial-index builds only)
+let unplacedBusinesses = []; // Businesses without coordinates, so not in spatialIndex
+const LIST_PAGE_SIZE = 50; // Cards added by each "Show more" of the nearest-first list
+let listLimit = LIST_PAGE_SIZE;
 
 // --- 3. HIERARCHICAL DROPDOWN ---
 
@@ -124,6 +129,7 @@ function setupDropdownEvents() {
 
 			// Update filter and close dropdown
 			currentFilter = value;
+			listLimit = LIST_PAGE_SIZE;
 			container.classList.remove("open");
 			updateApp();
 		}
@@ -175,7 +181,7 @@ function createCardHTML(b, distanceMeters) {
         `;
 }
 
-function renderList(data, distances) {
+function renderList(data, distances, hasMore) {
 	const container = document.getElementById("list-view");
 	if (data.length === 0) {
 		container.innerHTML =
@@ -186,7 +192,14 @@ function renderList(data, distances) {
 	data.forEach((b) => {
 		html += createCardHTML(b, distances ? distances.get(b) : undefined);
 	});
+	if (hasMore) html += '<button id="btn-show-more">Show more</button>';
 	container.innerHTML = html;
+	if (hasMore) {
+		document.getElementById("btn-show-more").onclick = () => {
+			listLimit += LIST_PAGE_SIZE;
+			updateApp();
+		};
+	}
 }
 
 function renderMap(data, distances) {
@@ -311,16 +324,35 @@ function renderMap(data, distances) {
 	map.addLayer(markerClusterGroup);
 }
 
-function updateApp() {
-	// Filter Data
-	let filtered = filterBusinesses(businesses, currentFilter);
+function isShown(b) {
+	return (
+		matchesFilter(b, currentFilter) && (!openNowFilter || getOpenStatus(b).isOpen)
+	);
+}
 
-	// Apply "Open Now" filter
-	if (openNowFilter) {
-		filtered = filtered.filter((b) => getOpenStatus(b).isOpen);
+function renderListView() {
+	if (userLoc && spatialIndex) {
+		// Nearest first from the grid index: only the listed businesses (plus
+		// one, to know whether to offer "Show more") are measured and sorted.
+		const nearest = nearestBusinesses(
+			spatialIndex,
+			businesses,
+			userLoc[0],
+			userLoc[1],
+			listLimit + 1,
+			isShown,
+		);
+		const distances = new Map(nearest.map((r) => [r.business, r.distance]));
+		const hasMore = nearest.length > listLimit;
+		const list = nearest.slice(0, listLimit).map((r) => r.business);
+		// Businesses without coordinates have no distance; they follow the
+		// nearest ones once the list has run out of those.
+		if (!hasMore) list.push(...unplacedBusinesses.filter(isShown));
+		renderList(list, distances, hasMore);
+		return;
 	}
 
-	// If we have user location, calculate distance and sort
+	const filtered = businesses.filter(isShown);
 	let distances = null;
 	if (userLoc) {
 		distances = new Map();
@@ -329,9 +361,41 @@ function updateApp() {
 		});
 		filtered.sort((a, b) => distances.get(a) - distances.get(b));
 	}
+	renderList(filtered, distances);
+}
 
-	if (currentView === "map") renderMap(filtered, distances);
-	else renderList(filtered, distances);
+function renderMapView() {
+	// With a spatial index, only create markers near the viewport;
+	// the map re-renders on moveend.
+	let shown;
+	if (spatialIndex) {
+		const bounds = map.getBounds().pad(0.5);
+		shown = queryViewport(
+			spatialIndex,
+			businesses,
+			bounds.getSouth(),
+			bounds.getWest(),
+			bounds.getNorth(),
+			bounds.getEast(),
+		).filter(isShown);
+	} else {
+		shown = businesses.filter(isShown);
+	}
+
+	// Markers need no order; distances are only for their popups.
+	let distances = null;
+	if (userLoc) {
+		distances = new Map();
+		shown.forEach((b) => {
+			distances.set(b, map.distance(userLoc, [b.lat, b.long]));
+		});
+	}
+	renderMap(shown, distances);
+}
+
+function updateApp() {
+	if (currentView === "list") renderListView();
+	else renderMapView();
 
 	// Update the active cluster popup if it exists
 	if (activeClusterPopup && map.hasLayer(activeClusterPopup.popup)) {
@@ -355,6 +419,44 @@ function updateApp() {
 	}
 }
 
+// Tiled builds ship no businesses inline; rawData.tiles lists the tile files
+// and we fetch the ones intersecting the viewport as the map moves.
+
+function loadVisibleTiles() {
+	const tiles = rawData.tiles;
+	const bounds = map.getBounds();
+	const available = new Set(tiles.available);
+	const keys = tilesForBounds(
+		bounds.getSouth(),
+		bounds.getWest(),
+		bounds.getNorth(),
+		bounds.getEast(),
+		tiles.zoom,
+	).filter((key) => available.has(key) && !requestedTiles.has(key));
+
+	keys.forEach((key) => {
+		requestedTiles.add(key);
+		const [x, y] = key.split("/");
+		const url = tiles.url
+			.replace("{z}", tiles.zoom)
+			.replace("{x}", x)
+			.replace("{y}", y);
+		fetch(url)
+			.then((res) => {
+				if (!res.ok) throw new Error(`HTTP ${res.status}`);
+				return res.json();
+			})
+			.then((items) => {
+				businesses.push(...decodeBusinesses(items));
+				updateApp();
+			})
+			.catch((err) => {
+				console.error(`Could not load tile ${key}:`, err);
+				requestedTiles.delete(key);
+			});
+	});
+}
+
 // --- 5. INITIALIZATION ---
 window.onload = () => {
 	// Build hierarchical dropdown
@@ -386,9 +488,25 @@ window.onload = () => {
 		},
 	).addTo(map);
 
+	spatialIndex = rawData.spatial_index || null;
+	if (spatialIndex) {
+		unplacedBusinesses = businesses.filter((b) => b.lat == null || b.long == null);
+	}
+
 	// Initial Render
 	updateApp();
 
+	if (rawData.tiles) {
+		map.on("moveend", loadVisibleTiles);
+		loadVisibleTiles();
+	}
+
+	if (spatialIndex) {
+		map.on("moveend", () => {
+			if (currentView === "map") updateApp();
+		});
+	}
+
 	// --- EVENTS ---
 
 	// Open Now toggle
@@ -433,6 +551,7 @@ window.onload = () => {
 			(pos) => {
 				const { latitude, longitude } = pos.coords;
 				userLoc = [latitude, longitude];
+				listLimit = LIST_PAGE_SIZE;
 
 				// Add/Update User Marker
 				if (userMarker) map.removeLayer(userMarker);
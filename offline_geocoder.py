@@ -0,0 +1,180 @@
+"""Offline geocoding from a local address-point dataset.
+
+OfflineGeocoder loads address points from CSV files, such as an
+OpenAddresses download or an OSM extract exported with addr:* columns. It
+indexes them by normalized street name and postcode. Each street keeps its
+house numbers in a sorted list, so a lookup is one bisect. An exact house
+number returns its point. A missing one is interpolated between the nearest
+numbers on the same side of the street (same parity), or both sides if
+needed, as long as they are at most MAX_GAP apart. Numbers outside a
+street's range are not extrapolated.
+
+Recognized CSV columns (case-insensitive):
+    number:   number, housenumber, house_number, addr:housenumber
+    street:   street, addr:street
+    postcode: postcode, zip, postal_code, addr:postcode (optional)
+    lat:      lat, latitude, y
+    long:     lon, long, lng, longitude, x
+"""
+
+import csv
+import re
+from bisect import bisect_left
+
+from address import UNIT_DESIGNATORS, normalize_address
+
+COLUMNS = {
+    'number': ('number', 'housenumber', 'house_number', 'addr:housenumber'),
+    'street': ('street', 'addr:street'),
+    'postcode': ('postcode', 'zip', 'postal_code', 'addr:postcode'),
+    'lat': ('lat', 'latitude', 'y'),
+    'long': ('lon', 'long', 'lng', 'longitude', 'x'),
+}
+# Largest house-number gap interpolated across
+MAX_GAP = 100
+# Neighbours scanned on each side for one with the same parity
+PARITY_WINDOW = 16
+
+_NUMBER_RE = re.compile(r'^\s*(\d+)')
+_HOUSE_RE = re.compile(r'^\s*(\d+)[a-z]?(?:-\d+)?\s+(.+)$', re.IGNORECASE)
+_POSTCODE_RE = re.compile(r'\b(\d{5})(?:-\d{4})?\s*$')
+_UNIT_TOKENS = frozenset(UNIT_DESIGNATORS.values())
+
+
+def street_key(street):
+    """Normalize a street name, dropping any unit ('irving st # 5' -> 'irving st')."""
+    tokens = []
+    for token in normalize_address(street).split():
+        if token in _UNIT_TOKENS:
+            break
+        tokens.append(token)
+    return ' '.join(tokens)
+
+
+def parse_address(address):
+    """Split '4541 Irving St, San Francisco, CA 94122' into (4541, 'irving st', '94122').
+
+    Returns None if the first part does not start with a house number.
+    The postcode is None when the address has none.
+    """
+    match = _HOUSE_RE.match(address.split(',')[0])
+    if not match:
+        return None
+    postcode = _POSTCODE_RE.search(address)
+    return int(match.group(1)), street_key(match.group(2)), postcode.group(1) if postcode else None
+
+
+class _Street:
+    """The points of one street in one postcode, sorted by house number."""
+
+    def __init__(self):
+        self.points = {}
+        self.numbers = []
+        self.coords = []
+
+    def add(self, number, lat, long):
+        self.points.setdefault(number, []).append((lat, long))
+        self.numbers = None
+
+    def freeze(self):
+        self.numbers = sorted(self.points)
+        # Several points for one number (units, entrances) are averaged
+        self.coords = [
+            (sum(lat for lat, _ in points) / len(points), sum(long for _, long in points) / len(points))
+            for points in (self.points[number] for number in self.numbers)
+        ]
+
+    def _neighbour(self, index, step, number, parity):
+        end = max(-1, index - PARITY_WINDOW) if step < 0 else min(len(self.numbers), index + PARITY_WINDOW)
+        for i in range(index, end, step):
+            if parity is None or self.numbers[i] % 2 == parity:
+                return i if abs(self.numbers[i] - number) <= MAX_GAP else None
+        return None
+
+    def locate(self, number):
+        if self.numbers is None:
+            self.freeze()
+        index = bisect_left(self.numbers, number)
+        if index < len(self.numbers) and self.numbers[index] == number:
+            return self.coords[index]
+        for parity in (number % 2, None):
+            low = self._neighbour(index - 1, -1, number, parity)
+            high = self._neighbour(index, 1, number, parity)
+            if low is not None and high is not None:
+                n0, n1 = self.numbers[low], self.numbers[high]
+                if n1 - n0 > MAX_GAP:
+                    return None
+                t = (number - n0) / (n1 - n0)
+                (lat0, long0), (lat1, long1) = self.coords[low], self.coords[high]
+                return lat0 + (lat1 - lat0) * t, long0 + (long1 - long0) * t
+        return None
+
+
+class OfflineGeocoder:
+    """Geocodes addresses from local address points; see the module docstring."""
+
+    def __init__(self, source='offline'):
+        self.source = source
+        # street key -> {postcode or '': _Street}
+        self._streets = {}
+        self.points = 0
+
+    @classmethod
+    def from_csv(cls, paths):
+        geocoder = cls(source='offline:' + ','.join(paths))
+        for path in paths:
+            geocoder.load_csv(path)
+        for postcodes in geocoder._streets.values():
+            for street in postcodes.values():
+                street.freeze()
+        return geocoder
+
+    def add(self, number, street, lat, long, postcode=None):
+        key = street_key(street)
+        if not key:
+            return
+        self._streets.setdefault(key, {}).setdefault(postcode or '', _Street()).add(number, lat, long)
+        self.points += 1
+
+    def load_csv(self, path):
+        """Add the points of one CSV file; rows without a number, street or coordinates are skipped."""
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            fields = {name.lower(): name for name in reader.fieldnames or ()}
+            columns = {}
+            for column, names in COLUMNS.items():
+                columns[column] = next((fields[name] for name in names if name in fields), None)
+            missing = [column for column, name in columns.items() if name is None and column != 'postcode']
+            if missing:
+                raise ValueError(f"{path}: no {', '.join(missing)} column")
+            for row in reader:
+                number = _NUMBER_RE.match(row[columns['number']] or '')
+                try:
+                    lat, long = float(row[columns['lat']]), float(row[columns['long']])
+                except (TypeError, ValueError):
+                    continue
+                if not number:
+                    continue
+                postcode = (row[columns['postcode']] or '')[:5] if columns['postcode'] else None
+                self.add(int(number.group(1)), row[columns['street']] or '', lat, long, postcode)
+
+    def lookup(self, address):
+        """Return {'lat', 'long'} for *address*, or None if it cannot be placed."""
+        parsed = parse_address(address)
+        if parsed is None:
+            return None
+        number, key, postcode = parsed
+        postcodes = self._streets.get(key)
+        if not postcodes:
+            return None
+        if postcode in postcodes:
+            street = postcodes[postcode]
+        elif len(postcodes) == 1 and (postcode is None or '' in postcodes):
+            # One candidate: the address has no postcode or the data has none
+            street = next(iter(postcodes.values()))
+        else:
+            return None
+        coords = street.locate(number)
+        if coords is None:
+            return None
+        return {'lat': round(coords[0], 7), 'long': round(coords[1], 7)}
@@ -0,0 +1,97 @@
+"""Small dependency-graph runner used by build.py.
+
+A build is a list of `Stage`s. Each stage names the stages it depends on and
+receives their return values; stages whose dependencies are all finished run
+concurrently on a thread pool. Threads are enough here because the slow
+stages either wait on a subprocess (npm/terser), on the network (geocoding)
+or on file I/O.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+
+class Stage:
+    def __init__(self, name, fn, deps=()):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+
+
+class PipelineRun:
+    """Results and timings of one `run_stages` call."""
+
+    def __init__(self):
+        self.results = {}
+        self.timings = {}  # name -> (start, end), seconds relative to run start
+        self.wall = 0.0
+
+    @property
+    def busy(self):
+        """Sum of all stage durations, i.e. the wall time of a sequential run."""
+        return sum(end - start for start, end in self.timings.values())
+
+    def report(self):
+        """Return a printable table of stage timings and the time saved by overlap."""
+        lines = [f"{'stage':<16} {'start':>8} {'duration':>9}"]
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            lines.append(f"{name:<16} {start:7.3f}s {end - start:8.3f}s")
+        saved = self.busy - self.wall
+        lines.append(f"Stage time {self.busy:.3f}s, wall time {self.wall:.3f}s, overlap saved {saved:.3f}s")
+        return "\n".join(lines)
+
+
+def _check_graph(stages):
+    names = {stage.name for stage in stages}
+    if len(names) != len(stages):
+        raise ValueError("duplicate stage names")
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in names]
+        if missing:
+            raise ValueError(f"stage {stage.name!r} depends on unknown stage(s): {', '.join(missing)}")
+
+
+def run_stages(stages, max_workers=None, profiler=None):
+    """Run *stages* in dependency order, overlapping independent ones.
+
+    Each stage function is called with a dict of the results of its
+    dependencies. The first exception raised by a stage is re-raised once
+    running stages have finished; stages not yet started are abandoned.
+    With ``max_workers=1`` the stages run one at a time. Each stage is
+    wrapped in ``profiler.stage(name)`` when a profiler is given.
+    """
+    _check_graph(stages)
+    run = PipelineRun()
+    pending = list(stages)
+    running = {}
+    origin = time.perf_counter()
+
+    def call(stage):
+        start = time.perf_counter() - origin
+        try:
+            with profiler.stage(stage.name) if profiler else nullcontext():
+                return stage.fn({dep: run.results[dep] for dep in stage.deps})
+        finally:
+            run.timings[stage.name] = (start, time.perf_counter() - origin)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            ready = [stage for stage in pending if all(dep in run.results for dep in stage.deps)]
+            for stage in ready:
+                pending.remove(stage)
+                running[pool.submit(call, stage)] = stage
+            if not running:
+                raise ValueError(f"dependency cycle among stages: {', '.join(s.name for s in pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    wait(running)
+                    raise error
+                run.results[stage.name] = future.result()
+
+    run.wall = time.perf_counter() - origin
+    return run
@@ -0,0 +1,142 @@
+"""Per-stage profiling for build.py and generate_qr.py (``--profile``).
+
+Each stage records wall time, CPU time of the thread that ran it, bytes in
+and out (reported by the stage itself) and the peak traced Python memory
+while it ran. Results are printed as a summary table and written as a
+Chrome ``trace_event`` file that can be opened in chrome://tracing or
+https://ui.perfetto.dev.
+
+Stages may run concurrently on different threads and may be nested; the
+peak memory of a stage is the process-wide peak observed while it was
+running, so overlapping stages share their peaks.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class StageRecord:
+    def __init__(self, name, start, thread_id):
+        self.name = name
+        self.start = start
+        self.thread_id = thread_id
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.peak_memory = 0
+
+
+class Profiler:
+    """Collects StageRecords. A disabled profiler records nothing, so callers
+    can use it unconditionally."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.records = []
+        self._active = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+        self._started_tracemalloc = False
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def close(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def _fold_peak(self):
+        # Credit the peak since the last reset to every running stage, then
+        # start a new measurement window. Caller holds the lock.
+        _current, peak = tracemalloc.get_traced_memory()
+        for record in self._active:
+            record.peak_memory = max(record.peak_memory, peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, bytes_in=0):
+        """Time the enclosed block as stage *name*."""
+        if not self.enabled:
+            yield None
+            return
+        record = StageRecord(name, time.perf_counter() - self._origin, threading.get_ident())
+        record.bytes_in = bytes_in
+        with self._lock:
+            self._fold_peak()
+            self._active.append(record)
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(record)
+        cpu_start = time.thread_time()
+        try:
+            yield record
+        finally:
+            record.cpu = time.thread_time() - cpu_start
+            record.wall = time.perf_counter() - self._origin - record.start
+            stack.pop()
+            with self._lock:
+                self._fold_peak()
+                self._active.remove(record)
+                self.records.append(record)
+
+    def count(self, bytes_in=0, bytes_out=0):
+        """Add to the byte counters of the innermost stage on this thread."""
+        stack = getattr(self._local, 'stack', None)
+        if self.enabled and stack:
+            stack[-1].bytes_in += bytes_in
+            stack[-1].bytes_out += bytes_out
+
+    def summary(self):
+        """Return a table with one row per stage name (repeated stages are summed)."""
+        rows = {}
+        for record in self.records:
+            row = rows.setdefault(record.name, {'count': 0, 'wall': 0.0, 'cpu': 0.0,
+                                                'bytes_in': 0, 'bytes_out': 0, 'peak': 0,
+                                                'start': record.start})
+            row['count'] += 1
+            row['wall'] += record.wall
+            row['cpu'] += record.cpu
+            row['bytes_in'] += record.bytes_in
+            row['bytes_out'] += record.bytes_out
+            row['peak'] = max(row['peak'], record.peak_memory)
+            row['start'] = min(row['start'], record.start)
+
+        header = f"{'stage':<20} {'n':>5} {'wall':>9} {'cpu':>9} {'bytes in':>12} {'bytes out':>12} {'peak mem':>10}"
+        lines = [header, '-' * len(header)]
+        for name, row in sorted(rows.items(), key=lambda item: item[1]['start']):
+            lines.append(
+                f"{name:<20} {row['count']:>5} {row['wall']:8.3f}s {row['cpu']:8.3f}s "
+                f"{row['bytes_in']:>12,} {row['bytes_out']:>12,} {row['peak'] / 1024 / 1024:8.1f}MB"
+            )
+        return '\n'.join(lines)
+
+    def trace_events(self):
+        """Return the records as Chrome trace_event 'complete' (ph=X) events."""
+        pid = os.getpid()
+        return [
+            {
+                'name': record.name,
+                'ph': 'X',
+                'ts': round(record.start * 1e6),
+                'dur': round(record.wall * 1e6),
+                'pid': pid,
+                'tid': record.thread_id,
+                'args': {
+                    'cpu_ms': round(record.cpu * 1000, 3),
+                    'bytes_in': record.bytes_in,
+                    'bytes_out': record.bytes_out,
+                    'peak_memory_bytes': record.peak_memory,
+                },
+            }
+            for record in sorted(self.records, key=lambda r: r.start)
+        ]
+
+    def write_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'traceEvents': self.trace_events(), 'displayTimeUnit': 'ms'}, f)
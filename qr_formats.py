@@ -0,0 +1,229 @@
+"""Vector QR code outputs: SVG files and multi-up PDF sheets.
+
+Both draw the module matrix of a qrcode.QRCode (get_matrix(), border
+included) as shapes, one per horizontal run of dark modules, so the codes
+stay sharp at any print size and the files stay small. The logo, if any,
+is centered over the modules at 1/4 of the code's width, as in the PNGs.
+It is resized to at most VECTOR_LOGO_SIZE pixels and embedded once per
+file. Each SVG gets a data URI of a 256-colour PNG; a PDF gets one shared
+full-colour image object.
+
+PdfSheetWriter lays the codes out in a grid of labelled cells, page after
+page. Each page is written as soon as it is full, so a sheet of thousands
+of codes needs memory for one page only.
+"""
+
+import base64
+import io
+import os
+import zlib
+
+from PIL import Image
+
+# The logo covers 1/LOGO_FRACTION of the code's width (ERROR_CORRECT_H tolerates it)
+LOGO_FRACTION = 4
+# Longest side of the logo image embedded in SVG and PDF output, in pixels
+VECTOR_LOGO_SIZE = 256
+# Page sizes in PDF points (1/72 inch)
+PAGE_SIZES = {'letter': (612.0, 792.0), 'a4': (595.28, 841.89)}
+
+# Resized logos by (path, mtime, file size); kept per process
+_vector_logos = {}
+
+
+def module_runs(matrix):
+    """Yield (x, y, length) for each horizontal run of dark modules."""
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if row[x]:
+                start = x
+                while x < len(row) and row[x]:
+                    x += 1
+                yield start, y, x - start
+            else:
+                x += 1
+
+
+def vector_logo(logo_path):
+    """Return the logo as an RGBA image no larger than VECTOR_LOGO_SIZE, with the bytes of
+    a 256-colour PNG of it."""
+    stat = os.stat(logo_path)
+    key = (logo_path, stat.st_mtime_ns, stat.st_size)
+    if key not in _vector_logos:
+        logo = Image.open(logo_path).convert('RGBA')
+        logo.thumbnail((VECTOR_LOGO_SIZE, VECTOR_LOGO_SIZE), Image.Resampling.LANCZOS)
+        png = io.BytesIO()
+        # A palette keeps the embedded logo a fraction of the size of the RGBA one
+        logo.quantize(256, method=Image.Quantize.FASTOCTREE).save(png, format='PNG', optimize=True)
+        _vector_logos[key] = (logo, png.getvalue())
+    return _vector_logos[key]
+
+
+def logo_box(logo_size, code_size):
+    """Return (width, height) of a logo of *logo_size* pixels fitted in 1/LOGO_FRACTION of *code_size*."""
+    box = code_size / LOGO_FRACTION
+    scale = box / max(logo_size)
+    return logo_size[0] * scale, logo_size[1] * scale
+
+
+def _num(value):
+    """Format a coordinate compactly: 12, 12.5, 12.333."""
+    return f"{value:.3f}".rstrip('0').rstrip('.')
+
+
+def svg_document(matrix, logo=None, box_size=10):
+    """Return an SVG drawing of *matrix* (box_size pixels per module), with an optional
+    (image, png_bytes) logo from vector_logo()."""
+    n = len(matrix)
+    # Each run is a 1-module-wide stroke through the middle of its row; moves are
+    # relative to the end of the previous run
+    path = []
+    end_x, end_y = 0, 0
+    for x, y, length in module_runs(matrix):
+        path.append(f"m{x - end_x} {y - end_y}h{length}" if path else f"M{x} {y + 0.5}h{length}")
+        end_x, end_y = x + length, y
+    path = ''.join(path)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+        f'viewBox="0 0 {n} {n}" width="{n * box_size}" height="{n * box_size}" shape-rendering="crispEdges">',
+        f'<rect width="{n}" height="{n}" fill="#fff"/>',
+        f'<path stroke="#000" d="{path}"/>',
+    ]
+    if logo is not None:
+        image, png = logo
+        width, height = logo_box(image.size, n)
+        parts.append(
+            f'<image x="{_num((n - width) / 2)}" y="{_num((n - height) / 2)}" width="{_num(width)}" '
+            f'height="{_num(height)}" xlink:href="data:image/png;base64,{base64.b64encode(png).decode("ascii")}"/>')
+    parts.append('</svg>\n')
+    return '\n'.join(parts)
+
+
+def write_svg(matrix, output_path, logo_path=None, box_size=10):
+    logo = vector_logo(logo_path) if logo_path else None
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(svg_document(matrix, logo, box_size))
+
+
+def _pdf_text(text):
+    """Encode *text* as a PDF string literal for a WinAnsi-encoded font."""
+    data = text.encode('cp1252', 'replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+class PdfSheetWriter:
+    """Writes QR codes to a PDF, *columns* x *rows* labelled codes per page.
+
+    Pages are written as they fill up; close() (or leaving the with block)
+    writes the last page and the PDF's trailer.
+    """
+
+    # Fixed object numbers; the logo, pages and their contents follow
+    CATALOG, PAGES, FONT = 1, 2, 3
+
+    def __init__(self, path, columns=3, rows=4, page_size='letter', margin=36.0, label_size=8.0,
+                 logo_path=None):
+        self.page_width, self.page_height = PAGE_SIZES[page_size]
+        self.columns = columns
+        self.rows = rows
+        self.margin = margin
+        self.label_size = label_size
+        self.cell_width = (self.page_width - 2 * margin) / columns
+        self.cell_height = (self.page_height - 2 * margin) / rows
+        # Square code above its label line, with a little space around it
+        self.code_size = min(self.cell_width, self.cell_height - 2 * label_size) * 0.9
+        self.codes = 0
+        self.pages = []
+        self._offsets = {}
+        self._next_object = self.FONT + 1
+        self._cell = 0
+        self._content = []
+        self._file = open(path, 'wb')
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self._object(self.CATALOG, f'<< /Type /Catalog /Pages {self.PAGES} 0 R >>'.encode())
+        self._object(self.FONT, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+        self.logo = None
+        if logo_path:
+            image, _png = vector_logo(logo_path)
+            self.logo = image.size
+            self._logo_number, mask_number = self._next_object, self._next_object + 1
+            self._next_object += 2
+            self._image(self._logo_number, image.convert('RGB').tobytes(), image.size, '/DeviceRGB',
+                        f' /SMask {mask_number} 0 R')
+            self._image(mask_number, image.getchannel('A').tobytes(), image.size, '/DeviceGray')
+
+    def _object(self, number, body, stream=None):
+        self._offsets[number] = self._file.tell()
+        self._file.write(f'{number} 0 obj\n'.encode() + body)
+        if stream is not None:
+            self._file.write(b'\nstream\n' + stream + b'\nendstream')
+        self._file.write(b'\nendobj\n')
+
+    def _image(self, number, data, size, color_space, extra=''):
+        data = zlib.compress(data, 9)
+        self._object(number, (f'<< /Type /XObject /Subtype /Image /Width {size[0]} /Height {size[1]} '
+                              f'/ColorSpace {color_space} /BitsPerComponent 8 /Filter /FlateDecode{extra} '
+                              f'/Length {len(data)} >>').encode(), data)
+
+    def add(self, matrix, label=''):
+        """Draw the code *matrix* with *label* in the next free cell."""
+        column, row = self._cell % self.columns, self._cell // self.columns
+        left = self.margin + column * self.cell_width + (self.cell_width - self.code_size) / 2
+        padding = (self.cell_height - self.code_size - 2 * self.label_size) / 2
+        top = self.page_height - self.margin - row * self.cell_height - padding
+        unit = self.code_size / len(matrix)
+        # Module coordinates: x to the right, y down from the code's top-left corner
+        ops = [f'q {_num(unit)} 0 0 {_num(-unit)} {_num(left)} {_num(top)} cm 0 g'.encode()]
+        ops.extend(f'{x} {y} {length} 1 re'.encode() for x, y, length in module_runs(matrix))
+        ops.append(b'f Q')
+        if self.logo:
+            width, height = logo_box(self.logo, self.code_size)
+            x = left + (self.code_size - width) / 2
+            y = top - (self.code_size + height) / 2
+            ops.append(f'q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(y)} cm /Logo Do Q'.encode())
+        if label:
+            # Helvetica averages about half an em per character
+            label = label[:max(1, int(self.code_size / (self.label_size * 0.5)))]
+            baseline = top - self.code_size - 1.5 * self.label_size
+            ops.append(f'BT /F1 {_num(self.label_size)} Tf {_num(left)} {_num(baseline)} Td '.encode()
+                       + _pdf_text(label) + b' Tj ET')
+        self._content.extend(ops)
+        self.codes += 1
+        self._cell += 1
+        if self._cell == self.columns * self.rows:
+            self._flush_page()
+
+    def _flush_page(self):
+        content = zlib.compress(b'\n'.join(self._content), 6)
+        content_number, page_number = self._next_object, self._next_object + 1
+        self._next_object += 2
+        self._object(content_number, f'<< /Filter /FlateDecode /Length {len(content)} >>'.encode(), content)
+        xobjects = f' /XObject << /Logo {self._logo_number} 0 R >>' if self.logo else ''
+        self._object(page_number, (f'<< /Type /Page /Parent {self.PAGES} 0 R /Contents {content_number} 0 R '
+                                   f'/Resources << /Font << /F1 {self.FONT} 0 R >>{xobjects} >> >>').encode())
+        self.pages.append(page_number)
+        self._content = []
+        self._cell = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self._content or not self.pages:
+            self._flush_page()
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        self._object(self.PAGES, (f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} '
+                                  f'/MediaBox [0 0 {_num(self.page_width)} {_num(self.page_height)}] >>').encode())
+        count = self._next_object
+        xref = self._file.tell()
+        lines = [f'xref\n0 {count}\n', '0000000000 65535 f \n']
+        lines.extend(f'{self._offsets[n]:010d} 00000 n \n' for n in range(1, count))
+        lines.append(f'trailer\n<< /Size {count} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref}\n%%EOF\n')
+        self._file.write(''.join(lines).encode())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
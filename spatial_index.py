@@ -0,0 +1,154 @@
+"""Static grid index over business coordinates, built once at build time.
+
+The bounding box of all points is cut into rows x cols equal cells. Cells are
+stored in compressed-sparse-row form: ``items`` lists point indexes grouped
+by cell (row-major), and the points of cell c are
+``items[offsets[c]:offsets[c + 1]]``.
+
+    {
+        "format": "grid-v1",
+        "origin": [south, west],
+        "cell": [cell_height_deg, cell_width_deg],
+        "rows": 4, "cols": 5,
+        "offsets": [0, 2, 2, 5, ...],   # rows * cols + 1 entries
+        "items": [3, 17, 0, 4, 9, ...]
+    }
+
+Indexes refer to positions in the businesses array sent to the page; points
+without coordinates are simply not indexed. query_bbox() and nearest() are
+mirrored by queryViewport() and nearestBusinesses() in js/logic.js.
+"""
+
+import heapq
+import math
+
+FORMAT = 'grid-v1'
+TARGET_PER_CELL = 8
+EARTH_RADIUS_M = 6371000  # same radius Leaflet's map.distance() uses
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def points_of(items):
+    """Return [(lat, long) or None] for a list of business/location dicts."""
+    return [(item['lat'], item['long']) if 'lat' in item and 'long' in item else None for item in items]
+
+
+def build_spatial_index(points, target_per_cell=TARGET_PER_CELL):
+    """Build a grid index over *points*, a list of (lat, long) or None."""
+    placed = [(i, p) for i, p in enumerate(points) if p is not None]
+    if not placed:
+        return {'format': FORMAT, 'origin': [0.0, 0.0], 'cell': [1.0, 1.0],
+                'rows': 1, 'cols': 1, 'offsets': [0, 0], 'items': []}
+
+    south = min(p[0] for _, p in placed)
+    north = max(p[0] for _, p in placed)
+    west = min(p[1] for _, p in placed)
+    east = max(p[1] for _, p in placed)
+    # Pad so points on the north/east edge still fall inside the last cell.
+    height = max(north - south, 1e-6) * (1 + 1e-9)
+    width = max(east - west, 1e-6) * (1 + 1e-9)
+
+    cells = max(1, math.ceil(len(placed) / target_per_cell))
+    rows = max(1, round(math.sqrt(cells * height / width)))
+    cols = max(1, math.ceil(cells / rows))
+    cell_h, cell_w = height / rows, width / cols
+
+    buckets = [[] for _ in range(rows * cols)]
+    for i, (lat, lng) in placed:
+        row = min(int((lat - south) / cell_h), rows - 1)
+        col = min(int((lng - west) / cell_w), cols - 1)
+        buckets[row * cols + col].append(i)
+
+    offsets = [0]
+    items = []
+    for bucket in buckets:
+        items.extend(bucket)
+        offsets.append(len(items))
+    return {'format': FORMAT, 'origin': [south, west], 'cell': [cell_h, cell_w],
+            'rows': rows, 'cols': cols, 'offsets': offsets, 'items': items}
+
+
+def _check(index):
+    if index.get('format') != FORMAT:
+        raise ValueError(f"unsupported spatial index format: {index.get('format')!r}")
+
+
+def _cell_range(index, lat_lo, lat_hi, lng_lo, lng_hi):
+    south, west = index['origin']
+    cell_h, cell_w = index['cell']
+    r0 = max(0, math.floor((lat_lo - south) / cell_h))
+    r1 = min(index['rows'] - 1, math.floor((lat_hi - south) / cell_h))
+    c0 = max(0, math.floor((lng_lo - west) / cell_w))
+    c1 = min(index['cols'] - 1, math.floor((lng_hi - west) / cell_w))
+    return r0, r1, c0, c1
+
+
+def _cell_items(index, row, col):
+    c = row * index['cols'] + col
+    return index['items'][index['offsets'][c]:index['offsets'][c + 1]]
+
+
+def query_bbox(index, points, south, west, north, east):
+    """Return the indexes of points inside the box, in ascending order."""
+    _check(index)
+    r0, r1, c0, c1 = _cell_range(index, south, north, west, east)
+    found = []
+    for row in range(r0, r1 + 1):
+        for col in range(c0, c1 + 1):
+            for i in _cell_items(index, row, col):
+                lat, lng = points[i]
+                if south <= lat <= north and west <= lng <= east:
+                    found.append(i)
+    return sorted(found)
+
+
+def nearest(index, points, lat, lng, n):
+    """Return [(distance_m, index)] of the *n* points closest to (lat, lng).
+
+    Searches rings of cells outward from the query cell and stops once no
+    unvisited cell can hold anything closer than the current n-th result.
+    """
+    _check(index)
+    rows, cols = index['rows'], index['cols']
+    south, west = index['origin']
+    cell_h, cell_w = index['cell']
+    row = min(max(math.floor((lat - south) / cell_h), 0), rows - 1)
+    col = min(max(math.floor((lng - west) / cell_w), 0), cols - 1)
+    # Metres per degree, conservatively small so the ring bound never
+    # overshoots: longitude at the most poleward latitude involved, less 5%
+    # because a great circle is slightly shorter than the parallel.
+    m_per_deg_lat = math.pi * EARTH_RADIUS_M / 180
+    max_abs_lat = max(abs(south), abs(south + rows * cell_h), abs(lat))
+    m_per_deg_lng = 0.95 * m_per_deg_lat * math.cos(math.radians(min(max_abs_lat, 89.9)))
+
+    best = []  # max-heap of (-distance, index)
+    for ring in range(max(rows, cols) + 1):
+        if len(best) >= n:
+            # Any point in this ring or beyond is at least this far away
+            # (relative to the edge of the query cell's neighbourhood).
+            gap = (ring - 1) * min(cell_h * m_per_deg_lat, cell_w * m_per_deg_lng)
+            if gap > -best[0][0]:
+                break
+        for r in range(row - ring, row + ring + 1):
+            if r < 0 or r >= rows:
+                continue
+            edge_row = r in (row - ring, row + ring)
+            step = 1 if edge_row else 2 * ring or 1
+            for c in range(col - ring, col + ring + 1, step):
+                if c < 0 or c >= cols:
+                    continue
+                for i in _cell_items(index, r, c):
+                    d = haversine_m(lat, lng, *points[i])
+                    if len(best) < n:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+    return sorted((-neg_d, i) for neg_d, i in best)
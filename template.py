@@ -0,0 +1,108 @@
+"""Pre-split page templates and the streaming page renderer.
+
+HTML_TEMPLATE (build.py) is a str.format template. Rather than formatting it
+into one large string per page, Template splits it once into literal text
+and named slots, each tagged with the size-report section it belongs to
+(artifacts.label_sections). The minified variant is made by minifying the
+template itself with a sentinel standing in for every slot, so slot values
+(the data JSON, the JS bundle) never pass through the minifier.
+
+render() walks the slots once, writing the text and slot values of every
+page variant into its writer (artifacts.StreamedArtifact) as it goes.
+iter_json() encodes the data in pieces, so neither the pages nor the full
+data JSON are ever held in memory as one string.
+"""
+
+import json
+from string import Formatter
+
+from artifacts import label_sections
+
+_SENTINEL = '\0{}\0'
+
+
+class Template:
+    """A str.format template split into literal parts and slots.
+
+    ``parts[k]`` holds the (section, text) pieces before ``slots[k]``;
+    the last entry of ``parts`` is the text after the final slot. With
+    *minify* (a str -> str function) the template is minified first.
+    """
+
+    def __init__(self, text, minify=None):
+        marked = []
+        for literal, name, _spec, _conversion in Formatter().parse(text):
+            marked.append(literal)
+            if name is not None:
+                marked.append(_SENTINEL.format(name))
+        marked = ''.join(marked)
+        if minify is not None:
+            marked = minify(marked)
+
+        self.slots = []
+        self.slot_sections = []
+        self.parts = [[]]
+        for section, text in label_sections(marked):
+            pieces = text.split('\0')
+            if len(pieces) % 2 == 0:
+                raise ValueError(f"template slot split by a {section} boundary")
+            for i, piece in enumerate(pieces):
+                if i % 2:
+                    self.slots.append(piece)
+                    self.slot_sections.append(section)
+                    self.parts.append([])
+                elif piece:
+                    self.parts[-1].append((section, piece))
+
+
+def iter_json(value, separators=(', ', ': '), depth=2):
+    """Yield the JSON text of *value* in pieces (ensure_ascii=False).
+
+    The top *depth* levels of dicts (with string keys) and lists are
+    streamed item by item and everything below is encoded with json.dumps,
+    which uses the C encoder (JSONEncoder.iterencode only does for one-shot
+    encoding). The pieces join to exactly
+    ``json.dumps(value, ensure_ascii=False, separators=separators)``.
+    """
+    item_separator, key_separator = separators
+    if depth and isinstance(value, dict):
+        yield '{'
+        for i, (key, item) in enumerate(value.items()):
+            yield (item_separator if i else '') + json.dumps(str(key), ensure_ascii=False) + key_separator
+            yield from iter_json(item, separators, depth - 1)
+        yield '}'
+    elif depth and isinstance(value, list):
+        yield '['
+        for i, item in enumerate(value):
+            if i:
+                yield item_separator
+            yield from iter_json(item, separators, depth - 1)
+        yield ']'
+    else:
+        yield json.dumps(value, ensure_ascii=False, separators=separators)
+
+
+def render(pages, sections=None):
+    """Stream several variants of a page in one pass over their slots.
+
+    *pages* is a list of (template, values, writer): *values* maps slot name
+    to a string or an iterable of strings, and *writer* has a
+    ``write(section, text)`` method. The templates must have the same slots
+    in the same order. *sections* overrides the report section of a slot's
+    contents, e.g. {'json_data': 'data'}.
+    """
+    sections = sections or {}
+    slots = pages[0][0].slots
+    if any(template.slots != slots for template, _, _ in pages):
+        raise ValueError("page templates have different slots")
+    for k in range(len(slots) + 1):
+        for template, values, writer in pages:
+            for section, text in template.parts[k]:
+                writer.write(section, text)
+            if k == len(slots):
+                continue
+            name = slots[k]
+            section = sections.get(name, template.slot_sections[k])
+            value = values[name]
+            for chunk in (value,) if isinstance(value, str) else value:
+                writer.write(section, chunk)
@@ -32,6 +32,13 @@ const {
 	getOpenStatus,
 	getIconHtml,
 	filterBusinesses,
+	matchesFilter,
+	latLngToTile,
+	tilesForBounds,
+	decodeBusinesses,
+	haversineMeters,
+	queryViewport,
+	nearestBusinesses,
 } = require("../js/logic.js");
 
 describe("Business Logic", () => {
@@ -67,6 +74,14 @@ describe("Business Logic", () => {
 			const cafes = filterBusinesses(businesses, "cafe");
 			expect(cafes).toHaveLength(2); // id 1 and 2
 		});
+
+		test("matchesFilter agrees with filterBusinesses", () => {
+			for (const filter of ["all", "cafe", "store", "drink", "shopping"]) {
+				expect(businesses.filter((b) => matchesFilter(b, filter))).toEqual(
+					filterBusinesses(businesses, filter),
+				);
+			}
+		});
 	});
 
 	describe("getOpenStatus", () => {
@@ -127,4 +142,144 @@ describe("Business Logic", () => {
 			expect(status.text).toBe("Closed today");
 		});
 	});
+
+	describe("tiles", () => {
+		test("latLngToTile matches the slippy-map numbering", () => {
+			// Same values as tests/test_tiles.py
+			expect(latLngToTile(37.74914, -122.50722, 14)).toEqual([2616, 6334]);
+			expect(latLngToTile(0, 0, 1)).toEqual([1, 1]);
+		});
+
+		test("tilesForBounds covers every tile in the box", () => {
+			const keys = tilesForBounds(37.74, -122.51, 37.76, -122.49, 14);
+			expect(keys).toContain("2616/6334");
+			const [minX, minY] = latLngToTile(37.76, -122.51, 14);
+			const [maxX, maxY] = latLngToTile(37.74, -122.49, 14);
+			expect(keys).toHaveLength((maxX - minX + 1) * (maxY - minY + 1));
+		});
+	});
+
+	describe("decodeBusinesses", () => {
+		test("passes plain arrays through", () => {
+			const businesses = [{ id: "a" }];
+			expect(decodeBusinesses(businesses)).toBe(businesses);
+		});
+
+		test("decodes the columnar format from client_encoding.py", () => {
+			const encoded = {
+				format: "columnar-v1",
+				count: 2,
+				strings: ["restaurant", "bakery", "monday", "07:00-16:00"],
+				columns: [
+					["id", "plain", ["hookfish", "devils-teeth"]],
+					["type", "dict", [[0], 1]],
+					["hours", "table", [[2, 3], null]],
+					["lat", "delta", [377637196, -37196]],
+				],
+			};
+			expect(decodeBusinesses(encoded)).toEqual([
+				{
+					id: "hookfish",
+					type: ["restaurant"],
+					hours: { monday: "07:00-16:00" },
+					lat: 37.7637196,
+				},
+				{ id: "devils-teeth", type: "bakery", lat: 37.76 },
+			]);
+		});
+
+		test("rejects unknown formats", () => {
+			expect(() => decodeBusinesses({ format: "rows-v9" })).toThrow();
+		});
+	});
+
+	describe("spatial index", () => {
+		// 2x2 grid as written by spatial_index.build_spatial_index
+		const index = {
+			format: "grid-v1",
+			origin: [37.7, -122.5],
+			cell: [0.05, 0.05],
+			rows: 2,
+			cols: 2,
+			offsets: [0, 1, 2, 3, 4],
+			items: [0, 1, 2, 3],
+		};
+		const businesses = [
+			{ id: "sw", lat: 37.71, long: -122.49 },
+			{ id: "se", lat: 37.71, long: -122.44 },
+			{ id: "nw", lat: 37.76, long: -122.49 },
+			{ id: "ne", lat: 37.76, long: -122.44 },
+		];
+
+		test("queryViewport returns businesses inside the box", () => {
+			const found = queryViewport(index, businesses, 37.7, -122.5, 37.73, -122.4);
+			expect(found.map((b) => b.id)).toEqual(["sw", "se"]);
+		});
+
+		test("nearestBusinesses orders by distance", () => {
+			const near = nearestBusinesses(index, businesses, 37.755, -122.445, 2);
+			expect(near.map((r) => r.business.id)).toEqual(["ne", "nw"]);
+			expect(near[0].distance).toBeCloseTo(
+				haversineMeters(37.755, -122.445, 37.76, -122.44),
+			);
+		});
+
+		test("nearestBusinesses returns everything when n is large", () => {
+			expect(nearestBusinesses(index, businesses, 37.7, -122.5, 10)).toHaveLength(4);
+		});
+
+		test("nearestBusinesses skips businesses accept rejects", () => {
+			const near = nearestBusinesses(
+				index,
+				businesses,
+				37.755,
+				-122.445,
+				2,
+				(b) => b.id !== "ne",
+			);
+			expect(near.map((r) => r.business.id)).toEqual(["nw", "se"]);
+		});
+	});
+
+	describe("compiled hours", () => {
+		// compiled_hours as produced by hours.compile_hours() for `business`
+		const business = {
+			hours: {
+				monday: "09:00-17:00",
+				tuesday: "09:00-17:00",
+				default: "10:00-16:00",
+				sunday: "Closed",
+			},
+			holiday_hours: {
+				"2025-12-25": "Closed",
+				"2025-07-04": "10:00-14:00",
+				"2026-01-01": "08:00-09:30",
+			},
+		};
+		const compiled = {
+			compiled_hours: {
+				week: [
+					-1, -1, 540, 1020, 540, 1020, 600, 960, 600, 960, 600, 960, 600, 960,
+				],
+				holidays: [
+					[20250704, 600, 840],
+					[20251225, -1, -1],
+					[20260101, 480, 570],
+				],
+			},
+		};
+
+		test("matches the string-parsing logic across a full year", () => {
+			const end = new Date(2026, 0, 2).getTime();
+			for (let t = new Date(2025, 0, 1).getTime(); t < end; t += 7 * 60 * 1000) {
+				const now = new Date(t);
+				expect(getOpenStatus(compiled, now)).toEqual(getOpenStatus(business, now));
+			}
+		});
+
+		test("holiday override", () => {
+			const status = getOpenStatus(compiled, new Date("2025-07-04T15:00:00"));
+			expect(status).toEqual({ isOpen: false, text: "Closed for the day" });
+		});
+	});
 });
@@ -0,0 +1,45 @@
+import unittest
+
+from address import normalize_address
+
+
+class TestNormalizeAddress(unittest.TestCase):
+    def test_spellings_of_one_address_match(self):
+        spellings = [
+            '4541 Irving St, San Francisco, CA 94122',
+            '4541 Irving Street, San Francisco CA 94122',
+            '  4541  IRVING ST.,  San Francisco,  CA  94122-1234 ',
+            '4541 irving str san francisco ca 941221234',
+        ]
+        self.assertEqual({normalize_address(s) for s in spellings}, {'4541 irving st san francisco ca 94122'})
+
+    def test_directionals_and_suffixes(self):
+        self.assertEqual(normalize_address('100 North Sunset Boulevard'), '100 n sunset blvd')
+        self.assertEqual(normalize_address('2 Great Highway Southwest'), '2 great hwy sw')
+        self.assertEqual(normalize_address('5 Lincoln Avenue'), normalize_address('5 Lincoln Ave.'))
+
+    def test_units(self):
+        self.assertEqual(normalize_address('1 Main St Suite 200'), '1 main st ste 200')
+        self.assertEqual(normalize_address('1 Main St #5'), normalize_address('1 Main St No. 5'))
+
+    def test_different_addresses_stay_different(self):
+        self.assertNotEqual(normalize_address('4541 Irving St'), normalize_address('4542 Irving St'))
+        self.assertNotEqual(normalize_address('1 Main St, CA 94122'), normalize_address('1 Main St, CA 94116'))
+        self.assertEqual(normalize_address('41-12 Queens Blvd'), '41-12 queens blvd')
+        # Only a trailing ZIP after the state is shortened
+        self.assertEqual(normalize_address('123456789 Main St'), '123456789 main st')
+        self.assertEqual(normalize_address('1 Main St Apt 123456789'), '1 main st apt 123456789')
+        self.assertEqual(normalize_address('1 Main St, CA 94122-1234'), '1 main st ca 94122')
+        # "No" is a unit designator only before a number
+        self.assertEqual(normalize_address('12 No Name Rd'), '12 no name rd')
+        self.assertEqual(normalize_address('12 Main St No. 4'), '12 main st # 4')
+        # A directional that is the street's name is not abbreviated
+        self.assertNotEqual(normalize_address('100 North St, Boston, MA 02109'),
+                            normalize_address('100 N St, Boston, MA 02109'))
+        self.assertNotEqual(normalize_address('1 South Street'), normalize_address('1 S St'))
+        self.assertEqual(normalize_address('1 South Street'), normalize_address('1 south st.'))
+        self.assertEqual(normalize_address('1 North Main St'), normalize_address('1 N Main Street'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import artifacts
+from artifacts import (
+    StreamedArtifact, check_budgets, compressed_variants, format_size_table, label_sections, parse_budget,
+    write_artifact,
+)
+
+PAGE = (
+    '<html><head><style>body { margin: 0; }</style></head><body>'
+    '<script src="https://unpkg.com/leaflet.js"></script>'
+    '<script>const rawData = {"businesses":[]}; const categoryHierarchy = {"food":{}}; init();</script>'
+    '</body></html>'
+)
+# PAGE split by hand into the report sections
+PAGE_SECTIONS = {
+    'css': 'body { margin: 0; }',
+    'data': '{"businesses":[]}',
+    'categories': '{"food":{}}',
+    'js': 'const rawData = ; const categoryHierarchy = ; init();',
+    'markup': ('<html><head><style></style></head><body><script src="https://unpkg.com/leaflet.js"></script>'
+               '<script></script></body></html>'),
+}
+
+
+def section_sizes(sections):
+    """Sizes of each section compressed on its own, as StreamedArtifact measures them."""
+    sizes = {}
+    for name, text in sections.items():
+        raw = text.encode('utf-8')
+        sizes[name] = {'raw': len(raw)}
+        for suffix, blob in compressed_variants(raw).items():
+            sizes[name][suffix] = len(blob)
+    return sizes
+
+
+class TestArtifacts(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_gzip_is_reproducible(self):
+        data = b'hello ' * 100
+        self.assertEqual(compressed_variants(data)['.gz'], compressed_variants(data)['.gz'])
+        self.assertEqual(gzip.decompress(compressed_variants(data)['.gz']), data)
+
+    def test_write_artifact_removes_stale_variants(self):
+        path = os.path.join(self.tmp, 'index.html')
+        with open(path + '.br', 'wb') as f:
+            f.write(b'old')
+        written = write_artifact(path, b'<html></html>', {'.gz': gzip.compress(b'<html></html>')})
+        self.assertEqual(written, [path, path + '.gz'])
+        self.assertFalse(os.path.exists(path + '.br'))
+
+    def test_brotli_is_optional(self):
+        with patch.object(artifacts, 'brotli', None):
+            self.assertEqual(set(compressed_variants(b'x')), {'.gz'})
+            self.assertEqual(artifacts.artifact_paths('a.html'), ['a.html', 'a.html.gz'])
+
+    def test_label_sections(self):
+        pieces = list(label_sections(PAGE))
+        self.assertEqual(''.join(text for _, text in pieces), PAGE)
+        self.assertIn(('css', 'body { margin: 0; }'), pieces)
+        self.assertEqual([section for section, _ in pieces], ['markup', 'css', 'markup', 'js', 'markup'])
+
+    def stream(self, path, measure_compressed=True):
+        page = StreamedArtifact(path, measure_compressed=measure_compressed)
+        for section, text in label_sections(PAGE):
+            if section != 'js':
+                page.write(section, text)
+                continue
+            # Split the script into its data, categories and JS parts
+            head, rest = text.split('{"businesses":[]}')
+            middle, tail = rest.split('{"food":{}}')
+            for part, chunk in (('js', head), ('data', '{"businesses":[]}'), ('js', middle),
+                                ('categories', '{"food":{}}'), ('js', tail)):
+                page.write(part, chunk)
+        page.close()
+        return page
+
+    def test_streamed_artifact_matches_whole_page_measurement(self):
+        path = os.path.join(self.tmp, 'index.html')
+        page = self.stream(path)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(sum(len(text) for text in PAGE_SECTIONS.values()), len(PAGE))
+        self.assertEqual(page.sections, section_sizes(PAGE_SECTIONS))
+
+        written = page.commit()
+        self.assertEqual(written, artifacts.artifact_paths(path))
+        with open(path) as f:
+            self.assertEqual(f.read(), PAGE)
+        with open(path + '.gz', 'rb') as f:
+            gz = f.read()
+        self.assertEqual(gz, compressed_variants(PAGE.encode('utf-8'))['.gz'])
+        self.assertEqual(page.totals['.gz'], len(gz))
+
+    def test_streamed_artifact_discard_leaves_nothing(self):
+        path = os.path.join(self.tmp, 'index.html')
+        self.stream(path, measure_compressed=False).discard()
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_size_table(self):
+        sizes = section_sizes(PAGE_SECTIONS)
+        totals = {'index_unminified.html': {'raw': 300, '.gz': 200}, 'index.html': {'raw': 250, '.gz': 150}}
+        table = format_size_table(sizes, sizes, totals, 'index_unminified.html', 'index.html')
+        self.assertIn('total', table)
+        self.assertRegex(table, r'total\s+300\s+250\s+150')
+
+    def test_parse_budget(self):
+        self.assertEqual(parse_budget('index.html.gz=60000'), ('index.html.gz', 60000))
+        with self.assertRaises(ValueError):
+            parse_budget('index.html')
+        with self.assertRaises(ValueError):
+            parse_budget('index.html=60k')
+
+    def test_check_budgets(self):
+        totals = {'index.html': {'raw': 1000, '.gz': 400}}
+        self.assertEqual(check_budgets(totals, {'index.html': 1000, 'index.html.gz': 500}), [])
+        failures = check_budgets(totals, {'index.html.gz': 300, 'index.htm': 10})
+        self.assertEqual(len(failures), 2)
+        self.assertIn('exceeds budget of 300 B by 100 B', failures[0])
+        self.assertIn('no such artifact', failures[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,27 @@
 import unittest
 import os
+import json
+import gzip
+import random
+import re
+import shutil
+import tempfile
+import tomli
 from unittest.mock import patch, MagicMock
-from build import build, TOML_FILE, ENRICHED_TOML_FILE, OUTPUT_FILE
+import build as build_module
+from build import (
+    build, build_sites, geocode_only, minify_code, iter_minify_code, _strip_comments, _strip_comments_charwise,
+    TOML_FILE, ENRICHED_STORE_FILE, OUTPUT_FILE,
+)
+from build_cache import BuildMemo
+from geocache import GeocodingCache
 
 class TestBuild(unittest.TestCase):
 
     def setUp(self):
         # Create a dummy data.toml
         self.original_toml = TOML_FILE
-        self.original_enriched = ENRICHED_TOML_FILE
+        self.original_enriched = ENRICHED_STORE_FILE
         self.original_output = OUTPUT_FILE
         
         # We will use the file names from imported module, but in real execution 
@@ -24,10 +37,11 @@ class TestBuild(unittest.TestCase):
         # Cleanup is handled in the test via patches or temp files
         pass
 
+    @patch('build.BUILD_CACHE_DIR', 'test_build_cache')
     @patch('build.subprocess.run')
     @patch('build.process_data_with_geocoding')
     @patch('build.TOML_FILE', 'test_data.toml')
-    @patch('build.ENRICHED_TOML_FILE', 'test_data_enriched.toml')
+    @patch('build.ENRICHED_STORE_FILE', 'test_data_enriched.sqlite')
     @patch('build.OUTPUT_FILE', 'test_index.html')
     @patch('build.OUTPUT_FILE_UNMIN', 'test_index_unminified.html')
     def test_build(self, mock_process, mock_subprocess):
@@ -39,7 +53,7 @@ class TestBuild(unittest.TestCase):
             build()
             
             # Check if output files exist
-            self.assertTrue(os.path.exists('test_data_enriched.toml'))
+            self.assertTrue(os.path.exists('test_data_enriched.sqlite'))
             self.assertTrue(os.path.exists('test_index.html'))
             self.assertTrue(os.path.exists('test_index_unminified.html'))
             
@@ -70,9 +84,361 @@ class TestBuild(unittest.TestCase):
 
         finally:
             # Cleanup
-            for f in ['test_data.toml', 'test_data_enriched.toml', 'test_index.html', 'test_index_unminified.html']:
+            for f in ['test_data.toml', 'test_data_enriched.sqlite', 'test_index.html', 'test_index_unminified.html',
+                      'test_index.html.gz', 'test_index_unminified.html.gz']:
                 if os.path.exists(f):
                     os.remove(f)
+            shutil.rmtree('test_build_cache', ignore_errors=True)
+
+
+_real_build_site = build_module._build_site
+
+
+def _crashing_build_site(toml_file, output_dir, options):
+    # Module level, so the pool can pickle it
+    if 'broken' in toml_file:
+        raise RuntimeError('worker crashed')
+    return _real_build_site(toml_file, output_dir, options)
+
+
+class TestIncrementalBuild(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.paths = {name: os.path.join(self.tmp, name) for name in (
+            'data.toml', 'data_enriched.sqlite', 'index.html', 'index_unminified.html', 'minified.js', 'cache')}
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nname = "Test Biz"\n')
+        shutil.copy('js/logic.js', self.paths['minified.js'])
+        patches = [
+            patch('build.TOML_FILE', self.paths['data.toml']),
+            patch('build.ENRICHED_STORE_FILE', self.paths['data_enriched.sqlite']),
+            patch('build.OUTPUT_FILE', self.paths['index.html']),
+            patch('build.OUTPUT_FILE_UNMIN', self.paths['index_unminified.html']),
+            patch('build.MINIFIED_JS_FILE', self.paths['minified.js']),
+            patch('build.BUILD_CACHE_DIR', self.paths['cache']),
+            patch('build.geocoding.CACHE_FILE', os.path.join(self.tmp, 'geocoding_cache.sqlite')),
+            patch('build.geocoding.JSON_CACHE_FILE', os.path.join(self.tmp, 'geocoding_cache.json')),
+        ]
+        for p in patches:
+            p.start()
+        self.mock_npm = patch('build.subprocess.run').start()
+        self.mock_geocode = patch('build.process_data_with_geocoding').start()
+        self.addCleanup(patch.stopall)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_noop_rebuild_skips_every_stage(self):
+        self.assertTrue(build())
+        self.assertEqual(self.mock_npm.call_count, 1)
+        self.assertEqual(self.mock_geocode.call_count, 1)
+        mtime = os.path.getmtime(self.paths['index.html'])
+
+        self.assertTrue(build())
+        self.assertEqual(self.mock_npm.call_count, 1)
+        self.assertEqual(self.mock_geocode.call_count, 1)
+        self.assertEqual(os.path.getmtime(self.paths['index.html']), mtime)
+
+    def test_data_change_reruns_enrich_and_render_only(self):
+        build()
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Renamed Site"\n')
+
+        build()
+        self.assertEqual(self.mock_npm.call_count, 1)
+        self.assertEqual(self.mock_geocode.call_count, 2)
+        with open(self.paths['index.html']) as f:
+            self.assertIn('<title>Renamed Site</title>', f.read())
+
+    def test_data_change_writes_only_changed_records(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n' + ''.join(
+                f'[[businesses]]\nid = "biz-{i}"\nname = "Biz {i}"\n' for i in range(5)))
+        build()
+        with open(self.paths['data.toml']) as f:
+            text = f.read()
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write(text.replace('name = "Biz 3"', 'name = "Renamed Biz"'))
+
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(build())
+        printed = '\n'.join(str(c.args[0]) for c in mock_print.call_args_list if c.args)
+        self.assertIn('Updated 1 enriched record(s)', printed)
+        with open(self.paths['index.html']) as f:
+            self.assertIn('Renamed Biz', f.read())
+
+    def test_deleted_output_is_rebuilt(self):
+        build()
+        os.remove(self.paths['index.html'])
+
+        build()
+        self.assertTrue(os.path.exists(self.paths['index.html']))
+        self.assertEqual(self.mock_geocode.call_count, 1)
+
+    def test_sequential_build_with_timings(self):
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(build(jobs=1, report_timings=True))
+        printed = '\n'.join(str(c.args[0]) for c in mock_print.call_args_list if c.args)
+        self.assertIn('overlap saved', printed)
+        with open(self.paths['index.html']) as f:
+            self.assertIn('Test Biz', f.read())
+
+    def test_profile_writes_chrome_trace(self):
+        trace = os.path.join(self.tmp, 'trace.json')
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(build(profile=trace))
+        printed = '\n'.join(str(c.args[0]) for c in mock_print.call_args_list if c.args)
+        self.assertIn('peak mem', printed)
+        with open(trace) as f:
+            events = json.load(f)['traceEvents']
+        names = {event['name'] for event in events}
+        self.assertTrue({'load_data', 'encode', 'render', 'write_output'} <= names)
+        render = next(event for event in events if event['name'] == 'render')
+        self.assertGreater(render['args']['bytes_out'], 0)
+
+    def test_memo_reuses_parsed_data(self):
+        memo = BuildMemo()
+        self.assertTrue(build(memo=memo))
+        self.assertTrue(build(memo=memo, encoding='columnar'))
+
+        with patch('build.tomli.load', wraps=tomli.load) as mock_load:
+            self.assertTrue(build(memo=memo, spatial_index=True))
+        mock_load.assert_not_called()
+        self.assertEqual(self.mock_npm.call_count, 1)
+
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Edited Site"\n')
+        self.assertTrue(build(memo=memo))
+        with open(self.paths['index.html']) as f:
+            self.assertIn('<title>Edited Site</title>', f.read())
+
+    def test_build_sites_shares_minify_and_geocoding_cache(self):
+        sources = []
+        for name in ('north', 'south'):
+            sources.append(os.path.join(self.tmp, f'{name}.toml'))
+            with open(sources[-1], 'w') as f:
+                f.write(f'title = "{name.title()} Site"\n[[businesses]]\nname = "Biz"\naddress = "{name} st"\n')
+
+        def geocode(data, cache=None):
+            # Like the real geocoder, only misses are written to the shared cache
+            for business in data['businesses']:
+                if business['address'] not in cache:
+                    cache[business['address']] = {'lat': 1.0, 'long': 2.0}
+
+        self.mock_geocode.side_effect = geocode
+        out_root = os.path.join(self.tmp, 'sites')
+        with patch('builtins.print'):
+            self.assertTrue(build_sites(sources, out_root, processes=2))
+        self.assertEqual(self.mock_npm.call_count, 1)
+        for name in ('north', 'south'):
+            with open(os.path.join(out_root, name, 'index.html')) as f:
+                self.assertIn(f'<title>{name.title()} Site</title>', f.read())
+        with GeocodingCache(os.path.join(self.tmp, 'geocoding_cache.sqlite')) as cache:
+            self.assertEqual(set(cache), {'north st', 'south st'})
+
+        # The updated cache is newer than the sites' manifests, so they re-enrich
+        # once (from the cache); after that unchanged sites are skipped.
+        with patch('builtins.print'):
+            self.assertTrue(build_sites(sources, out_root, processes=2))
+        mtime = os.path.getmtime(os.path.join(out_root, 'north', 'index.html'))
+        with patch('builtins.print'):
+            self.assertTrue(build_sites(sources, out_root, processes=2))
+        self.assertEqual(self.mock_npm.call_count, 1)
+        self.assertEqual(os.path.getmtime(os.path.join(out_root, 'north', 'index.html')), mtime)
+
+    def test_geocode_only_combines_sources_without_building(self):
+        sources = []
+        for name in ('north', 'south'):
+            sources.append(os.path.join(self.tmp, f'{name}.toml'))
+            with open(sources[-1], 'w') as f:
+                f.write(f'[[businesses]]\nname = "Biz"\naddress = "{name} st"\n[[locations]]\naddress = "1 main st"\n')
+        with patch('builtins.print'):
+            self.assertTrue(geocode_only(sources))
+            self.assertFalse(geocode_only([os.path.join(self.tmp, 'missing.toml')]))
+        data = self.mock_geocode.call_args.args[0]
+        self.assertEqual([b['address'] for b in data['businesses']], ['north st', 'south st'])
+        self.assertEqual(len(data['locations']), 2)
+        self.mock_npm.assert_not_called()
+        self.assertFalse(os.path.exists(self.paths['index.html']))
+
+    def test_build_sites_reports_crashed_site_and_builds_the_rest(self):
+        sources = [os.path.join(self.tmp, f'{name}.toml') for name in ('broken', 'good')]
+        for source in sources:
+            shutil.copy(self.paths['data.toml'], source)
+        out_root = os.path.join(self.tmp, 'sites')
+        with patch('build._build_site', _crashing_build_site), patch('builtins.print') as mock_print:
+            self.assertFalse(build_sites(sources, out_root, processes=2))
+        printed = [call.args[0] for call in mock_print.call_args_list if call.args]
+        self.assertIn('Built 1/2 sites into ' + out_root + '/', printed)
+        self.assertIn('Failed: broken', printed)
+        self.assertTrue(os.path.exists(os.path.join(out_root, 'good', 'index.html')))
+
+    def test_tile_urls_resolve_from_site_page(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nid = "biz"\nname = "Tiled Biz"\nlat = 37.75\nlong = -122.5\n')
+        out_dir = os.path.join(self.tmp, 'sites', 'alpha')
+        self.assertTrue(build(tiles=True, tile_zoom=14, output_dir=out_dir))
+        with open(os.path.join(out_dir, 'index.html')) as f:
+            url = re.search(r'"url":"([^"]+)"', f.read()).group(1)
+        self.assertEqual(url, 'tiles/{z}/{x}/{y}.json')
+        tile = os.path.join(out_dir, url.format(z=14, x=2616, y=6334))
+        self.assertTrue(os.path.exists(tile))
+
+    def test_build_sites_rejects_duplicate_names(self):
+        os.makedirs(os.path.join(self.tmp, 'a'))
+        duplicate = os.path.join(self.tmp, 'a', 'data.toml')
+        shutil.copy(self.paths['data.toml'], duplicate)
+        with patch('builtins.print'):
+            self.assertFalse(build_sites([self.paths['data.toml'], duplicate], os.path.join(self.tmp, 'sites')))
+        self.mock_npm.assert_not_called()
+
+    def test_builds_from_data_directory(self):
+        data_dir = os.path.join(self.tmp, 'data')
+        os.makedirs(os.path.join(data_dir, 'businesses'))
+        with open(os.path.join(data_dir, 'site.toml'), 'w') as f:
+            f.write('title = "Split Site"\n')
+        with open(os.path.join(data_dir, 'businesses', 'biz.toml'), 'w') as f:
+            f.write('id = "biz"\nname = "Split Biz"\n')
+
+        self.assertTrue(build(toml_file=data_dir))
+        with open(self.paths['index.html']) as f:
+            self.assertIn('Split Biz', f.read())
+
+        # Editing one business file re-enriches the site
+        with open(os.path.join(data_dir, 'businesses', 'biz.toml'), 'w') as f:
+            f.write('id = "biz"\nname = "Renamed Biz"\n')
+        self.assertTrue(build(toml_file=data_dir))
+        self.assertEqual(self.mock_geocode.call_count, 2)
+        with open(self.paths['index.html']) as f:
+            self.assertIn('Renamed Biz', f.read())
+
+    def test_missing_toml_fails(self):
+        os.remove(self.paths['data.toml'])
+        self.assertFalse(build())
+        self.assertFalse(os.path.exists(self.paths['index.html']))
+
+    def test_tiled_build_does_not_inline_businesses(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nid = "biz"\nname = "Tiled Biz"\nlat = 37.75\nlong = -122.5\n')
+        tile_dir = os.path.join(self.tmp, 'tiles')
+        with patch('build.TILE_DIR', tile_dir):
+            self.assertTrue(build(tiles=True, tile_zoom=14))
+            with open(self.paths['index.html']) as f:
+                content = f.read()
+            self.assertNotIn('Tiled Biz', content)
+            self.assertIn('"available":["2616/6334"]', content)
+            self.assertTrue(os.path.exists(os.path.join(tile_dir, '14', '2616', '6334.json')))
+
+            # Switching back to inline output is not mistaken for a no-op.
+            self.assertTrue(build())
+            with open(self.paths['index.html']) as f:
+                self.assertIn('Tiled Biz', f.read())
+            # ...and removes the tiles the inline page no longer uses.
+            self.assertFalse(os.path.exists(tile_dir))
+
+    def test_columnar_encoding(self):
+        self.assertTrue(build(encoding='columnar'))
+        with open(self.paths['index.html']) as f:
+            content = f.read()
+        self.assertIn('"format":"columnar-v1"', content)
+        self.assertIn('decodeBusinesses(rawData.businesses)', content)
+
+    def test_writes_precompressed_pages(self):
+        self.assertTrue(build())
+        with open(self.paths['index.html'], 'rb') as f, gzip.open(self.paths['index.html'] + '.gz') as gz:
+            self.assertEqual(gz.read(), f.read())
+
+    def test_size_budget_failure_blocks_output(self):
+        with open(self.paths['data.toml'], 'a') as f:
+            f.write('[size_budget]\n"index.html.gz" = 10\n')
+        self.assertFalse(build())
+        self.assertFalse(os.path.exists(self.paths['index.html']))
+        self.assertEqual([name for name in os.listdir(self.tmp) if name.endswith('.tmp')], [])
+
+        # A CLI budget overrides data.toml
+        self.assertTrue(build(budgets={'index.html.gz': 10 ** 9}))
+        with open(self.paths['index.html']) as f:
+            self.assertNotIn('size_budget', f.read())
+
+    def test_size_budget_failure_keeps_previous_tiles(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nid = "biz"\nname = "Tiled Biz"\nlat = 37.75\nlong = -122.5\n')
+        tile_dir = os.path.join(self.tmp, 'tiles')
+        tile = os.path.join(tile_dir, '14', '2616', '6334.json')
+        with patch('build.TILE_DIR', tile_dir):
+            self.assertTrue(build(tiles=True, tile_zoom=14))
+            with open(tile) as f:
+                old_tile = f.read()
+            # Moved to another tile, but the page is over budget
+            with open(self.paths['data.toml'], 'w') as f:
+                f.write('title = "Test Site"\n[[businesses]]\nid = "biz"\nname = "Moved Biz"\nlat = 40.0\n'
+                        'long = -100.0\n[size_budget]\n"index.html.gz" = 10\n')
+            self.assertFalse(build(tiles=True, tile_zoom=14))
+            with open(tile) as f:
+                self.assertEqual(f.read(), old_tile)
+            with open(os.path.join(tile_dir, 'index.json')) as f:
+                self.assertEqual(json.load(f)['available'], ['2616/6334'])
+
+    def test_spatial_index_is_embedded(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nname = "Placed"\nlat = 37.75\nlong = -122.5\n')
+        self.assertTrue(build(spatial_index=True))
+        with open(self.paths['index.html']) as f:
+            self.assertIn('"spatial_index":{"format":"grid-v1"', f.read())
+
+    def test_compiled_hours(self):
+        with open(self.paths['data.toml'], 'w') as f:
+            f.write('title = "Test Site"\n[[businesses]]\nname = "Shop"\n[businesses.hours]\ndefault = "08:00-18:00"\n')
+        self.assertTrue(build(compile_hours=True))
+        with open(self.paths['index.html']) as f:
+            content = f.read()
+        self.assertIn('"compiled_hours":{"week":[480,1080,', content)
+        self.assertNotIn('"08:00-18:00"', content)
+
+    def test_force_reruns_everything(self):
+        build()
+        build(force=True)
+        self.assertEqual(self.mock_npm.call_count, 2)
+        self.assertEqual(self.mock_geocode.call_count, 2)
+
+class TestMinify(unittest.TestCase):
+
+    def legacy_minify(self, content):
+        content = _strip_comments_charwise(content)
+        content = re.sub(r'^\s+|\s+$', '', content, flags=re.MULTILINE)
+        return re.sub(r'\n+', '', content)
+
+    def test_strips_comments_but_keeps_strings(self):
+        src = (
+            '<!-- note -->\n<a href="https://x.org/a">//x</a>\n'
+            '/* css */ p { color: red; }\n'
+            "const s = '/* not */' + `// ${a}` + \"<!-- keep -->\"; // trailing\n"
+        )
+        self.assertEqual(
+            _strip_comments(src),
+            '\n<a href="https://x.org/a">\n p { color: red; }\n'
+            "const s = '/* not */' + `// ${a}` + \"<!-- keep -->\"; \n",
+        )
+
+    def test_unterminated_constructs_run_to_end(self):
+        for src in ['a /* open', 'a <!-- open', "a 'open", 'a "x\\', 'a // end']:
+            self.assertEqual(_strip_comments(src), _strip_comments_charwise(src))
+
+    def test_matches_reference_on_random_input(self):
+        alphabet = ['"', "'", '`', '\\', '/', '*', '<!--', '-->', '<', '!', '-', ':',
+                    '\n', ' ', '\t', '\xa0', 'a', 'https://x', '*/', '//']
+        rng = random.Random(0)
+        for _ in range(5000):
+            src = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            self.assertEqual(_strip_comments(src), _strip_comments_charwise(src), repr(src))
+            self.assertEqual(minify_code(src), self.legacy_minify(src), repr(src))
+
+    def test_iter_minify_code_streams_chunks(self):
+        src = 'a = 1; // one\n  "two\n"  \n\n/* three */ b'
+        chunks = list(iter_minify_code(src))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), self.legacy_minify(src))
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from build_cache import BuildManifest, BuildMemo, file_digest
+from geocache import GeocodingCache
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        self.src = os.path.join(self.tmp, 'src.txt')
+        self.out = os.path.join(self.tmp, 'out.txt')
+        self.write(self.src, 'input')
+        self.write(self.out, 'output')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_file_digest_missing_file(self):
+        self.assertIsNone(file_digest(os.path.join(self.tmp, 'nope')))
+
+    def test_unrecorded_stage_is_stale(self):
+        manifest = BuildManifest(self.cache_dir)
+        self.assertFalse(manifest.is_fresh('stage', [self.src], [self.out]))
+
+    def test_recorded_stage_is_fresh_across_instances(self):
+        BuildManifest(self.cache_dir).record('stage', [self.src], [self.out])
+        self.assertTrue(BuildManifest(self.cache_dir).is_fresh('stage', [self.src], [self.out]))
+
+    def test_changed_input_or_output_is_stale(self):
+        manifest = BuildManifest(self.cache_dir)
+        manifest.record('stage', [self.src], [self.out])
+
+        self.write(self.src, 'edited')
+        self.assertFalse(manifest.is_fresh('stage', [self.src], [self.out]))
+
+        manifest.record('stage', [self.src], [self.out])
+        self.write(self.out, 'tampered')
+        self.assertFalse(manifest.is_fresh('stage', [self.src], [self.out]))
+
+    def test_missing_output_is_stale(self):
+        manifest = BuildManifest(self.cache_dir)
+        manifest.record('stage', [self.src], [self.out])
+        os.remove(self.out)
+        self.assertFalse(manifest.is_fresh('stage', [self.src], [self.out]))
+
+    def test_commits_still_in_the_wal_make_a_database_input_stale(self):
+        db = os.path.join(self.tmp, 'cache.sqlite')
+        with GeocodingCache(db) as cache:
+            cache['a'] = {'lat': 1.0, 'long': 2.0}
+            manifest = BuildManifest(self.cache_dir)
+            manifest.record('stage', [db], [self.out])
+            db_digest = file_digest(db)
+            cache['b'] = {'lat': 3.0, 'long': 4.0}
+            # The new row is only in cache.sqlite-wal
+            self.assertEqual(file_digest(db), db_digest)
+            self.assertFalse(manifest.is_fresh('stage', [db], [self.out]))
+
+    def test_force_is_always_stale(self):
+        BuildManifest(self.cache_dir).record('stage', [self.src], [self.out])
+        self.assertFalse(BuildManifest(self.cache_dir, force=True).is_fresh('stage', [self.src], [self.out]))
+
+    def test_corrupt_manifest_is_ignored(self):
+        os.makedirs(self.cache_dir)
+        self.write(os.path.join(self.cache_dir, 'manifest.json'), '{not json')
+        manifest = BuildManifest(self.cache_dir)
+        self.assertFalse(manifest.is_fresh('stage', [self.src], [self.out]))
+
+
+
+class TestBuildMemo(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.src = os.path.join(self.tmp, 'src.txt')
+        with open(self.src, 'w') as f:
+            f.write('one')
+
+    def test_reloads_only_when_file_changes(self):
+        memo = BuildMemo()
+        loads = []
+
+        def load():
+            with open(self.src) as f:
+                loads.append(f.read())
+            return loads[-1]
+
+        self.assertEqual(memo.get('src', [self.src], load), 'one')
+        self.assertEqual(memo.get('src', [self.src], load), 'one')
+        with open(self.src, 'w') as f:
+            f.write('two')
+        self.assertEqual(memo.get('src', [self.src], load), 'two')
+        self.assertEqual(loads, ['one', 'two'])
+
+
+if __name__ == '__main__':
+    unittest.main()
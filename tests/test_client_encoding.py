@@ -0,0 +1,80 @@
+import json
+import unittest
+
+from client_encoding import COORD_SCALE, decode_columnar, encode_columnar
+
+
+BUSINESSES = [
+    {
+        "id": "hookfish",
+        "name": "Hookfish",
+        "type": ["restaurant"],
+        "lat": 37.7637196,
+        "long": -122.5079331,
+        "hours": {"monday": "07:00-16:00", "tuesday": "07:00-16:00", "sunday": "Closed"},
+        "holiday_hours": {"2025-12-25": "Closed"},
+    },
+    {
+        "id": "devils-teeth",
+        "name": "Devil's Teeth",
+        "type": "bakery",
+        "address": "3876 Noriega St, San Francisco, CA 94122",
+        "hours": {"default": "07:00-16:00"},
+    },
+    {
+        "id": "black-bird",
+        "name": "Black Bird",
+        "type": ["bookstore", "cafe"],
+        "lat": 37.76,
+        "long": -122.49,
+        "holiday_hours": {"2025-12-25": "Closed", "2026-01-01": "10:00-14:00"},
+    },
+]
+
+
+class TestColumnarEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        encoded = json.loads(json.dumps(encode_columnar(BUSINESSES)))
+        self.assertEqual(decode_columnar(encoded), BUSINESSES)
+
+    def test_strings_are_shared(self):
+        encoded = encode_columnar(BUSINESSES)
+        self.assertEqual(encoded["strings"].count("07:00-16:00"), 1)
+        self.assertEqual(encoded["strings"].count("2025-12-25"), 1)
+        encodings = {key: enc for key, enc, _data in encoded["columns"]}
+        self.assertEqual(encodings["type"], "dict")
+        self.assertEqual(encodings["hours"], "table")
+        self.assertEqual(encodings["lat"], "delta")
+        self.assertEqual(encodings["name"], "plain")
+
+    def test_single_type_stays_a_string(self):
+        decoded = decode_columnar(encode_columnar(BUSINESSES))
+        self.assertEqual(decoded[1]["type"], "bakery")
+        self.assertEqual(decoded[0]["type"], ["restaurant"])
+
+    def test_coordinates_are_delta_encoded(self):
+        encoded = encode_columnar(BUSINESSES)
+        lat = next(data for key, _enc, data in encoded["columns"] if key == "lat")
+        self.assertEqual(lat[0], round(37.7637196 * COORD_SCALE))
+        self.assertIsNone(lat[1])
+        self.assertEqual(lat[2], round((37.76 - 37.7637196) * COORD_SCALE))
+
+    def test_unexpected_shapes_fall_back_to_plain(self):
+        businesses = [{"id": "odd", "hours": "9-5", "type": 3}]
+        encoded = encode_columnar(businesses)
+        self.assertEqual({enc for _key, enc, _data in encoded["columns"]}, {"plain"})
+        self.assertEqual(decode_columnar(encoded), businesses)
+
+    def test_smaller_than_json(self):
+        businesses = [dict(BUSINESSES[0], id=f"biz-{i}") for i in range(200)]
+        as_json = json.dumps(businesses, separators=(",", ":"))
+        as_columnar = json.dumps(encode_columnar(businesses), separators=(",", ":"))
+        self.assertLess(len(as_columnar), len(as_json) / 2)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            decode_columnar({"format": "rows-v9"})
+
+
+if __name__ == "__main__":
+    unittest.main()
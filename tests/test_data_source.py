@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import data_source
+from data_source import DataSourceError, ParseCache, load_source, source_files
+
+
+class TestDataSource(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.data_dir = os.path.join(self.tmp, 'data')
+        self.cache_dir = os.path.join(self.tmp, 'cache')
+        self.write('site.toml', 'title = "Split Site"\n[[businesses]]\nid = "inline"\nname = "Inline"\n')
+        self.write('businesses/b_second.toml', 'id = "second"\nname = "Second"\n')
+        self.write('businesses/a_first.toml', 'id = "first"\nname = "First"\n')
+        self.write('locations/park.toml', 'id = "park"\nname = "Park"\nlat = 1.0\nlong = 2.0\n')
+
+    def write(self, name, text):
+        path = os.path.join(self.data_dir, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_merges_files_in_name_order(self):
+        data = load_source(self.data_dir, self.cache_dir)
+        self.assertEqual(data['title'], 'Split Site')
+        self.assertEqual([b['id'] for b in data['businesses']], ['inline', 'first', 'second'])
+        self.assertEqual(data['locations'], [{'id': 'park', 'name': 'Park', 'lat': 1.0, 'long': 2.0}])
+        self.assertEqual(len(source_files(self.data_dir)), 4)
+
+    def test_single_file_source(self):
+        path = os.path.join(self.data_dir, 'site.toml')
+        self.assertEqual(load_source(path, self.cache_dir)['title'], 'Split Site')
+        self.assertEqual(source_files(path), [path])
+
+    def test_only_changed_files_are_parsed(self):
+        paths = source_files(self.data_dir)
+        cache = ParseCache(self.cache_dir)
+        cache.parse(paths)
+        self.assertEqual(cache.parsed, 4)
+
+        # Touched but identical: matched by hash, not parsed
+        os.utime(paths[1], ns=(1, 1))
+        cache = ParseCache(self.cache_dir)
+        cache.parse(paths)
+        self.assertEqual(cache.parsed, 0)
+
+        self.write('businesses/a_first.toml', 'id = "first"\nname = "Renamed"\n')
+        cache = ParseCache(self.cache_dir)
+        self.assertEqual(cache.parse(paths)[1]['name'], 'Renamed')
+        self.assertEqual(cache.parsed, 1)
+
+    def test_removed_files_leave_the_cache(self):
+        load_source(self.data_dir, self.cache_dir)
+        os.remove(os.path.join(self.data_dir, 'locations', 'park.toml'))
+        data = load_source(self.data_dir, self.cache_dir)
+        self.assertNotIn('locations', data)
+        self.assertEqual(len(ParseCache(self.cache_dir).entries), 3)
+
+    def test_parallel_parse(self):
+        for i in range(5):
+            self.write(f'businesses/extra_{i}.toml', f'id = "extra_{i}"\nname = "Extra"\n')
+        with patch.object(data_source, 'PARALLEL_PARSE_MIN', 2):
+            data = load_source(self.data_dir, self.cache_dir)
+        self.assertEqual(len(data['businesses']), 8)
+
+    def test_invalid_file_is_named(self):
+        self.write('businesses/broken.toml', 'name = \n')
+        with self.assertRaisesRegex(DataSourceError, 'broken.toml'):
+            load_source(self.data_dir, self.cache_dir)
+
+    def test_missing_site_file(self):
+        os.remove(os.path.join(self.data_dir, 'site.toml'))
+        with self.assertRaises(FileNotFoundError):
+            load_source(self.data_dir, self.cache_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
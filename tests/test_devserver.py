@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.request
+
+from devserver import LIVE_RELOAD_SCRIPT, ReloadState, changed_paths, make_server, snapshot, watch
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'data.toml')
+        with open(self.path, 'w') as f:
+            f.write('title = "A"\n')
+
+    def test_changed_paths(self):
+        missing = os.path.join(self.tmp, 'missing.toml')
+        before = snapshot([self.path, missing])
+        self.assertIsNone(before[missing])
+        with open(self.path, 'a') as f:
+            f.write('# edit\n')
+        self.assertEqual(changed_paths(before, snapshot([self.path, missing])), [self.path])
+        # A path that is no longer listed (a deleted data file) counts as changed
+        self.assertEqual(changed_paths(snapshot([self.path]), snapshot([])), [self.path])
+
+    def test_rebuilds_on_change_and_bumps_version(self):
+        rebuilt = threading.Event()
+        state = ReloadState()
+        stop = threading.Event()
+
+        def rebuild():
+            rebuilt.set()
+            return True
+
+        thread = threading.Thread(target=watch, args=(rebuild, [self.path], state, 0.01, stop))
+        thread.start()
+        try:
+            time.sleep(0.05)
+            with open(self.path, 'w') as f:
+                f.write('title = "Changed"\n')
+            self.assertTrue(rebuilt.wait(5))
+        finally:
+            stop.set()
+            thread.join(5)
+        self.assertEqual(state.version, 1)
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        with open(os.path.join(self.tmp, 'index.html'), 'w') as f:
+            f.write('<html><body><p>Site</p></body></html>')
+        self.state = ReloadState()
+        self.server = make_server(self.tmp, 0, self.state)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def get(self, path):
+        with urllib.request.urlopen(self.base + path) as response:
+            return response.read().decode('utf-8')
+
+    def test_html_gets_live_reload_script(self):
+        html = self.get('/')
+        self.assertIn(LIVE_RELOAD_SCRIPT + '</body>', html)
+        with open(os.path.join(self.tmp, 'index.html')) as f:
+            self.assertNotIn('__livereload', f.read())
+
+    def test_live_reload_reports_version(self):
+        self.assertEqual(json.loads(self.get('/__livereload')), {'version': 0})
+        self.state.bump()
+        self.assertEqual(json.loads(self.get('/__livereload?t=1')), {'version': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
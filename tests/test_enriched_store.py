@@ -0,0 +1,96 @@
+import datetime
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import tomli
+
+from enriched_store import EnrichedStore, record_keys
+
+
+def sample_data():
+    return {
+        'title': 'Test Site',
+        'businesses': [
+            {'id': 'bakery', 'name': 'Bakery', 'lat': 1.0, 'long': 2.0},
+            {'id': 'cafe', 'name': 'Cafe', 'opened': datetime.date(2020, 5, 1)},
+            {'name': 'No Id'},
+        ],
+        'categories': {'food': {'label': 'Food'}},
+        'locations': [],
+    }
+
+
+class TestEnrichedStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'enriched.sqlite')
+        self.store = EnrichedStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp)
+
+    def test_round_trip_keeps_values_and_key_order(self):
+        self.store.save(sample_data())
+        with EnrichedStore(self.path) as store:
+            data = store.load()
+        self.assertEqual(data, sample_data())
+        self.assertEqual(list(data), list(sample_data()))
+
+    def test_unchanged_data_writes_nothing(self):
+        self.assertEqual(self.store.save(sample_data()), 4)
+        mtime = os.path.getmtime(self.path)
+        self.assertEqual(self.store.save(sample_data()), 0)
+        self.assertEqual(self.store.bytes_written, 0)
+        self.assertEqual(os.path.getmtime(self.path), mtime)
+
+    def test_unchanged_records_are_not_serialised(self):
+        self.store.save(sample_data())
+        data = sample_data()
+        data['businesses'][0]['lat'] = 5.0
+        with patch('enriched_store.pickle.dumps', wraps=pickle.dumps) as dumps:
+            self.assertEqual(self.store.save(data), 1)
+        self.assertEqual(dumps.call_count, 1)
+
+    def test_uses_wal_mode(self):
+        with sqlite3.connect(self.path) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_only_changed_records_are_written(self):
+        self.store.save(sample_data())
+        data = sample_data()
+        data['businesses'][1]['lat'] = 3.0
+        self.assertEqual(self.store.save(data), 1)
+        self.assertEqual(self.store.load(), data)
+
+    def test_removed_and_reordered_records(self):
+        self.store.save(sample_data())
+        data = sample_data()
+        data['businesses'] = [data['businesses'][1], data['businesses'][0]]
+        # Two moved rows and the id-less record deleted
+        self.assertEqual(self.store.save(data), 3)
+        self.assertEqual(self.store.load(), data)
+
+    def test_empty_store_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.load()
+
+    def test_export_toml(self):
+        self.store.save(sample_data())
+        path = os.path.join(self.tmp, 'enriched.toml')
+        self.store.export_toml(path)
+        with open(path, 'rb') as f:
+            self.assertEqual(tomli.load(f), sample_data())
+
+    def test_record_keys(self):
+        items = [{'id': 'a'}, {'name': 'x'}, {'id': 'a'}, 'bad']
+        self.assertEqual(record_keys(items), ['a', '#1', '#2', '#3'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,18 @@
 import unittest
 import os
 import shutil
+import tempfile
 from unittest.mock import patch, MagicMock
-from generate_qr import create_qr_with_logo
+from PIL import Image
+import generate_qr
+from generate_qr import create_qr_with_logo, generate, write_qr_codes
+from profiling import Profiler
 
 class TestGenerateQR(unittest.TestCase):
     def setUp(self):
         self.test_dir = 'test_qrcodes'
         os.makedirs(self.test_dir, exist_ok=True)
+        generate_qr._logos.clear()
 
     def tearDown(self):
         if os.path.exists(self.test_dir):
@@ -41,5 +46,116 @@ class TestGenerateQR(unittest.TestCase):
         
         self.assertTrue(os.path.exists(output_path))
 
+    def test_code_without_logo_is_1_bit(self):
+        output_path = os.path.join(self.test_dir, 'plain.png')
+        with patch('builtins.print'):
+            create_qr_with_logo("https://example.com", output_path)
+        qr = generate_qr.make_qr("https://example.com")
+        with Image.open(output_path) as img:
+            self.assertEqual(img.mode, '1')
+            self.assertEqual(img.convert('RGB').tobytes(), qr.make_image().convert('RGB').tobytes())
+
+    def make_logo(self):
+        logo_path = os.path.join(self.test_dir, 'logo.png')
+        logo = Image.new('RGBA', (200, 120), (200, 30, 30, 255))
+        logo.paste((0, 0, 0, 0), (0, 0, 40, 40))
+        logo.save(logo_path)
+        return logo_path
+
+    def test_logo_is_prepared_once_per_size(self):
+        logo_path = self.make_logo()
+        with patch('generate_qr.Image.open', wraps=Image.open) as mock_open, patch('builtins.print'):
+            for n in range(3):
+                create_qr_with_logo(f"https://example.com/?id={n}", os.path.join(self.test_dir, f'{n}.png'), logo_path)
+            create_qr_with_logo("https://example.com/" + "x" * 200, os.path.join(self.test_dir, 'long.png'), logo_path)
+        self.assertEqual(mock_open.call_count, 2)
+
+    def test_parallel_output_matches_sequential(self):
+        logo_path = self.make_logo()
+        outputs = {}
+        for processes in (1, 2):
+            out_dir = os.path.join(self.test_dir, str(processes))
+            os.makedirs(out_dir)
+            jobs = [(f"https://example.com/?lat={n}&lng=-{n}", os.path.join(out_dir, f'{n}.png'), logo_path)
+                    for n in range(6)]
+            with patch('builtins.print') as mock_print:
+                total = write_qr_codes(jobs, processes=processes)
+            self.assertEqual(mock_print.call_args_list[-1].args[0],
+                             f"Generated: {jobs[-1][1]} -> {jobs[-1][0]}")
+            outputs[processes] = []
+            for _url, path, _logo in jobs:
+                with open(path, 'rb') as f:
+                    outputs[processes].append(f.read())
+            self.assertEqual(total, sum(len(png) for png in outputs[processes]))
+        self.assertEqual(outputs[1], outputs[2])
+
+class TestIncrementalGenerate(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tmp, 'qrcodes')
+        self.toml = os.path.join(self.tmp, 'data.toml')
+        self.logo = os.path.join(self.tmp, 'logo.png')
+        Image.new('RGB', (40, 40), (0, 90, 200)).save(self.logo)
+        self.targets = {'a': 1.0, 'b': 2.0, 'c': 3.0}
+        for p in (
+            patch('generate_qr.OUTPUT_DIR', self.out_dir),
+            patch('generate_qr.ENRICHED_STORE_FILE', os.path.join(self.tmp, 'data_enriched.sqlite')),
+            patch('generate_qr.BASE_URL', 'https://example.com/'),
+            patch('generate_qr.LOGO_PATH', self.logo),
+            patch('generate_qr.process_data_with_geocoding'),
+        ):
+            p.start()
+        self.addCleanup(patch.stopall)
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def generate(self, force=False, **options):
+        with open(self.toml, 'w') as f:
+            for code_id, lat in self.targets.items():
+                f.write(f'[[locations]]\nid = "{code_id}"\n')
+                if lat is not None:
+                    f.write(f'lat = {lat}\nlong = -122.0\n')
+        with patch('builtins.print') as mock_print:
+            generate(self.toml, Profiler(enabled=False), processes=1, force=force, **options)
+        return mock_print.call_args_list[-2].args[0]
+
+    def test_only_changed_codes_are_regenerated(self):
+        self.assertEqual(self.generate(), "QR codes: 3 generated, 0 unchanged, 0 removed")
+        self.assertEqual(self.generate(), "QR codes: 0 generated, 3 unchanged, 0 removed")
+
+        self.targets['b'] = 2.5
+        os.remove(os.path.join(self.out_dir, 'c.png'))
+        self.assertEqual(self.generate(), "QR codes: 2 generated, 1 unchanged, 0 removed")
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'c.png')))
+
+        Image.new('RGB', (40, 40), (200, 0, 0)).save(self.logo)
+        self.assertEqual(self.generate(), "QR codes: 3 generated, 0 unchanged, 0 removed")
+        self.assertEqual(self.generate(force=True), "QR codes: 3 generated, 0 unchanged, 0 removed")
+
+    def test_codes_of_removed_ids_are_pruned(self):
+        self.generate()
+        del self.targets['a']
+        self.assertEqual(self.generate(), "QR codes: 0 generated, 2 unchanged, 1 removed")
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['.qr-manifest.json', 'b.png', 'c.png'])
+
+    def test_code_of_target_without_coordinates_is_kept(self):
+        self.generate()
+        # e.g. its address no longer geocodes
+        self.targets['a'] = None
+        self.assertEqual(self.generate(), "QR codes: 0 generated, 2 unchanged, 0 removed")
+        self.assertTrue(os.path.exists(os.path.join(self.out_dir, 'a.png')))
+        self.targets['a'] = 1.0
+        self.assertEqual(self.generate(), "QR codes: 0 generated, 3 unchanged, 0 removed")
+
+    def test_switching_format_replaces_the_files(self):
+        self.generate()
+        self.assertEqual(self.generate(fmt='svg'), "QR codes: 3 generated, 0 unchanged, 0 removed")
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['.qr-manifest.json', 'a.svg', 'b.svg', 'c.svg'])
+        self.assertEqual(self.generate(fmt='svg'), "QR codes: 0 generated, 3 unchanged, 0 removed")
+
+    def test_pdf_sheet(self):
+        self.assertEqual(self.generate(fmt='pdf', grid=(2, 1)),
+                         f"QR codes: 3 on 2 page(s) in {os.path.join(self.out_dir, 'qrcodes.pdf')}")
+
+
 if __name__ == '__main__':
     unittest.main()
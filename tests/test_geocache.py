@@ -0,0 +1,189 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from geocache import GeocodingCache, PreloadedGeocodingCache
+
+
+def write_entries(path, prefix, count):
+    with GeocodingCache(path) as cache:
+        for i in range(count):
+            cache[f'{prefix} {i}'] = {'lat': float(i), 'long': -float(i)}
+
+
+class TestGeocodingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'cache.sqlite')
+        self.json_path = os.path.join(self.tmp, 'cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_mapping(self):
+        with GeocodingCache(self.path) as cache:
+            cache['b'] = {'lat': 1.0, 'long': 2.0}
+            cache['a'] = {'lat': 3.0, 'long': 4.0}
+            self.assertEqual(cache['b'], {'lat': 1.0, 'long': 2.0})
+            self.assertIn('a', cache)
+            self.assertNotIn('c', cache)
+            self.assertEqual(list(cache), ['a', 'b'])
+            self.assertEqual(len(cache), 2)
+            del cache['a']
+            with self.assertRaises(KeyError):
+                cache['a']
+            with self.assertRaises(KeyError):
+                del cache['a']
+        with GeocodingCache(self.path) as cache:
+            self.assertEqual(dict(cache), {'b': {'lat': 1.0, 'long': 2.0}})
+
+    def test_uses_wal_mode(self):
+        with GeocodingCache(self.path) as cache:
+            self.assertEqual(cache._conn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+
+    def test_entries_record_when_they_were_written(self):
+        now = [100.0]
+        with GeocodingCache(self.path, clock=lambda: now[0]) as cache:
+            cache['a'] = {'lat': 1.0, 'long': 2.0}
+            now[0] = 200.0
+            cache.update({'b': {'lat': 1.0, 'long': 2.0}})
+            self.assertEqual(cache.updated('a'), 100.0)
+            self.assertEqual(cache.updated('b'), 200.0)
+
+    def test_imports_json_once(self):
+        with open(self.json_path, 'w') as f:
+            json.dump({'a': {'lat': 1.0, 'long': 2.0}}, f)
+        with GeocodingCache(self.path, json_path=self.json_path) as cache:
+            self.assertEqual(dict(cache), {'a': {'lat': 1.0, 'long': 2.0}})
+            del cache['a']
+        with GeocodingCache(self.path, json_path=self.json_path) as cache:
+            self.assertEqual(len(cache), 0)
+
+    def test_export_matches_json_cache_format(self):
+        entries = {'b st': {'lat': 1.5, 'long': 2.5}, 'a st': {'lat': 3.5, 'long': 4.5}}
+        with GeocodingCache(self.path) as cache:
+            cache.update(entries)
+            self.assertEqual(cache.export_json(self.json_path), 2)
+        with open(self.json_path) as f:
+            text = f.read()
+        self.assertEqual(text, json.dumps(dict(sorted(entries.items())), indent=4))
+
+        with GeocodingCache(os.path.join(self.tmp, 'other.sqlite')) as other:
+            self.assertEqual(other.import_json(self.json_path), 2)
+            self.assertEqual(dict(other), entries)
+
+    def test_failures_expire_after_negative_ttl(self):
+        now = [1000.0]
+        with GeocodingCache(self.path, clock=lambda: now[0], negative_ttl=60) as cache:
+            cache.record_failure('nowhere', source='http://geocoder/search')
+            self.assertTrue(cache.is_negative('nowhere'))
+            self.assertNotIn('nowhere', cache)
+            self.assertEqual(cache.entry('nowhere'),
+                             {'status': 'not_found', 'updated': 1000.0, 'source': 'http://geocoder/search'})
+            now[0] += 61
+            self.assertFalse(cache.is_negative('nowhere'))
+
+            # A later result replaces the failure
+            cache.put('nowhere', {'lat': 1.0, 'long': 2.0}, source='http://geocoder/search')
+            self.assertEqual(cache.entry('nowhere')['status'], 'ok')
+            self.assertFalse(cache.is_negative('nowhere'))
+
+    def test_stale_after_max_age(self):
+        now = [1000.0]
+        with GeocodingCache(self.path, clock=lambda: now[0], max_age=100) as cache:
+            cache['a'] = {'lat': 1.0, 'long': 2.0}
+            self.assertFalse(cache.is_stale('a'))
+            now[0] += 101
+            self.assertTrue(cache.is_stale('a'))
+            self.assertFalse(cache.is_stale('missing'))
+
+    def test_compact(self):
+        now = [1000.0]
+        with GeocodingCache(self.path, clock=lambda: now[0], negative_ttl=50) as cache:
+            cache.record_failure('old failure')
+            cache['oldest'] = {'lat': 1.0, 'long': 1.0}
+            now[0] = 1100.0
+            cache.record_failure('new failure')
+            for name in ('a', 'b', 'c'):
+                now[0] += 1
+                cache[name] = {'lat': 1.0, 'long': 1.0}
+
+            removed = cache.compact(max_age=90, max_entries=2)
+            self.assertEqual(removed, {'expired failures': 1, 'old results': 1, 'evicted results': 1})
+            self.assertEqual(list(cache), ['b', 'c'])
+            self.assertTrue(cache.is_negative('new failure'))
+
+    def test_migrates_version_1_database(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute('CREATE TABLE geocodes (address TEXT PRIMARY KEY, lat REAL NOT NULL, long REAL NOT NULL, '
+                     'updated REAL NOT NULL)')
+        conn.execute("INSERT INTO geocodes VALUES ('a', 1.0, 2.0, 5.0)")
+        conn.execute('PRAGMA user_version = 1')
+        conn.commit()
+        conn.close()
+        with GeocodingCache(self.path) as cache:
+            self.assertEqual(cache.entry('a'), {'status': 'ok', 'lat': 1.0, 'long': 2.0, 'updated': 5.0, 'source': None})
+            cache.record_failure('b')
+            self.assertTrue(cache.is_negative('b'))
+
+    def test_imported_entries_are_marked(self):
+        with open(self.json_path, 'w') as f:
+            json.dump({'a': {'lat': 1.0, 'long': 2.0}}, f)
+        with GeocodingCache(self.path, json_path=self.json_path) as cache:
+            self.assertEqual(cache.entry('a')['source'], 'import')
+
+    def test_concurrent_threads(self):
+        with GeocodingCache(self.path) as cache:
+            def write(prefix):
+                for i in range(50):
+                    cache[f'{prefix} {i}'] = {'lat': 1.0, 'long': 2.0}
+
+            threads = [threading.Thread(target=write, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(cache), 200)
+
+    def test_concurrent_processes(self):
+        GeocodingCache(self.path).close()
+        with ProcessPoolExecutor(max_workers=3) as pool:
+            for future in [pool.submit(write_entries, self.path, name, 30) for name in ('a', 'b', 'c')]:
+                future.result()
+        with GeocodingCache(self.path) as cache:
+            self.assertEqual(len(cache), 90)
+
+    def test_preloaded_cache_reads_rows_and_writes_through(self):
+        now = [1000.0]
+        with GeocodingCache(self.path, clock=lambda: now[0]) as cache:
+            cache.put('a', {'lat': 1.0, 'long': 2.0}, source='http://geocoder/search')
+            cache.record_failure('nowhere')
+            rows = cache.rows()
+        with PreloadedGeocodingCache(self.path, rows, clock=lambda: now[0], negative_ttl=60, max_age=100) as cache:
+            # Answered from the rows, not the database
+            os.remove(self.path)
+            self.assertEqual(cache['a'], {'lat': 1.0, 'long': 2.0})
+            self.assertEqual(cache.entry('a')['source'], 'http://geocoder/search')
+            self.assertTrue(cache.is_negative('nowhere'))
+            self.assertEqual(list(cache), ['a'])
+            now[0] += 101
+            self.assertTrue(cache.is_stale('a'))
+            self.assertFalse(cache.is_negative('nowhere'))
+
+    def test_preloaded_cache_writes_reach_the_database(self):
+        GeocodingCache(self.path).close()
+        with PreloadedGeocodingCache(self.path, ({}, {'b': (0.0, None)})) as cache:
+            cache['b'] = {'lat': 3.0, 'long': 4.0}
+            self.assertEqual(cache.entry('b')['status'], 'ok')
+            self.assertEqual(len(cache), 1)
+        with GeocodingCache(self.path) as cache:
+            self.assertEqual(dict(cache), {'b': {'lat': 3.0, 'long': 4.0}})
+
+
+if __name__ == '__main__':
+    unittest.main()
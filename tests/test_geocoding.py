@@ -1,46 +1,69 @@
 import unittest
-from unittest.mock import patch, MagicMock, mock_open
+from unittest.mock import ANY, patch
 import json
 import os
-from geocoding import geocode, process_data_with_geocoding, load_cache, save_cache
+import shutil
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from geocache import GeocodingCache
+from geocoding import (
+    NOMINATIM_URL, Progress, Provider, TokenBucket, cache_policy_from_env, format_duration, geocode, geocode_all,
+    geocode_many, process_data_with_geocoding, load_cache, offline_data_files, provider_from_env, save_cache,
+)
+from offline_geocoder import OfflineGeocoder
 
 class TestGeocoding(unittest.TestCase):
 
     def setUp(self):
         # Mock the cache file path to avoid messing with real cache
-        self.cache_patcher = patch('geocoding.CACHE_FILE', 'test_geocoding_cache.json')
+        self.cache_patcher = patch('geocoding.CACHE_FILE', 'test_geocoding_cache.sqlite')
+        self.json_patcher = patch('geocoding.JSON_CACHE_FILE', 'test_geocoding_cache.json')
         self.mock_cache_file = self.cache_patcher.start()
+        self.json_patcher.start()
 
     def tearDown(self):
         self.cache_patcher.stop()
-        if os.path.exists('test_geocoding_cache.json'):
-            os.remove('test_geocoding_cache.json')
+        self.json_patcher.stop()
+        for path in ('test_geocoding_cache.sqlite', 'test_geocoding_cache.json'):
+            if os.path.exists(path):
+                os.remove(path)
 
-    @patch('builtins.open', new_callable=mock_open, read_data='{"cached addr": {"lat": 1.0, "long": 2.0}}')
-    @patch('os.path.exists')
-    def test_load_cache(self, mock_exists, mock_file):
-        mock_exists.return_value = True
+    def test_load_cache(self):
+        with open('test_geocoding_cache.json', 'w') as f:
+            f.write('{"cached addr": {"lat": 1.0, "long": 2.0}}')
         cache = load_cache()
-        self.assertEqual(cache, {"cached addr": {"lat": 1.0, "long": 2.0}})
+        try:
+            self.assertEqual(cache, {"cached addr": {"lat": 1.0, "long": 2.0}})
+        finally:
+            cache.close()
+
+    def test_save_cache_persists_plain_dict(self):
+        save_cache({"addr": {"lat": 1.0, "long": 2.0}})
+        cache = load_cache()
+        try:
+            self.assertEqual(cache["addr"], {"lat": 1.0, "long": 2.0})
+        finally:
+            cache.close()
 
     @patch('geocoding.load_cache')
     @patch('geocoding.save_cache')
-    @patch('urllib.request.urlopen')
-    def test_geocode_success(self, mock_urlopen, mock_save_cache, mock_load_cache):
+    @patch('geocoding.HttpClient.get')
+    def test_geocode_success(self, mock_get, mock_save_cache, mock_load_cache):
         # Mock load_cache to return empty dict
         mock_load_cache.return_value = {}
         
         # Mock network response
-        mock_response = MagicMock()
-        mock_response.read.return_value = json.dumps([{'lat': '12.34', 'lon': '56.78'}]).encode('utf-8')
-        mock_response.__enter__.return_value = mock_response
-        mock_urlopen.return_value = mock_response
+        mock_get.return_value = json.dumps([{'lat': '12.34', 'lon': '56.78'}]).encode('utf-8')
 
         cache = {}
         result = geocode("New York", cache=cache)
         
         self.assertEqual(result, {'lat': 12.34, 'long': 56.78})
-        self.assertIn("New York", cache)
+        # Stored under the normalized address
+        self.assertEqual(cache, {"new york": {'lat': 12.34, 'long': 56.78}})
 
     @patch('geocoding.load_cache')
     def test_geocode_cached(self, mock_load_cache):
@@ -49,8 +72,10 @@ class TestGeocoding(unittest.TestCase):
         result = geocode("Cached Place")
         self.assertEqual(result, {"lat": 10.0, "long": 20.0})
 
+    @patch('geocoding.save_cache')
+    @patch('geocoding.load_cache', return_value={})
     @patch('geocoding.geocode')
-    def test_process_data_with_geocoding(self, mock_geocode):
+    def test_process_data_with_geocoding(self, mock_geocode, mock_load_cache, mock_save_cache):
         data = {
             'businesses': [
                 {'name': 'B1', 'address': 'Addr1'}, # Missing lat/long
@@ -67,7 +92,352 @@ class TestGeocoding(unittest.TestCase):
         self.assertEqual(data['businesses'][0]['lat'], 5.0)
         self.assertEqual(data['businesses'][0]['long'], 6.0)
         # Should verify geocode was called only for B1
-        mock_geocode.assert_called_once_with('Addr1', cache={})
+        mock_geocode.assert_called_once_with('Addr1', cache={}, provider=ANY)
+
+    def test_geocode_finds_entries_keyed_by_raw_address(self):
+        cache = {"4541 Irving St, San Francisco, CA 94122": {"lat": 1.0, "long": 2.0}}
+        self.assertEqual(geocode("4541 Irving St, San Francisco, CA 94122", cache=cache), {"lat": 1.0, "long": 2.0})
+
+    @patch('geocoding.geocode')
+    def test_process_data_dedupes_spellings_and_reports_hits(self, mock_geocode):
+        mock_geocode.return_value = {'lat': 5.0, 'long': 6.0}
+        cache = {'1 main st springfield': {'lat': 1.0, 'long': 2.0}}
+        data = {
+            'businesses': [
+                {'address': '4541 Irving St, San Francisco, CA 94122'},
+                {'address': '4541 Irving Street, San Francisco CA 94122'},
+                {'address': '1 Main Street, Springfield'},
+            ],
+            'locations': [{'address': '4541 irving st. san francisco, ca 94122-1234'}],
+        }
+        with patch('builtins.print') as mock_print:
+            process_data_with_geocoding(data, cache=cache)
+
+        mock_geocode.assert_called_once_with('4541 Irving St, San Francisco, CA 94122', cache=cache, provider=ANY)
+        self.assertEqual([item['lat'] for item in data['businesses'] + data['locations']], [5.0, 5.0, 1.0, 5.0])
+        mock_print.assert_any_call(
+            "Geocoding: 4 addresses, 2 distinct; 1 cached (50% hit rate), 1 looked up, 3 requests avoided")
+
+    @patch('geocoding.save_cache')
+    @patch('geocoding.load_cache')
+    def test_process_data_with_shared_cache(self, mock_load_cache, mock_save_cache):
+        cache = {'Addr1': {'lat': 5.0, 'long': 6.0}}
+        data = {'businesses': [{'name': 'B1', 'address': 'Addr1'}]}
+
+        process_data_with_geocoding(data, cache=cache)
+
+        self.assertEqual(data['businesses'][0]['lat'], 5.0)
+        mock_load_cache.assert_not_called()
+        # A shared cache is saved by its owner
+        mock_save_cache.assert_not_called()
+
+class FakeGeocoder(BaseHTTPRequestHandler):
+    """Stand-in for a Nominatim search endpoint; addresses starting with 'nowhere' have no result."""
+
+    def do_GET(self):
+        server = self.server
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        address = query['q'][0]
+        with server.lock:
+            server.requests.append((address, dict(self.headers)))
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        time.sleep(server.delay)
+        with server.lock:
+            server.in_flight -= 1
+        results = [] if address.startswith('nowhere') else [{'lat': '37.5', 'lon': '-122.25'}]
+        body = json.dumps(results).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGeocoderTestCase(unittest.TestCase):
+    """Runs a FakeGeocoder on a free local port at self.url."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGeocoder)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.in_flight = self.server.max_in_flight = 0
+        self.server.delay = 0.05
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/search'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestProvider(FakeGeocoderTestCase):
+    def test_lookup_sends_headers_and_parses_result(self):
+        provider = Provider(self.url, headers={'Authorization': 'Bearer token'}, rate=None)
+        self.assertEqual(provider.lookup('1 Main St'), {'lat': 37.5, 'long': -122.25})
+        self.assertIsNone(provider.lookup('nowhere'))
+        address, headers = self.server.requests[0]
+        self.assertEqual(address, '1 Main St')
+        self.assertEqual(headers['Authorization'], 'Bearer token')
+        self.assertIn('User-Agent', headers)
+
+    def test_workers_geocode_concurrently(self):
+        provider = Provider(self.url, rate=None, workers=4)
+        addresses = [f'{i} Main St' for i in range(8)] + ['nowhere 1']
+        cache = {}
+        with patch('builtins.print'):
+            results = geocode_all(addresses, cache, provider)
+        self.assertEqual(len(self.server.requests), 9)
+        self.assertGreater(self.server.max_in_flight, 1)
+        self.assertIsNone(results['nowhere 1'])
+        self.assertEqual(len(cache), 8)
+
+    def test_rate_limit_spaces_requests(self):
+        self.server.delay = 0
+        provider = Provider(self.url, rate=20, workers=4)
+        start = time.monotonic()
+        with patch('builtins.print'):
+            geocode_all([f'{i} Main St' for i in range(5)], {}, provider)
+        # One token up front, then one every 50ms
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_process_data_looks_up_each_address_once(self):
+        provider = Provider(self.url, rate=None, workers=2)
+        data = {
+            'businesses': [{'address': '1 Main St'}, {'address': '1 Main St'}, {'address': 'nowhere'}],
+            'locations': [{'address': '2 Main St', 'lat': 1.0, 'long': 2.0}],
+        }
+        with patch('builtins.print'):
+            self.assertTrue(process_data_with_geocoding(data, cache={}, provider=provider))
+        self.assertEqual(sorted(address for address, _ in self.server.requests), ['1 Main St', 'nowhere'])
+        self.assertEqual(data['businesses'][1]['lat'], 37.5)
+        self.assertNotIn('lat', data['businesses'][2])
+
+
+class TestNegativeCaching(FakeGeocoderTestCase):
+    """Lookups through a GeocodingCache against the stand-in server."""
+
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.now = [1000.0]
+        self.cache = GeocodingCache(os.path.join(self.tmp, 'cache.sqlite'), clock=lambda: self.now[0],
+                                    negative_ttl=3600, max_age=7200)
+        self.provider = Provider(self.url, rate=None)
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+        super().tearDown()
+
+    def geocode(self, address):
+        with patch('builtins.print'):
+            return geocode(address, cache=self.cache, provider=self.provider)
+
+    def test_not_found_is_remembered_until_ttl(self):
+        self.assertIsNone(self.geocode('nowhere st'))
+        self.assertIsNone(self.geocode('Nowhere Street'))
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.entry('nowhere st')['source'], self.url)
+
+        self.now[0] += 3601
+        self.geocode('nowhere st')
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_results_record_provider_and_refresh_after_max_age(self):
+        self.assertEqual(self.geocode('1 Main St'), {'lat': 37.5, 'long': -122.25})
+        entry = self.cache.entry('1 main st')
+        self.assertEqual((entry['source'], entry['updated']), (self.url, 1000.0))
+        self.geocode('1 Main St')
+        self.assertEqual(len(self.server.requests), 1)
+
+        self.now[0] += 7201
+        self.geocode('1 Main St')
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.cache.updated('1 main st'), 8201.0)
+
+    def test_legacy_raw_key_entries_expire_and_refresh(self):
+        self.cache.put('1 Main St', {'lat': 1.0, 'long': 2.0}, source='import')
+        self.assertEqual(self.geocode('1 Main St'), {'lat': 1.0, 'long': 2.0})
+        self.assertEqual(self.server.requests, [])
+
+        self.now[0] += 7201
+        self.assertEqual(self.geocode('1 Main St'), {'lat': 37.5, 'long': -122.25})
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(self.cache.entry('1 main st')['source'], self.url)
+
+    def test_failed_refresh_keeps_old_result(self):
+        self.cache.put('1 main st', {'lat': 1.0, 'long': 2.0})
+        self.now[0] += 7201
+        self.provider.base_url = 'http://127.0.0.1:1/search'
+        self.provider.client.retries = 0
+        self.assertEqual(self.geocode('1 Main St'), {'lat': 1.0, 'long': 2.0})
+
+    def test_process_data_counts_known_failures_as_hits(self):
+        self.cache.record_failure('nowhere')
+        data = {'businesses': [{'address': 'nowhere'}, {'address': '1 Main St'}]}
+        with patch('builtins.print') as mock_print:
+            process_data_with_geocoding(data, cache=self.cache, provider=self.provider)
+        self.assertEqual([address for address, _ in self.server.requests], ['1 Main St'])
+        mock_print.assert_any_call("Geocoding: 2 addresses, 2 distinct; 1 cached, 1 known not found "
+                                   "(50% hit rate), 1 looked up, 1 requests avoided")
+
+    def test_offline_points_are_tried_before_the_provider(self):
+        self.cache.record_failure('nowhere 2 st')
+        offline = OfflineGeocoder(source='offline:points.csv')
+        offline.add(1, 'Nowhere Street', 1.0, 2.0)
+        offline.add(3, 'Nowhere Street', 3.0, 4.0)
+        data = {'businesses': [{'address': '2 Nowhere St'}, {'address': '5 Nowhere St'}]}
+        with patch('builtins.print') as mock_print:
+            process_data_with_geocoding(data, cache=self.cache, provider=self.provider, offline=offline)
+        self.assertEqual(data['businesses'][0], {'address': '2 Nowhere St', 'lat': 2.0, 'long': 3.0})
+        self.assertEqual([address for address, _ in self.server.requests], ['5 Nowhere St'])
+        self.assertEqual(self.cache.entry('2 nowhere st')['source'], 'offline:points.csv')
+        mock_print.assert_any_call("Geocoding: 2 addresses, 2 distinct; 0 cached (0% hit rate), "
+                                   "1 found offline, 1 looked up, 1 requests avoided")
+
+
+class TestGeocodeMany(FakeGeocoderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.mkdtemp()
+        self.cache = GeocodingCache(os.path.join(self.tmp, 'cache.sqlite'))
+        self.provider = Provider(self.url, rate=None, workers=2)
+        self.checkpoints = []
+        self.print_patcher = patch('builtins.print')
+        self.mock_print = self.print_patcher.start()
+
+    def tearDown(self):
+        self.print_patcher.stop()
+        self.cache.close()
+        shutil.rmtree(self.tmp)
+        super().tearDown()
+
+    def geocode_many(self, addresses, **kwargs):
+        return geocode_many(addresses, self.cache, self.provider,
+                            checkpoint=lambda cache: self.checkpoints.append(len(cache)), **kwargs)
+
+    def test_streams_results_and_checkpoints_every_n(self):
+        addresses = [f'{n} Main St' for n in range(5)] + ['nowhere']
+        results = dict(self.geocode_many(addresses, checkpoint_every=2))
+        self.assertEqual(results['3 Main St'], {'lat': 37.5, 'long': -122.25})
+        self.assertIsNone(results['nowhere'])
+        self.assertEqual(len(self.checkpoints), 3)
+        self.assertEqual(self.checkpoints[-1], 5)
+
+    def test_checkpoints_every_t_seconds(self):
+        self.provider.workers = 1
+        now = [0.0]
+        batch = self.geocode_many(['1 Main St', '2 Main St', '3 Main St'], checkpoint_every=100,
+                                  checkpoint_seconds=15, clock=lambda: now[0])
+        next(batch)
+        self.assertEqual(self.checkpoints, [])
+        now[0] = 20
+        next(batch)
+        self.assertEqual(len(self.checkpoints), 1)
+        list(batch)
+        self.assertEqual(len(self.checkpoints), 2)
+        self.assertEqual(self.checkpoints[-1], 3)
+
+    def test_interrupted_batch_resumes(self):
+        self.provider.workers = 1
+        addresses = [f'{n} Main St' for n in range(6)]
+        batch = self.geocode_many(addresses)
+        next(batch)
+        batch.close()
+        self.assertEqual(len(self.checkpoints), 1)
+        self.mock_print.assert_any_call("Geocoding stopped; run again to resume with the remaining addresses")
+        done = len(self.server.requests)
+        self.assertLess(done, len(addresses))
+
+        results = dict(self.geocode_many(addresses))
+        self.assertEqual(len(results), len(addresses))
+        self.assertEqual(len(self.server.requests), len(addresses))
+        self.mock_print.assert_any_call(f"Resuming: {done} of 6 addresses already in the cache")
+
+
+class TestProgress(unittest.TestCase):
+    def test_rate_and_eta(self):
+        now = [100.0]
+        progress = Progress(400, clock=lambda: now[0])
+        now[0] += 50
+        progress.advance(100)
+        self.assertEqual(progress.line(), "Geocoded 100/400 addresses (25%) in 50s, 2.00/s, ETA 2m30s")
+        progress.advance(300)
+        self.assertEqual(progress.line(), "Geocoded 400/400 addresses (100%) in 50s, 8.00/s")
+
+    def test_format_duration(self):
+        self.assertEqual([format_duration(s) for s in (0, 59.6, 185, 3720)], ['0s', '1m00s', '3m05s', '1h02m'])
+
+
+class TestCachePolicy(unittest.TestCase):
+    def test_from_env(self):
+        self.assertEqual(cache_policy_from_env({}), {'negative_ttl': 7 * 86400, 'max_age': None})
+        self.assertEqual(cache_policy_from_env({'GEOCODER_NEGATIVE_TTL_DAYS': '1', 'GEOCODER_REFRESH_DAYS': '30'}),
+                         {'negative_ttl': 86400, 'max_age': 30 * 86400})
+        with self.assertRaises(ValueError):
+            cache_policy_from_env({'GEOCODER_REFRESH_DAYS': 'soon'})
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_waits_for_refill(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0], sleep=sleep)
+        for _ in range(4):
+            bucket.acquire()
+        self.assertEqual(sleeps, [0.5, 0.5])
+
+    def test_no_rate_never_waits(self):
+        bucket = TokenBucket(rate=None, sleep=lambda seconds: self.fail('slept'))
+        for _ in range(10):
+            bucket.acquire()
+
+
+class TestProviderConfig(unittest.TestCase):
+    def test_default_is_public_nominatim_at_one_request_per_second(self):
+        provider = provider_from_env({})
+        self.assertEqual(provider.base_url, NOMINATIM_URL)
+        self.assertEqual(provider.limiter.rate, 1.0)
+        self.assertEqual(provider.workers, 1)
+
+    def test_public_nominatim_rate_is_capped(self):
+        with patch('builtins.print'):
+            provider = provider_from_env({'GEOCODER_RATE': '10'})
+        self.assertEqual(provider.limiter.rate, 1.0)
+
+    def test_self_hosted_endpoint(self):
+        provider = provider_from_env({
+            'GEOCODER_URL': 'http://geocoder.internal/search',
+            'GEOCODER_RATE': '50',
+            'GEOCODER_BURST': '10',
+            'GEOCODER_WORKERS': '8',
+            'GEOCODER_HEADERS': '{"X-Api-Key": "secret"}',
+        })
+        self.assertEqual(provider.limiter.rate, 50.0)
+        self.assertEqual(provider.limiter.capacity, 10)
+        self.assertEqual(provider.workers, 8)
+        self.assertEqual(provider.headers['X-Api-Key'], 'secret')
+
+    def test_offline_data_files(self):
+        self.assertEqual(offline_data_files({}), [])
+        self.assertEqual(offline_data_files({'GEOCODER_OFFLINE_DATA': os.pathsep.join(['a.csv', 'b.csv'])}),
+                         ['a.csv', 'b.csv'])
+
+    def test_invalid_configuration(self):
+        with self.assertRaises(ValueError):
+            provider_from_env({'GEOCODER_HEADERS': '[1]'})
+        with self.assertRaises(ValueError):
+            provider_from_env({'GEOCODER_RATE': 'fast'})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,76 @@
+import datetime as dt
+import unittest
+
+from hours import compile_hours, open_status, with_compiled_hours
+
+DAYS = ("sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday")
+
+
+def reference_open_status(business, now):
+    """Line-by-line port of the string-parsing path of getOpenStatus()."""
+    day_name = DAYS[(now.weekday() + 1) % 7]
+    date_string = now.strftime("%Y-%m-%d")
+    hours_str = None
+    if (business.get("holiday_hours") or {}).get(date_string):
+        hours_str = business["holiday_hours"][date_string]
+    elif business.get("hours"):
+        hours_str = business["hours"].get(day_name) or business["hours"].get("default")
+    if not hours_str or hours_str == "Closed":
+        return False, "Closed today"
+    start, end = hours_str.split("-")
+    sh, sm = map(int, start.split(":"))
+    eh, em = map(int, end.split(":"))
+    now_minutes = now.hour * 60 + now.minute
+    start_minutes, end_minutes = sh * 60 + sm, eh * 60 + em
+    is_open = start_minutes <= now_minutes < end_minutes
+    if is_open:
+        return True, f"Open until {end}"
+    if now_minutes < start_minutes:
+        return False, f"Closed (Opens {start})"
+    return False, "Closed for the day"
+
+
+BUSINESSES = [
+    {
+        "hours": {"monday": "09:00-17:00", "tuesday": "09:00-17:00", "default": "10:00-16:00", "sunday": "Closed"},
+        "holiday_hours": {"2025-12-25": "Closed", "2025-07-04": "10:00-14:00", "2026-01-01": "08:00-09:30"},
+    },
+    {"hours": {"default": "Closed"}},
+    {},
+    {"holiday_hours": {"2025-01-01": "08:00-09:00"}},
+    {"hours": {"friday": "18:00-08:00", "saturday": "00:00-23:59", "monday": ""}},
+]
+
+
+class TestCompileHours(unittest.TestCase):
+    def test_compiled_tables(self):
+        compiled = compile_hours(BUSINESSES[0])
+        self.assertEqual(compiled["week"][:4], [-1, -1, 540, 1020])  # Sunday closed, Monday 09-17
+        self.assertEqual(compiled["week"][6:8], [600, 960])  # Wednesday uses default
+        self.assertEqual(compiled["holidays"], [[20250704, 600, 840], [20251225, -1, -1], [20260101, 480, 570]])
+
+    def test_invalid_hours_are_not_compiled(self):
+        self.assertIsNone(compile_hours({"hours": {"monday": "9-5"}}))
+        self.assertIsNone(compile_hours({"hours": "9-5"}))
+        self.assertIsNone(compile_hours({"holiday_hours": {"Dec 25": "Closed"}}))
+
+    def test_with_compiled_hours_copies(self):
+        businesses = [{"id": "a", "hours": {"default": "08:00-18:00"}}, {"id": "b", "hours": {"monday": "bad"}}]
+        result = with_compiled_hours(businesses)
+        self.assertEqual(set(result[0]), {"id", "compiled_hours"})
+        self.assertIs(result[1], businesses[1])
+        self.assertIn("hours", businesses[0])
+
+    def test_identical_to_string_logic_for_a_full_year(self):
+        compiled = [compile_hours(b) for b in BUSINESSES]
+        now = dt.datetime(2025, 1, 1)
+        end = dt.datetime(2026, 1, 2)
+        step = dt.timedelta(minutes=7)
+        while now < end:
+            for business, table in zip(BUSINESSES, compiled):
+                self.assertEqual(open_status(table, now), reference_open_status(business, now), (business, now))
+            now += step
+
+
+if __name__ == "__main__":
+    unittest.main()
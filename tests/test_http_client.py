@@ -0,0 +1,131 @@
+import threading
+import unittest
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_client import HttpClient, HttpError, LatencyStats, retry_after_seconds
+
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """Answers with the next (status, headers) from server.script, then 200 once it is empty."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1]))
+            status, headers = server.script.pop(0) if server.script else (200, {})
+        body = b'ok' if status == 200 else b'error'
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpClient(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.script = []
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.sleeps = []
+        self.client = HttpClient(retries=3, sleep=self.sleeps.append, jitter=lambda: 0.5)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client_ports(self):
+        return {port for _, port in self.server.requests}
+
+    def test_reuses_connection(self):
+        for i in range(5):
+            self.assertEqual(self.client.get(f'{self.url}/search?q={i}'), b'ok')
+        self.assertEqual(len(self.server.requests), 5)
+        self.assertEqual(len(self.client_ports()), 1)
+        self.assertEqual(self.server.requests[0][0], '/search?q=0')
+        self.assertEqual(len(self.client.stats.latencies), 5)
+
+    def test_reconnects_when_server_closes(self):
+        self.server.script = [(200, {'Connection': 'close'})]
+        self.client.get(self.url)
+        self.client.get(self.url)
+        self.assertEqual(len(self.client_ports()), 2)
+        self.assertEqual(self.sleeps, [])
+
+    def test_retries_5xx_with_exponential_backoff(self):
+        self.server.script = [(503, {}), (502, {}), (500, {})]
+        self.assertEqual(self.client.get(self.url), b'ok')
+        # Equal jitter with jitter() = 0.5: 3/4 of 0.5s, 1s, 2s
+        self.assertEqual(self.sleeps, [0.375, 0.75, 1.5])
+        self.assertEqual(self.client.stats.retries, 3)
+
+    def test_honors_retry_after_on_429(self):
+        self.server.script = [(429, {'Retry-After': '7'})]
+        self.assertEqual(self.client.get(self.url), b'ok')
+        self.assertEqual(self.sleeps, [7.0])
+
+    def test_gives_up_after_retries(self):
+        self.server.script = [(503, {})] * 4
+        with self.assertRaises(HttpError) as raised:
+            self.client.get(self.url)
+        self.assertEqual(raised.exception.status, 503)
+        self.assertEqual(len(self.server.requests), 4)
+
+    def test_client_errors_are_not_retried(self):
+        self.server.script = [(404, {})]
+        with self.assertRaises(HttpError):
+            self.client.get(self.url)
+        self.assertEqual(self.sleeps, [])
+
+    def test_too_long_retry_after_fails(self):
+        self.server.script = [(429, {'Retry-After': '3600'})]
+        with self.assertRaises(HttpError):
+            self.client.get(self.url)
+        self.assertEqual(self.sleeps, [])
+
+    def test_connection_errors_are_retried(self):
+        client = HttpClient(retries=2, sleep=self.sleeps.append, jitter=lambda: 0)
+        with self.assertRaises(OSError):
+            client.get('http://127.0.0.1:1/')
+        self.assertEqual(client.stats.errors, 3)
+        self.assertEqual(self.sleeps, [0.25, 0.5])
+
+    def test_throttle_runs_before_every_attempt(self):
+        calls = []
+        client = HttpClient(retries=3, sleep=self.sleeps.append, throttle=lambda: calls.append(1))
+        self.server.script = [(503, {})]
+        client.get(self.url)
+        client.close()
+        self.assertEqual(len(calls), 2)
+
+
+class TestHelpers(unittest.TestCase):
+    def test_retry_after(self):
+        self.assertEqual(retry_after_seconds('120'), 120.0)
+        self.assertIsNone(retry_after_seconds(None))
+        self.assertIsNone(retry_after_seconds('soon'))
+        now = 1_700_000_000
+        self.assertEqual(retry_after_seconds(formatdate(now + 30, usegmt=True), now=now), 30.0)
+
+    def test_latency_stats(self):
+        stats = LatencyStats()
+        for ms in range(1, 101):
+            stats.record(ms / 1000)
+        stats.record_retry()
+        self.assertEqual(stats.percentile(0.5), 0.05)
+        self.assertEqual(stats.percentile(0.95), 0.095)
+        self.assertIn('100 responses, 1 retries, 0 connection errors', stats.summary())
+        self.assertIn('p95 95 ms', stats.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from offline_geocoder import OfflineGeocoder, parse_address, street_key
+
+# OpenAddresses column layout
+POINTS = """LON,LAT,NUMBER,STREET,UNIT,CITY,DISTRICT,REGION,POSTCODE,ID,HASH
+-122.50,37.76,4500,IRVING ST,,San Francisco,,CA,94122,,
+-122.52,37.76,4600,IRVING ST,,San Francisco,,CA,94122,,
+-122.51,37.77,4541,Irving Street,,San Francisco,,CA,94122,,
+-122.51,37.75,4541,Irving Street,2,San Francisco,,CA,94122,,
+-122.40,37.70,4501,IRVING ST,,San Francisco,,CA,94122,,
+-122.40,37.80,4599,IRVING ST,,San Francisco,,CA,94122,,
+-121.00,38.00,10,MAIN ST,,Springfield,,CA,95000,,
+-120.00,39.00,10,MAIN ST,,Shelbyville,,CA,96000,,
+-120.00,,12,MAIN ST,,Shelbyville,,CA,96000,,
+"""
+
+
+class TestParseAddress(unittest.TestCase):
+    def test_number_street_and_postcode(self):
+        self.assertEqual(parse_address('4541 Irving Street, San Francisco, CA 94122-1234'),
+                         (4541, 'irving st', '94122'))
+        self.assertEqual(parse_address('12B Main St'), (12, 'main st', None))
+
+    def test_units_are_dropped_from_the_street(self):
+        self.assertEqual(street_key('Irving St #5'), 'irving st')
+        self.assertEqual(street_key('Irving Street Suite 200'), 'irving st')
+
+    def test_no_house_number(self):
+        self.assertIsNone(parse_address('Golden Gate Park, San Francisco'))
+
+
+class TestOfflineGeocoder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'points.csv')
+        with open(self.path, 'w') as f:
+            f.write(POINTS)
+        self.geocoder = OfflineGeocoder.from_csv([self.path])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_exact_match_averages_points_of_one_number(self):
+        self.assertEqual(self.geocoder.points, 8)
+        self.assertEqual(self.geocoder.lookup('4541 Irving St, San Francisco, CA 94122'),
+                         {'lat': 37.76, 'long': -122.51})
+
+    def test_interpolates_on_the_same_side_of_the_street(self):
+        self.assertEqual(self.geocoder.lookup('4550 Irving St, 94122'), {'lat': 37.76, 'long': -122.51})
+        # Between the odd numbers 4501 and 4541, not the even 4500 and 4600
+        self.assertEqual(self.geocoder.lookup('4521 Irving St, 94122'), {'lat': 37.73, 'long': -122.455})
+
+    def test_no_extrapolation_or_wide_gaps(self):
+        self.assertIsNone(self.geocoder.lookup('4700 Irving St, 94122'))
+        self.assertIsNone(self.geocoder.lookup('4400 Irving St, 94122'))
+        self.geocoder.add(5000, 'Irving St', 37.0, -122.0, '94122')
+        self.assertIsNone(self.geocoder.lookup('4800 Irving St, 94122'))
+
+    def test_postcode_disambiguates_streets(self):
+        self.assertEqual(self.geocoder.lookup('10 Main St, Shelbyville, CA 96000'), {'lat': 39.0, 'long': -120.0})
+        self.assertIsNone(self.geocoder.lookup('10 Main St'))
+        self.assertIsNone(self.geocoder.lookup('10 Main St, CA 97000'))
+
+    def test_dataset_without_postcodes(self):
+        with open(self.path, 'w') as f:
+            f.write('addr:housenumber,addr:street,lat,lon\n1,Elm Road,1.0,2.0\n3,Elm Road,3.0,4.0\n')
+        geocoder = OfflineGeocoder.from_csv([self.path])
+        self.assertEqual(geocoder.lookup('1 Elm Rd, Town, CA 95000'), {'lat': 1.0, 'long': 2.0})
+        self.assertEqual(geocoder.lookup('2 Elm Rd'), {'lat': 2.0, 'long': 3.0})
+
+    def test_missing_columns(self):
+        with open(self.path, 'w') as f:
+            f.write('number,street\n1,Elm Road\n')
+        with self.assertRaises(ValueError):
+            OfflineGeocoder.from_csv([self.path])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import threading
+import time
+import unittest
+
+from pipeline import Stage, run_stages
+
+
+class TestRunStages(unittest.TestCase):
+    def test_dependencies_receive_results(self):
+        stages = [
+            Stage('a', lambda deps: 1),
+            Stage('b', lambda deps: deps['a'] + 1, ['a']),
+            Stage('c', lambda deps: deps['a'] + deps['b'], ['a', 'b']),
+        ]
+        run = run_stages(stages)
+        self.assertEqual(run.results, {'a': 1, 'b': 2, 'c': 3})
+        self.assertLessEqual(run.timings['a'][1], run.timings['b'][0])
+
+    def test_independent_stages_overlap(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        def meet(_):
+            # Only returns if both stages are running at the same time.
+            barrier.wait()
+            time.sleep(0.05)
+
+        run = run_stages([Stage('x', meet), Stage('y', meet)])
+        self.assertLess(run.wall, run.busy)
+        self.assertIn('overlap saved', run.report())
+
+    def test_single_worker_runs_sequentially(self):
+        run = run_stages([Stage('x', lambda d: time.sleep(0.02)), Stage('y', lambda d: time.sleep(0.02))], max_workers=1)
+        (_, x_end), (y_start, _) = run.timings['x'], run.timings['y']
+        self.assertTrue(x_end <= y_start or run.timings['y'][1] <= run.timings['x'][0])
+
+    def test_stage_error_is_raised_and_dependents_skipped(self):
+        ran = []
+
+        def fail(_):
+            raise RuntimeError('boom')
+
+        stages = [Stage('fail', fail), Stage('after', lambda d: ran.append(1), ['fail'])]
+        with self.assertRaises(RuntimeError):
+            run_stages(stages)
+        self.assertEqual(ran, [])
+
+    def test_invalid_graphs(self):
+        with self.assertRaises(ValueError):
+            run_stages([Stage('a', lambda d: None, ['missing'])])
+        with self.assertRaises(ValueError):
+            run_stages([Stage('a', lambda d: None, ['b']), Stage('b', lambda d: None, ['a'])])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from pipeline import Stage, run_stages
+from profiling import Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.profiler = Profiler()
+        self.addCleanup(self.profiler.close)
+
+    def test_records_wall_cpu_bytes_and_memory(self):
+        with self.profiler.stage('work', bytes_in=10):
+            block = bytearray(4 * 1024 * 1024)
+            sum(range(100000))
+            self.profiler.count(bytes_out=len(block))
+        (record,) = self.profiler.records
+        self.assertEqual(record.name, 'work')
+        self.assertGreater(record.wall, 0)
+        self.assertGreater(record.cpu, 0)
+        self.assertEqual((record.bytes_in, record.bytes_out), (10, 4 * 1024 * 1024))
+        self.assertGreaterEqual(record.peak_memory, 4 * 1024 * 1024)
+
+    def test_nested_stage_counts_go_to_innermost(self):
+        with self.profiler.stage('outer'):
+            self.profiler.count(bytes_in=1)
+            with self.profiler.stage('inner'):
+                self.profiler.count(bytes_in=2)
+        records = {r.name: r for r in self.profiler.records}
+        self.assertEqual(records['outer'].bytes_in, 1)
+        self.assertEqual(records['inner'].bytes_in, 2)
+        self.assertLessEqual(records['outer'].start, records['inner'].start)
+
+    def test_summary_sums_repeated_stages(self):
+        for _ in range(3):
+            with self.profiler.stage('qr'):
+                self.profiler.count(bytes_out=5)
+        row = next(line for line in self.profiler.summary().splitlines() if line.startswith('qr'))
+        self.assertIn(' 3 ', row)
+        self.assertIn('15', row)
+
+    def test_disabled_profiler_records_nothing(self):
+        profiler = Profiler(enabled=False)
+        with profiler.stage('x') as record:
+            profiler.count(bytes_in=1)
+        self.assertIsNone(record)
+        self.assertEqual(profiler.records, [])
+
+    def test_run_stages_writes_trace_per_thread(self):
+        barrier = threading.Barrier(2, timeout=5)
+        run_stages([Stage('a', lambda d: barrier.wait()), Stage('b', lambda d: barrier.wait())],
+                   profiler=self.profiler)
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        path = os.path.join(tmp, 'trace.json')
+        self.profiler.write_trace(path)
+        with open(path) as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual({e['name'] for e in events}, {'a', 'b'})
+        self.assertTrue(all(e['ph'] == 'X' and e['dur'] >= 0 for e in events))
+        self.assertEqual(len({e['tid'] for e in events}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
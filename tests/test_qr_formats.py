@@ -0,0 +1,117 @@
+import os
+import re
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ET
+import zlib
+
+import qrcode
+from PIL import Image
+
+from qr_formats import PdfSheetWriter, module_runs, svg_document, vector_logo, write_svg
+
+SVG = '{http://www.w3.org/2000/svg}'
+
+
+def make_matrix(url):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, border=2)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def cells(matrix):
+    return {(x, y) for y, row in enumerate(matrix) for x, dark in enumerate(row) if dark}
+
+
+def pdf_objects(pdf):
+    """Map object number -> (dictionary bytes, decompressed stream or None), checking the xref offsets."""
+    xref = int(re.search(rb'startxref\n(\d+)', pdf).group(1))
+    entries = re.findall(rb'(\d{10}) (\d{5}) ([nf]) \n', pdf[xref:])
+    objects = {}
+    for number, (offset, _generation, kind) in enumerate(entries):
+        if kind == b'n':
+            body = pdf[int(offset):]
+            assert body.startswith(f'{number} 0 obj\n'.encode()), number
+            body = body[:body.index(b'endobj')]
+            stream = None
+            if b'\nstream\n' in body:
+                head, data = body.split(b'\nstream\n', 1)
+                data = data[:data.rindex(b'\nendstream')]
+                stream = zlib.decompress(data) if b'/FlateDecode' in head else data
+                body = head
+            objects[number] = (body, stream)
+    return objects
+
+
+class TestQrFormats(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.matrix = make_matrix('https://example.com/?lat=37.76&lng=-122.51')
+        self.logo_path = os.path.join(self.tmp, 'logo.png')
+        Image.new('RGBA', (600, 300), (10, 120, 40, 255)).save(self.logo_path)
+
+    def test_module_runs(self):
+        self.assertEqual(list(module_runs([[True, True, False, True], [False] * 4])), [(0, 0, 2), (3, 0, 1)])
+
+    def test_svg_draws_every_dark_module(self):
+        root = ET.fromstring(svg_document(self.matrix, box_size=10))
+        n = len(self.matrix)
+        self.assertEqual((root.get('width'), root.get('viewBox')), (str(n * 10), f'0 0 {n} {n}'))
+        path = root.find(f'{SVG}path')
+        self.assertEqual(path.get('stroke'), '#000')
+        drawn = set()
+        x = y = 0.0
+        for command, dx, dy, length in re.findall(r'([Mm])(-?[\d.]+) (-?[\d.]+)h(\d+)', path.get('d')):
+            x, y = (float(dx), float(dy)) if command == 'M' else (x + float(dx), y + float(dy))
+            drawn.update((int(x) + i, int(y - 0.5)) for i in range(int(length)))
+            x += int(length)
+        self.assertEqual(drawn, cells(self.matrix))
+        self.assertIsNone(root.find(f'{SVG}image'))
+
+    def test_svg_embeds_centered_logo(self):
+        path = os.path.join(self.tmp, 'code.svg')
+        write_svg(self.matrix, path, self.logo_path)
+        image = ET.parse(path).getroot().find(f'{SVG}image')
+        n = len(self.matrix)
+        self.assertAlmostEqual(float(image.get('width')), n / 4, places=2)
+        self.assertAlmostEqual(float(image.get('height')), n / 8, places=2)
+        self.assertAlmostEqual(float(image.get('x')) * 2 + float(image.get('width')), n, places=2)
+        self.assertTrue(image.get('{http://www.w3.org/1999/xlink}href').startswith('data:image/png;base64,'))
+        self.assertEqual(vector_logo(self.logo_path)[0].size, (256, 128))
+
+    def test_pdf_sheet_pages_labels_and_modules(self):
+        path = os.path.join(self.tmp, 'sheet.pdf')
+        matrices = [make_matrix(f'https://example.com/?id={i}') for i in range(14)]
+        with PdfSheetWriter(path, columns=3, rows=4, logo_path=self.logo_path) as sheet:
+            for i, matrix in enumerate(matrices):
+                sheet.add(matrix, f'Café (#{i})')
+        with open(path, 'rb') as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n'))
+        objects = pdf_objects(pdf)
+        self.assertIn(b'/Count 2', objects[PdfSheetWriter.PAGES][0])
+        self.assertEqual(sum(b'/Subtype /Image' in body for body, _ in objects.values()), 2)
+        pages = [objects[int(n)][1] for n in re.findall(rb'/Contents (\d+) 0 R', pdf)]
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(pages[1].count(b'/Logo Do'), 2)
+        self.assertIn(b'(Caf\xe9 \\(#13\\)) Tj', pages[1])
+        # The first code's modules, read back from its rectangles
+        first = pages[0].split(b'f Q')[0]
+        drawn = set()
+        for x, y, length in re.findall(rb'(\d+) (\d+) (\d+) 1 re', first):
+            drawn.update((int(x) + i, int(y)) for i in range(int(length)))
+        self.assertEqual(drawn, cells(matrices[0]))
+
+    def test_empty_pdf_sheet_is_valid(self):
+        path = os.path.join(self.tmp, 'empty.pdf')
+        PdfSheetWriter(path).close()
+        with open(path, 'rb') as f:
+            objects = pdf_objects(f.read())
+        self.assertIn(b'/Count 1', objects[PdfSheetWriter.PAGES][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import random
+import unittest
+
+from spatial_index import build_spatial_index, haversine_m, nearest, points_of, query_bbox
+
+
+def random_points(rng, count):
+    return [
+        (37.72 + rng.random() * 0.07, -122.53 + rng.random() * 0.08) if rng.random() > 0.1 else None
+        for _ in range(count)
+    ]
+
+
+class TestSpatialIndex(unittest.TestCase):
+    def test_json_round_trip_keeps_every_point_once(self):
+        points = random_points(random.Random(1), 500)
+        index = build_spatial_index(points)
+        restored = json.loads(json.dumps(index))
+        self.assertEqual(restored, index)
+        self.assertEqual(len(restored['offsets']), restored['rows'] * restored['cols'] + 1)
+        self.assertEqual(sorted(restored['items']), [i for i, p in enumerate(points) if p is not None])
+
+    def test_queries_match_brute_force_after_round_trip(self):
+        rng = random.Random(2)
+        for _ in range(100):
+            points = random_points(rng, rng.randint(1, 300))
+            index = json.loads(json.dumps(build_spatial_index(points, rng.choice([1, 8, 40]))))
+            placed = [(i, p) for i, p in enumerate(points) if p is not None]
+
+            lat, lng = 37.71 + rng.random() * 0.09, -122.54 + rng.random() * 0.1
+            n = rng.randint(1, 15)
+            expected = sorted((haversine_m(lat, lng, *p), i) for i, p in placed)[:n]
+            self.assertEqual([i for _d, i in nearest(index, points, lat, lng, n)], [i for _d, i in expected])
+
+            south, north = sorted(37.72 + rng.random() * 0.07 for _ in range(2))
+            west, east = sorted(-122.53 + rng.random() * 0.08 for _ in range(2))
+            self.assertEqual(
+                query_bbox(index, points, south, west, north, east),
+                [i for i, (a, b) in placed if south <= a <= north and west <= b <= east],
+            )
+
+    def test_empty_and_single_point(self):
+        self.assertEqual(nearest(build_spatial_index([None]), [None], 37.7, -122.5, 3), [])
+        index = build_spatial_index([(37.7, -122.5)])
+        self.assertEqual(nearest(index, [(37.7, -122.5)], 37.8, -122.4, 3)[0][1], 0)
+        self.assertEqual(query_bbox(index, [(37.7, -122.5)], 37.6, -122.6, 37.8, -122.4), [0])
+
+    def test_points_of(self):
+        self.assertEqual(points_of([{'lat': 1.0, 'long': 2.0}, {'address': 'x'}]), [(1.0, 2.0), None])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            query_bbox({'format': 'kd-v1'}, [], 0, 0, 1, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import random
+import unittest
+
+from build import HTML_TEMPLATE, minify_code
+from template import Template, iter_json, render
+
+TEMPLATE = """<html>
+<head>
+    <title>{title}</title>
+    <style>
+        /* theme */
+        body {{ margin: 0; }}
+    </style>
+</head>
+<body>
+<script>
+    const rawData = {data};
+    {js}
+</script>
+</body>
+</html>
+"""
+
+
+class Collector:
+    def __init__(self):
+        self.pieces = []
+
+    def write(self, section, text):
+        self.pieces.append((section, text))
+
+    def text(self):
+        return ''.join(text for _, text in self.pieces)
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(6 if depth < 3 else 4)
+    if kind == 0:
+        return rng.randint(-10 ** 6, 10 ** 6)
+    if kind == 1:
+        return rng.random() * 100
+    if kind == 2:
+        return rng.choice(["Joe's", 'café "quoted"', 'line\nbreak', '//not a comment', ''])
+    if kind == 3:
+        return rng.choice([True, False, None])
+    if kind == 4:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f'k{i}': random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+
+
+class TestTemplate(unittest.TestCase):
+    def test_slots_and_sections(self):
+        template = Template(TEMPLATE)
+        self.assertEqual(template.slots, ['title', 'data', 'js'])
+        self.assertEqual(template.slot_sections, ['markup', 'js', 'js'])
+        self.assertIn(('css', '\n        /* theme */\n        body { margin: 0; }\n    '), template.parts[1])
+
+    def test_minified_template_keeps_slots(self):
+        template = Template(TEMPLATE, minify=minify_code)
+        self.assertEqual(template.slots, ['title', 'data', 'js'])
+        text = ''.join(t for part in template.parts for _, t in part)
+        self.assertNotIn('theme', text)
+        self.assertNotIn('\n', text)
+
+    def test_render_matches_format(self):
+        values = {'title': 'Site', 'data': '{"a": 1}', 'js': 'init();'}
+        pretty, minified = Collector(), Collector()
+        render([
+            (Template(TEMPLATE), {**values, 'data': iter(['{"a"', ': 1}'])}, pretty),
+            (Template(TEMPLATE, minify=minify_code), values, minified),
+        ], {'data': 'data'})
+        self.assertEqual(pretty.text(), TEMPLATE.format(**values))
+        self.assertEqual(minified.text(), minify_code(TEMPLATE.format(**values)))
+        self.assertIn(('data', '{"a": 1}'), minified.pieces)
+
+    def test_page_template_slots(self):
+        self.assertEqual(Template(HTML_TEMPLATE).slots, ['site_title', 'json_data', 'category_hierarchy', 'js'])
+
+    def test_render_rejects_mismatched_templates(self):
+        with self.assertRaises(ValueError):
+            render([(Template('{a}'), {'a': ''}, Collector()), (Template('{b}'), {'b': ''}, Collector())])
+
+    def test_iter_json_matches_dumps(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            value = random_value(rng)
+            for separators in ((', ', ': '), (',', ':')):
+                self.assertEqual(''.join(iter_json(value, separators)),
+                                 json.dumps(value, ensure_ascii=False, separators=separators))
+
+
+if __name__ == '__main__':
+    unittest.main()
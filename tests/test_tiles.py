@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tiles import TileSet, lat_long_to_tile, shard_businesses, tile_bounds
+
+
+class TestTiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tmp, 'tiles')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_lat_long_to_tile(self):
+        # Same values as the latLngToTile tests in tests/logic.test.js
+        self.assertEqual(lat_long_to_tile(37.74914, -122.50722, 14), (2616, 6334))
+        self.assertEqual(lat_long_to_tile(0, 0, 1), (1, 1))
+
+    def test_tile_bounds_contain_point(self):
+        x, y = lat_long_to_tile(37.74914, -122.50722, 14)
+        (south, west), (north, east) = tile_bounds(x, y, 14)
+        self.assertTrue(south <= 37.74914 <= north)
+        self.assertTrue(west <= -122.50722 <= east)
+
+    def test_shard_skips_unplaced_and_out_of_bounds(self):
+        businesses = [
+            {'id': 'a', 'lat': 37.75, 'long': -122.50},
+            {'id': 'b', 'lat': 37.75, 'long': -122.50},
+            {'id': 'far', 'lat': 40.0, 'long': -74.0},
+            {'id': 'nowhere', 'address': '1 Main St'},
+        ]
+        tiles, skipped = shard_businesses(businesses, 14, [[37.72, -122.53], [37.79, -122.45]])
+        self.assertEqual(list(tiles.values()), [businesses[:2]])
+        self.assertEqual([b['id'] for b in skipped], ['far', 'nowhere'])
+
+    def write_tiles(self, businesses):
+        tile_set = TileSet(businesses, 14, self.out_dir)
+        tile_set.commit()
+        return tile_set.index
+
+    def test_commit_writes_tiles_and_removes_stale(self):
+        businesses = [
+            {'id': 'a', 'lat': 37.75, 'long': -122.50},
+            {'id': 'b', 'lat': 37.78, 'long': -122.46},
+        ]
+        index = self.write_tiles(businesses)
+        self.assertEqual(index['zoom'], 14)
+        self.assertEqual(len(index['available']), 2)
+        for key in index['available']:
+            path = os.path.join(self.out_dir, '14', *key.split('/')) + '.json'
+            with open(path) as f:
+                self.assertEqual(len(json.load(f)), 1)
+
+        x, y = lat_long_to_tile(37.78, -122.46, 14)
+        stale = os.path.join(self.out_dir, '14', str(x), f'{y}.json')
+        self.assertTrue(os.path.exists(stale + '.gz'))
+
+        index = self.write_tiles(businesses[:1])
+        self.assertFalse(os.path.exists(stale))
+        self.assertFalse(os.path.exists(stale + '.gz'))
+        with open(os.path.join(self.out_dir, 'index.json')) as f:
+            self.assertEqual(json.load(f), index)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,9 @@
+import os
+import shutil
+import tempfile
 import unittest
 
-from validate_data import validate_data
+from validate_data import load_data, name_item_files, parse_time_range, validate_data
 
 
 class TestValidateData(unittest.TestCase):
@@ -63,6 +66,49 @@ class TestValidateData(unittest.TestCase):
         errors, _warnings = validate_data(data)
         self.assertTrue(any("start time must be before end time" in err for err in errors))
 
+    def test_invalid_tile_zoom(self):
+        data = {
+            "title": "Test Site",
+            "map_defaults": {"lat": 37.7, "long": -122.5, "zoom": 14, "tile_zoom": 14.5},
+            "businesses": [],
+            "locations": [],
+        }
+        errors, _warnings = validate_data(data)
+        self.assertIn("map_defaults.tile_zoom: must be an integer between 0 and 22", errors)
+
+    def test_invalid_size_budget(self):
+        data = {
+            "title": "Test Site",
+            "map_defaults": {"lat": 37.7, "long": -122.5, "zoom": 14},
+            "size_budget": {"index.html.gz": 60000, "index.html": "big"},
+            "businesses": [],
+            "locations": [],
+        }
+        errors, _warnings = validate_data(data)
+        self.assertEqual(errors, ["size_budget.index.html: must be a non-negative integer (bytes)"])
+
+    def test_parse_time_range(self):
+        self.assertEqual(parse_time_range("07:30-16:00"), (450, 960))
+        self.assertIsNone(parse_time_range("Closed"))
+        with self.assertRaises(ValueError):
+            parse_time_range("7:30-16:00")
+
+
+class TestDataDirectory(unittest.TestCase):
+    def test_errors_name_the_item_file(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        os.makedirs(os.path.join(tmp, "businesses"))
+        with open(os.path.join(tmp, "site.toml"), "w") as f:
+            f.write('title = "Site"\n[map_defaults]\nlat = 1.0\nlong = 2.0\nzoom = 14\n')
+        with open(os.path.join(tmp, "businesses", "shop.toml"), "w") as f:
+            f.write('id = "shop"\ntype = ["cafe"]\naddress = "1 Main St"\n')
+
+        data = load_data(tmp)
+        errors, _ = validate_data(data)
+        named = name_item_files(errors, data, tmp)
+        self.assertIn(f"businesses[0].name: must be a non-empty string [{os.path.join(tmp, 'businesses', 'shop.toml')}]", named)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -37,14 +37,18 @@ const {
 	getIconHtml,
 	getDisplayLabel,
 	filterBusinesses,
+	matchesFilter,
 	getDisplayType,
 	getSubcategoryTypes,
 	typeInBroadCategory,
+	nearestBusinesses,
 } = require("../js/logic.js");
 global.getOpenStatus = getOpenStatus;
 global.getIconHtml = getIconHtml;
 global.getDisplayLabel = getDisplayLabel;
 global.filterBusinesses = filterBusinesses;
+global.matchesFilter = matchesFilter;
+global.nearestBusinesses = nearestBusinesses;
 global.getDisplayType = getDisplayType;
 global.getSubcategoryTypes = getSubcategoryTypes;
 global.typeInBroadCategory = typeInBroadCategory;
@@ -102,6 +106,10 @@ function loadMainFunctions() {
 			let markerClusterGroup = null;
 			const expandedCategories = {};
 			let activeClusterPopup = null;
+			let spatialIndex = null;
+			let unplacedBusinesses = [];
+			const LIST_PAGE_SIZE = 50;
+			let listLimit = LIST_PAGE_SIZE;
 			const businesses = [];
  		${src.replace(/^\/\/ --- 1\. UTILITIES ---[\s\S]*?\/\/ --- 3\./, "// --- 3.").replace(/\/\/ --- 5\. INITIALIZATION ---[\s\S]*$/, "")}
 			return { buildHierarchicalDropdown, setupDropdownEvents, createCardHTML, renderList, updateApp };
@@ -312,6 +320,21 @@ describe("UI Tests", () => {
 			expect(container.innerHTML).toContain("Biz B");
 		});
 
+		test("offers more cards when the list is cut short", () => {
+			const biz = {
+				name: "Biz A",
+				type: "cafe",
+				description: "Desc A",
+				lat: 37.75,
+				long: -122.5,
+				hours: { default: "Closed" },
+			};
+			mainFns.renderList([biz], null, true);
+			expect(document.getElementById("btn-show-more")).not.toBeNull();
+			mainFns.renderList([biz]);
+			expect(document.getElementById("btn-show-more")).toBeNull();
+		});
+
 		test("shows no results message for empty list", () => {
 			mainFns.renderList([]);
 			const container = document.getElementById("list-view");
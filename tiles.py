@@ -0,0 +1,140 @@
+"""Split businesses into slippy-map tiles so the page can load them by viewport.
+
+Tiles use the standard Web Mercator (OpenStreetMap) numbering: at zoom z the
+world is 2**z x 2**z tiles and tile (x, y) is written to ``{z}/{x}/{y}.json``
+under the tile directory. An ``index.json`` next to them lists which tiles
+exist so the client never requests empty ones.
+"""
+
+import json
+import math
+import os
+
+from artifacts import write_artifact
+
+TILE_DIR = 'tiles'
+DEFAULT_TILE_ZOOM = 14
+TILE_URL_TEMPLATE = '{z}/{x}/{y}.json'
+
+
+def lat_long_to_tile(lat, lng, zoom):
+    """Return the (x, y) tile containing the point at *zoom*."""
+    n = 2 ** zoom
+    lat_rad = math.radians(lat)
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    # Clamp points on the antimeridian / poles into the last tile.
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """Return ((south, west), (north, east)) of a tile in degrees."""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return (lat(y + 1), x / n * 360.0 - 180.0), (lat(y), (x + 1) / n * 360.0 - 180.0)
+
+
+def _in_bounds(item, max_bounds):
+    (lat_a, lng_a), (lat_b, lng_b) = max_bounds
+    return (min(lat_a, lat_b) <= item['lat'] <= max(lat_a, lat_b)
+            and min(lng_a, lng_b) <= item['long'] <= max(lng_a, lng_b))
+
+
+def shard_businesses(businesses, zoom, max_bounds=None):
+    """Group businesses by tile.
+
+    Returns (tiles, skipped) where tiles maps (x, y) to the businesses in that
+    tile, in their original order. Businesses without coordinates, or outside
+    *max_bounds* (the map cannot be panned there), are returned in skipped.
+    """
+    tiles = {}
+    skipped = []
+    for biz in businesses:
+        if 'lat' not in biz or 'long' not in biz:
+            skipped.append(biz)
+            continue
+        if max_bounds and not _in_bounds(biz, max_bounds):
+            skipped.append(biz)
+            continue
+        tiles.setdefault(lat_long_to_tile(biz['lat'], biz['long'], zoom), []).append(biz)
+    return tiles, skipped
+
+
+def remove_tiles(out_dir=TILE_DIR):
+    """Delete the tiles recorded in *out_dir*/index.json by a previous build.
+
+    *out_dir* itself is removed too if nothing else is left in it.
+    """
+    index_path = os.path.join(out_dir, 'index.json')
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    except (OSError, ValueError):
+        return
+    zoom_dir = os.path.join(out_dir, str(old.get('zoom')))
+    for key in old.get('available', []):
+        x, y = key.split('/')
+        path = os.path.join(zoom_dir, x, f"{y}.json")
+        for variant in (path, path + '.gz', path + '.br'):
+            if os.path.exists(variant):
+                os.remove(variant)
+    if os.path.isdir(zoom_dir):
+        # Drop the now-empty column directories.
+        for dirpath, _dirnames, _filenames in os.walk(zoom_dir, topdown=False):
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+    os.remove(index_path)
+    if not os.listdir(out_dir):
+        os.rmdir(out_dir)
+
+
+class TileSet:
+    """Businesses sharded and serialised into tiles, held in memory until commit().
+
+    Each tile holds its businesses as a JSON array, or as whatever
+    ``encode(businesses)`` returns (e.g. client_encoding.encode_columnar).
+    ``index`` is the ``tiles`` object embedded in the page; its URL template
+    starts with *url_prefix*, the path of *out_dir* relative to the page
+    (default: *out_dir* itself, for a page in the current directory).
+    Nothing touches *out_dir* until commit(), so a build that fails later
+    leaves the previous tiles in place.
+    """
+
+    def __init__(self, businesses, zoom, out_dir=TILE_DIR, max_bounds=None, encode=None, url_prefix=None):
+        tiles, skipped = shard_businesses(businesses, zoom, max_bounds)
+        for biz in skipped:
+            print(f"Warning: {biz.get('id', biz.get('name', 'Unknown'))} has no coordinates inside max_bounds, "
+                  f"not tiled")
+        self.zoom = zoom
+        self.out_dir = out_dir
+        self.count = sum(len(items) for items in tiles.values())
+        self.payloads = {
+            key: json.dumps(encode(items) if encode else items, ensure_ascii=False,
+                            separators=(',', ':')).encode('utf-8')
+            for key, items in tiles.items()
+        }
+        self.index = {
+            'zoom': zoom,
+            'url': f"{(url_prefix or out_dir).replace(os.sep, '/')}/{TILE_URL_TEMPLATE}",
+            'available': sorted(f"{x}/{y}" for x, y in tiles),
+        }
+
+    def commit(self):
+        """Replace the tiles of a previous build with these and write index.json.
+
+        Tiles are written with precompressed variants (see artifacts.py);
+        tiles listed in the previous index.json are removed first, so tiles
+        that no longer contain any business disappear.
+        """
+        remove_tiles(self.out_dir)
+        for (x, y), payload in self.payloads.items():
+            path = os.path.join(self.out_dir, TILE_URL_TEMPLATE.format(z=self.zoom, x=x, y=y))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_artifact(path, payload)
+        os.makedirs(self.out_dir, exist_ok=True)
+        with open(os.path.join(self.out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, separators=(',', ':'))
+        print(f"Wrote {self.count} businesses into {len(self.payloads)} tiles at zoom {self.zoom}")
@@ -1,11 +1,15 @@
 import argparse
 import datetime as dt
+import os
 import re
 import sys
 
 import tomli
 
+from data_source import DATA_DIR, SITE_FILE, DataSourceError, default_source, item_files, load_source
+
 DATA_FILE_DEFAULT = "data.toml"
+_ITEM_PATH_RE = re.compile(r"^(businesses|locations)\[(\d+)\]")
 
 # Fallback types used when no [categories] section exists in data.toml
 _FALLBACK_TYPES = {
@@ -61,19 +65,29 @@ def _is_number(value):
     return isinstance(value, (int, float)) and not isinstance(value, bool)
 
 
-def _validate_time_range(value, path, errors):
+def parse_time_range(value):
+    """Parse 'HH:MM-HH:MM' into (start_minutes, end_minutes) since midnight.
+
+    Returns None for 'Closed'; raises ValueError for anything else that does
+    not match TIME_RANGE_RE. Start is not required to be before end here.
+    """
     if value == "Closed":
-        return
-    match = TIME_RANGE_RE.match(value)
-    if not match:
-        _add_error(errors, path, "expected 'HH:MM-HH:MM' or 'Closed'")
-        return
+        return None
+    if not isinstance(value, str) or not TIME_RANGE_RE.match(value):
+        raise ValueError(f"expected 'HH:MM-HH:MM' or 'Closed', got {value!r}")
     start, end = value.split("-")
     sh, sm = start.split(":")
     eh, em = end.split(":")
-    start_minutes = int(sh) * 60 + int(sm)
-    end_minutes = int(eh) * 60 + int(em)
-    if start_minutes >= end_minutes:
+    return int(sh) * 60 + int(sm), int(eh) * 60 + int(em)
+
+
+def _validate_time_range(value, path, errors):
+    try:
+        parsed = parse_time_range(value)
+    except ValueError:
+        _add_error(errors, path, "expected 'HH:MM-HH:MM' or 'Closed'")
+        return
+    if parsed is not None and parsed[0] >= parsed[1]:
         _add_error(errors, path, "start time must be before end time")
 
 
@@ -148,6 +162,10 @@ def validate_data(data):
                 _add_error(errors, f"map_defaults.{key}", "must be a number")
         if "min_zoom" in map_defaults and not _is_number(map_defaults["min_zoom"]):
             _add_error(errors, "map_defaults.min_zoom", "must be a number")
+        if "tile_zoom" in map_defaults:
+            tile_zoom = map_defaults["tile_zoom"]
+            if not isinstance(tile_zoom, int) or isinstance(tile_zoom, bool) or not (0 <= tile_zoom <= 22):
+                _add_error(errors, "map_defaults.tile_zoom", "must be an integer between 0 and 22")
         if "max_bounds" in map_defaults:
             bounds = map_defaults["max_bounds"]
             if (
@@ -157,6 +175,15 @@ def validate_data(data):
             ):
                 _add_error(errors, "map_defaults.max_bounds", "must be [[lat, long], [lat, long]]")
 
+    size_budget = data.get("size_budget")
+    if size_budget is not None:
+        if not isinstance(size_budget, dict):
+            _add_error(errors, "size_budget", "must be a table")
+        else:
+            for name, limit in size_budget.items():
+                if not isinstance(limit, int) or isinstance(limit, bool) or limit < 0:
+                    _add_error(errors, f"size_budget.{name}", "must be a non-negative integer (bytes)")
+
     businesses = data.get("businesses", [])
     if not isinstance(businesses, list):
         _add_error(errors, "businesses", "must be an array")
@@ -259,25 +286,50 @@ def validate_data(data):
 
 
 def load_data(path):
-    with open(path, "rb") as f:
-        return tomli.load(f)
+    """Load data.toml or a data directory (see data_source.py)."""
+    return load_source(path)
+
+
+def name_item_files(messages, data, path):
+    """Append the source file to messages about items of a data directory.
+
+    Items from per-item files follow those listed in site.toml, so
+    businesses[i] maps to the file at i minus the number listed there.
+    """
+    files = item_files(path)
+    named = []
+    for message in messages:
+        match = _ITEM_PATH_RE.match(message)
+        if match:
+            kind, index = match.group(1), int(match.group(2))
+            offset = len(data.get(kind, [])) - len(files[kind])
+            if 0 <= index - offset < len(files[kind]):
+                message = f"{message} [{files[kind][index - offset]}]"
+        named.append(message)
+    return named
 
 
 def main():
     parser = argparse.ArgumentParser(description="Validate data.toml structure and values.")
-    parser.add_argument("path", nargs="?", default=DATA_FILE_DEFAULT, help="Path to data.toml")
+    parser.add_argument("path", nargs="?", default=None,
+                        help=f"Path to data.toml or a data directory (default: {DATA_DIR}/ if it has a "
+                             f"{SITE_FILE}, else {DATA_FILE_DEFAULT})")
     args = parser.parse_args()
+    path = args.path or default_source(DATA_FILE_DEFAULT)
 
     try:
-        data = load_data(args.path)
+        data = load_data(path)
     except FileNotFoundError:
-        print(f"ERROR: file not found: {args.path}")
+        print(f"ERROR: file not found: {path}")
         return 1
-    except tomli.TOMLDecodeError as exc:
+    except (tomli.TOMLDecodeError, DataSourceError) as exc:
         print(f"ERROR: invalid TOML: {exc}")
         return 1
 
     errors, warnings = validate_data(data)
+    if os.path.isdir(path) and isinstance(data, dict):
+        errors = name_item_files(errors, data, path)
+        warnings = name_item_files(warnings, data, path)
 
     for warning in warnings:
         print(f"WARN: {warning}")